@@ -0,0 +1,227 @@
+import json
+import sqlite3
+from datetime import datetime, date
+import numpy as np
+from record_store import LOCAL_BUCKET_SECONDS, UNKNOWN_LINES
+
+# Arquivo padrão do armazém de atividade (SQLite em modo WAL, criado no diretório atual)
+WAREHOUSE_DEFAULT_PATH = "heatmap_activity_warehouse.sqlite"
+# Linhas por executemany ao gravar uma varredura (todas na mesma transação)
+WAREHOUSE_BATCH_SIZE = 10000
+# Tipos de evento gravados por arquivo: criação (ctime) e última modificação (mtime)
+EVENT_KINDS = {'created': 'ctime', 'modified': 'mtime'}
+
+# Prefixo da identidade de arquivos cuja chave só vale dentro da própria execução (ex. chaves de staged_dedup)
+RUN_SCOPED_PREFIX = "run:"
+
+_TABLES = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " run_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " recorded_at TEXT, roots TEXT, hash_algorithm TEXT, winner_key TEXT, files INTEGER)",
+    "CREATE TABLE IF NOT EXISTS files ("
+    " run_id INTEGER, file_hash TEXT, filepath TEXT, lines INTEGER, ctime INTEGER, mtime INTEGER, hash_algorithm TEXT)",
+    # day/slot são a data e o intervalo de 30 min em hora local, calculados na gravação:
+    # os agrupamentos por dia usam o índice em vez de strftime linha a linha
+    "CREATE TABLE IF NOT EXISTS events ("
+    " run_id INTEGER, file_hash TEXT, kind TEXT, ts INTEGER, day TEXT, slot INTEGER, lines INTEGER, hash_algorithm TEXT)",
+)
+# Identidade de um arquivo = (hash_algorithm, file_hash): digests de algoritmos diferentes nunca se misturam
+_INDEXES = (
+    "DROP INDEX IF EXISTS events_kind_day", # Versão sem hash_algorithm
+    "CREATE INDEX IF NOT EXISTS events_ts ON events (ts)",
+    "CREATE INDEX IF NOT EXISTS events_kind_day_hash ON events (kind, day, hash_algorithm, file_hash, lines)",
+    "CREATE INDEX IF NOT EXISTS events_hash ON events (file_hash, kind, day)",
+    "CREATE INDEX IF NOT EXISTS files_hash ON files (file_hash)",
+)
+
+
+def _local_day_slots(epochs):
+    """(dias 'AAAA-MM-DD', intervalos de 30 min) em hora local para uma coluna de epochs.
+
+    Como em FileRecordStore.hour_counts, só converte uma vez por intervalo
+    distinto de 15 min (todo fuso é múltiplo de 15 min).
+    """
+    buckets, inverse = np.unique(epochs // LOCAL_BUCKET_SECONDS, return_inverse=True)
+    days, slots = [], []
+    for bucket in buckets.tolist():
+        moment = datetime.fromtimestamp(bucket * LOCAL_BUCKET_SECONDS)
+        days.append(moment.date().isoformat())
+        slots.append(moment.hour * 2 + moment.minute // 30)
+    inverse = inverse.reshape(-1).tolist()
+    return [days[index] for index in inverse], [slots[index] for index in inverse]
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ActivityWarehouse:
+    """Histórico de varreduras num SQLite local: uma linha por arquivo e por evento de cada execução.
+
+    Cada record_run grava os arquivos únicos de uma varredura (o mesmo
+    FileRecordStore do snapshot) em lotes de executemany numa única transação.
+    Os gráficos e heatmaps saem de consultas agregadas indexadas sobre qualquer
+    conjunto de execuções (run_ids=None = todas), sem varrer de novo. Um
+    arquivo visto em várias execuções conta uma vez: as consultas agregam por
+    (algoritmo, hash) distinto; chaves que só valem dentro de uma varredura
+    ficam presas à execução (record_run). WAL deixa ler o armazém enquanto outra execução grava.
+    """
+
+    def __init__(self, warehouse_path=WAREHOUSE_DEFAULT_PATH, batch_size=WAREHOUSE_BATCH_SIZE):
+        self.warehouse_path = warehouse_path
+        self.batch_size = max(1, int(batch_size))
+        self._conn = sqlite3.connect(warehouse_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL") # Seguro em WAL: uma queda perde no máximo a última transação
+        with self._conn:
+            for statement in _TABLES:
+                self._conn.execute(statement)
+            for table in ('files', 'events'):
+                columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+                if 'hash_algorithm' not in columns:
+                    # Armazéns antigos (sem a coluna): o algoritmo de cada linha é o da execução
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN hash_algorithm TEXT")
+                    self._conn.execute(f"UPDATE {table} SET hash_algorithm = (SELECT runs.hash_algorithm FROM runs WHERE runs.run_id = {table}.run_id)")
+            for statement in _INDEXES:
+                self._conn.execute(statement)
+
+    def record_run(self, store, roots, hash_algorithm=None, winner_key=None, run_scoped=None):
+        """Grava uma varredura (FileRecordStore dos arquivos únicos) e retorna o run_id.
+
+        run_scoped (um bool por linha do store) marca identidades que só valem
+        dentro desta varredura, como as chaves sintéticas de staged_dedup: elas
+        ganham o prefixo "run:<run_id>:" e nunca se juntam a arquivos de outra
+        execução. Tudo entra numa transação: uma falha no meio não deixa execução pela metade.
+        """
+        size = store.size
+        lines = [None if value == UNKNOWN_LINES else value for value in store.lines[:size].tolist()]
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (recorded_at, roots, hash_algorithm, winner_key, files) VALUES (?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec='seconds'), json.dumps(list(roots), ensure_ascii=False), hash_algorithm, winner_key, size)
+            )
+            run_id = cursor.lastrowid
+            run_scoped = list(run_scoped) if run_scoped is not None else [False] * size
+            hashes = [f"{RUN_SCOPED_PREFIX}{run_id}:{store.digest_hex(index)}" if run_scoped[index] else store.digest_hex(index)
+                      for index in range(size)]
+            ctimes = store.column('ctime').tolist()
+            mtimes = store.column('mtime').tolist()
+            file_rows = ((run_id, hashes[index], store.filepath(index), lines[index], ctimes[index], mtimes[index], hash_algorithm) for index in range(size))
+            for batch in _batches(file_rows, self.batch_size):
+                self._conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            for kind, time_key in EVENT_KINDS.items():
+                epochs = store.column(time_key)
+                days, slots = _local_day_slots(epochs)
+                epochs = epochs.tolist()
+                event_rows = ((run_id, hashes[index], kind, epochs[index], days[index], slots[index], lines[index], hash_algorithm) for index in range(size))
+                for batch in _batches(event_rows, self.batch_size):
+                    self._conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        print(f"Armazém de atividade: execução {run_id} gravada em {self.warehouse_path} ({size} arquivos).")
+        return run_id
+
+    def _filter(self, run_ids, hash_algorithm, alias="events"):
+        """(trecho SQL, parâmetros) que restringe às execuções e ao algoritmo pedidos (None = todos)."""
+        clauses, params = "", []
+        if run_ids is not None:
+            run_ids = list(run_ids)
+            clauses += f" AND {alias}.run_id IN ({', '.join('?' * len(run_ids))})"
+            params += run_ids
+        if hash_algorithm is not None:
+            clauses += f" AND {alias}.hash_algorithm = ?"
+            params.append(hash_algorithm)
+        return clauses, params
+
+    def runs(self):
+        """[{'run_id', 'recorded_at', 'roots', 'hash_algorithm', 'winner_key', 'files'}] em ordem de gravação."""
+        return [
+            {'run_id': run_id, 'recorded_at': recorded_at, 'roots': json.loads(roots or "[]"),
+             'hash_algorithm': hash_algorithm, 'winner_key': winner_key, 'files': files}
+            for run_id, recorded_at, roots, hash_algorithm, winner_key, files
+            in self._conn.execute("SELECT run_id, recorded_at, roots, hash_algorithm, winner_key, files FROM runs ORDER BY run_id")
+        ]
+
+    def roots(self, run_ids=None):
+        """Pastas varridas nas execuções (sem repetição, na ordem em que apareceram)."""
+        wanted = set(run_ids) if run_ids is not None else None
+        roots = []
+        for run in self.runs():
+            if wanted is not None and run['run_id'] not in wanted:
+                continue
+            for root in run['roots']:
+                if root not in roots:
+                    roots.append(root)
+        return roots
+
+    def daily_counts(self, kind, run_ids=None, hash_algorithm=None):
+        """{date: arquivos distintos} com evento kind ('created' ou 'modified') em cada dia."""
+        run_filter, params = self._filter(run_ids, hash_algorithm)
+        query = (f"SELECT day, count(*) FROM (SELECT DISTINCT day, hash_algorithm, file_hash FROM events "
+                 f"WHERE kind = ?{run_filter}) GROUP BY day")
+        return {date.fromisoformat(day): count for day, count in self._conn.execute(query, [kind] + params)}
+
+    def daily_lines(self, kind, run_ids=None, exclude_created_same_day=False, hash_algorithm=None):
+        """{date: soma das linhas} dos arquivos distintos com evento kind em cada dia.
+
+        exclude_created_same_day (para 'modified') tira os arquivos criados no
+        mesmo dia, cujas linhas já contam como criadas - a regra do gráfico de LOC.
+        """
+        run_filter, params = self._filter(run_ids, hash_algorithm)
+        same_day = ""
+        if exclude_created_same_day:
+            created_filter, created_params = self._filter(run_ids, hash_algorithm, alias="created")
+            same_day = (" AND NOT EXISTS (SELECT 1 FROM events AS created WHERE created.file_hash = events.file_hash"
+                        " AND created.hash_algorithm IS events.hash_algorithm"
+                        f" AND created.kind = 'created' AND created.day = events.day{created_filter})")
+            params = params + created_params
+        query = (f"SELECT day, sum(lines) FROM (SELECT DISTINCT day, hash_algorithm, file_hash, lines FROM events "
+                 f"WHERE kind = ? AND lines IS NOT NULL{run_filter}{same_day}) GROUP BY day")
+        return {date.fromisoformat(day): lines for day, lines in self._conn.execute(query, [kind] + params)}
+
+    def slots_by_date(self, run_ids=None, hash_algorithm=None):
+        """{date: {intervalos de 30 min com algum evento}} - criação ou modificação, como no gráfico de horas."""
+        run_filter, params = self._filter(run_ids, hash_algorithm)
+        slots = {}
+        for day, slot in self._conn.execute(f"SELECT DISTINCT day, slot FROM events WHERE 1 = 1{run_filter}", params):
+            slots.setdefault(date.fromisoformat(day), set()).add(slot)
+        return slots
+
+    def day_counts_by_year(self, kind, run_ids=None, hash_algorithm=None):
+        """{ano: {date: arquivos}} - o formato dos heatmaps unificados."""
+        by_year = {}
+        for day, count in self.daily_counts(kind, run_ids, hash_algorithm).items():
+            by_year.setdefault(day.year, {})[day] = count
+        return by_year
+
+    def totals(self, run_ids=None, hash_algorithm=None):
+        """(arquivos distintos, soma das linhas deles) nas execuções."""
+        run_filter, params = self._filter(run_ids, hash_algorithm, alias="files")
+        query = (f"SELECT count(*), coalesce(sum(lines), 0) FROM "
+                 f"(SELECT DISTINCT hash_algorithm, file_hash, lines FROM files WHERE 1 = 1{run_filter})")
+        files, lines = self._conn.execute(query, params).fetchone()
+        return files, lines
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def daily_frame(columns):
+    """DataFrame indexado por data a partir de {coluna: {date: valor}} (dias ausentes = 0), para os gráficos anuais."""
+    import pandas as pd # Só quem desenha com pandas precisa dele
+    frame = pd.DataFrame({name: pd.Series(values, dtype='float64') for name, values in columns.items()})
+    frame = frame.fillna(0).astype(int)
+    frame.index = pd.to_datetime(frame.index)
+    return frame.sort_index()
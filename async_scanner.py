@@ -0,0 +1,281 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from heatmap_scanner import make_file_record, hash_and_count_file, inode_key, SCAN_PENDING_PER_WORKER
+from ignore_rules import IgnoreMatcher
+from scan_stream import make_scan_record, iter_scan_records, UniqueHashSink
+from file_hashing import hash_and_count_lines
+
+# Operações bloqueantes (listar pasta, stat, leitura para hash) em andamento ao mesmo tempo.
+# Em compartilhamentos SMB/NFS cada uma espera uma ida e volta pela rede, então vale manter muitas.
+ASYNC_MAX_IN_FLIGHT = 64
+# Latência simulada (segundos por chamada bloqueante) na verificação contra a varredura síncrona
+ASYNC_CHECK_LATENCY = 0.005
+
+
+def _list_directory(path, latency=0.0):
+    """Lista uma pasta: [(nome, caminho, é_pasta, é_arquivo, inode)]. Entradas ilegíveis viram None."""
+    if latency:
+        time.sleep(latency)
+    listing = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                listing.append((entry.name, entry.path, entry.is_dir(follow_symlinks=False), entry.is_file(), entry.inode()))
+            except OSError:
+                listing.append(None)
+    return listing
+
+
+def _stat_file(path, inode, latency=0.0):
+    if latency:
+        time.sleep(latency)
+    return make_file_record(path, os.stat(path), inode)
+
+
+def _hash_file_task(path, hash_func, count_func, fused, latency=0.0):
+    if latency:
+        time.sleep(latency)
+    return hash_and_count_file(path, hash_func, count_func, fused)
+
+
+def _timed_call(metrics, stage, nbytes, func, *args):
+    """Executa func na thread do pool medindo só a execução (sem a espera no semáforo)."""
+    path = os.path.join(args[0], '') if stage == 'walk' else args[0]
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        metrics.add(stage, time.perf_counter() - started, nbytes, os.path.dirname(path))
+
+
+async def scan_to_sink_async(roots, pastas_ignoradas, hash_func, sink, extensions=(".py",), cache=None,
+                             count_func=None, fused=False, max_in_flight=ASYNC_MAX_IN_FLIGHT,
+                             latency=0.0, counters=None, metrics=None):
+    """Varre as raízes com asyncio e entrega um ScanRecord por arquivo ao sink.
+
+    Cada chamada bloqueante (listar pasta, stat, hash) vai para um pool de
+    threads e no máximo max_in_flight delas ficam em andamento (semáforo);
+    enquanto uma espera a rede, as outras seguem. As pastas e os arquivos
+    encontrados passam por filas atendidas por max_in_flight corrotinas fixas
+    cada; a fila de arquivos é limitada, então a listagem espera quando o hash
+    fica para trás (nada de uma corrotina por arquivo). Pastas, ignore matcher,
+    registros, hashes e memo de inodes (counters['inode_reused']) são os mesmos
+    de scan_files + iter_hashed_files (só a ordem de entrega muda). Cache,
+    matcher, memo e sink são usados apenas na thread do loop. latency
+    (segundos) é somada a cada chamada bloqueante para simular um
+    compartilhamento de rede numa pasta local. Com um ScanMetrics, cada chamada
+    bloqueante é medida na thread que a executa ('walk', 'stat', 'hash' ou
+    'hash+line_count'). Retorna counters.
+    """
+    if counters is None:
+        counters = {}
+    for key in ('scanned', 'matched', 'errors', 'ignored', 'inode_reused'):
+        counters.setdefault(key, 0)
+    matcher = pastas_ignoradas if isinstance(pastas_ignoradas, IgnoreMatcher) else IgnoreMatcher(pastas_ignoradas)
+    need_lines = fused or count_func is not None
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    hash_stage = 'hash+line_count' if fused else 'hash'
+    directories = asyncio.Queue() # (pasta, matcher da pasta-mãe): só caminhos, como a pilha do os.walk
+    files = asyncio.Queue(maxsize=max_in_flight * SCAN_PENDING_PER_WORKER)
+    inode_results = {} # inode_key -> (hash, linhas) já calculados
+    inode_reading = {} # inode_key em leitura -> future com (hash, linhas)
+    failures = []
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        async def blocking(stage, nbytes, func, *args):
+            async with semaphore:
+                if metrics is None:
+                    return await loop.run_in_executor(executor, func, *args)
+                return await loop.run_in_executor(executor, _timed_call, metrics, stage, nbytes, func, *args)
+
+        async def read(record):
+            try:
+                return await blocking(hash_stage, record['size'], _hash_file_task,
+                                      record['filepath'], hash_func, count_func, fused, latency)
+            except Exception as e:
+                print(f"Erro ao processar {record['filepath']} no worker: {e}")
+                return None, None
+
+        async def identify(record):
+            """(hash, linhas) pelo cache, pelo memo de inodes ou lendo o arquivo."""
+            cached = cache.lookup(record, need_lines=need_lines) if cache is not None else None
+            key = inode_key(record)
+            if cached is not None:
+                if key is not None:
+                    inode_results.setdefault(key, (cached['hash'], cached['lines']))
+                if metrics is not None:
+                    metrics.file_done()
+                return cached['hash'], cached['lines']
+            if key in inode_reading:
+                await asyncio.shield(inode_reading[key])
+            if key in inode_results:
+                counters['inode_reused'] += 1
+                if metrics is not None:
+                    metrics.add('inode_reuse', 0.0)
+                    metrics.file_done()
+                file_hash, lines = inode_results[key]
+            else:
+                # Primeiro caminho deste inode (ou a leitura dele falhou): lê por conta própria
+                reading = loop.create_future() if key is not None and key not in inode_reading else None
+                if reading is not None:
+                    inode_reading[key] = reading
+                file_hash, lines = await read(record)
+                if key is not None and file_hash:
+                    inode_results[key] = (file_hash, lines)
+                if reading is not None:
+                    del inode_reading[key]
+                    reading.set_result(None)
+                if metrics is not None:
+                    metrics.file_done(record['size'])
+            if cache is not None and file_hash:
+                cache.store(record, file_hash, lines)
+            return file_hash, lines
+
+        async def process_file(path, inode):
+            try:
+                record = await blocking('stat', 0, _stat_file, path, inode, latency)
+            except OSError:
+                counters['errors'] += 1
+                return
+            counters['matched'] += 1
+            file_hash, lines = await identify(record)
+            if file_hash:
+                sink.add(make_scan_record(record, file_hash, lines))
+
+        async def walk(path, parent_matcher):
+            try:
+                listing = await blocking('walk', 0, _list_directory, path, latency)
+            except OSError:
+                # Mesma política do os.walk: pastas ilegíveis são puladas
+                counters['errors'] += 1
+                return
+            folder_matcher = parent_matcher.for_directory(path, [item[0] for item in listing if item]) \
+                if parent_matcher.use_gitignore else parent_matcher
+            for item in listing:
+                if item is None:
+                    counters['errors'] += 1
+                    continue
+                name, entry_path, is_dir, is_file, inode = item
+                if is_dir:
+                    if folder_matcher.match(name, entry_path, True) is None:
+                        directories.put_nowait((entry_path, folder_matcher))
+                    else:
+                        counters['ignored'] += 1
+                    continue
+                if not is_file:
+                    continue
+                counters['scanned'] += 1
+                if not name.endswith(extensions):
+                    continue
+                if folder_matcher.match(name, entry_path, False) is not None:
+                    counters['ignored'] += 1
+                    continue
+                await files.put((entry_path, inode)) # Espera quando a fila de arquivos está cheia
+
+        async def serve(queue, handle):
+            # Um erro inesperado não derruba a corrotina (a fila nunca ficaria sem atendimento)
+            while True:
+                item = await queue.get()
+                try:
+                    await handle(*item)
+                except Exception as e:
+                    failures.append(e)
+                finally:
+                    queue.task_done()
+
+        for root in roots:
+            directories.put_nowait((root, matcher))
+        servers = [loop.create_task(serve(directories, walk)) for _ in range(max_in_flight)]
+        servers += [loop.create_task(serve(files, process_file)) for _ in range(max_in_flight)]
+        try:
+            await directories.join()
+            await files.join()
+        finally:
+            for server in servers:
+                server.cancel()
+            await asyncio.gather(*servers, return_exceptions=True)
+    if failures:
+        raise failures[0]
+    return counters
+
+
+def scan_to_sink(roots, pastas_ignoradas, hash_func, sink, **kwargs):
+    """Versão síncrona de scan_to_sink_async (roda o próprio loop de eventos)."""
+    return asyncio.run(scan_to_sink_async(roots, pastas_ignoradas, hash_func, sink, **kwargs))
+
+
+def compare_with_sync_scan(roots, pastas_ignoradas, hash_func=hash_and_count_lines, fused=True,
+                           latency=ASYNC_CHECK_LATENCY, max_in_flight=8):
+    """Varre as raízes com scan_to_sink (com latency) e com iter_scan_records e compara os dois.
+
+    Compara os vencedores (hash -> mtime e linhas; num empate de mtime o caminho
+    pode ser outro, já que a ordem de entrega muda), as contagens por hora e
+    counters['inode_reused']. Retorna a lista de diferenças (vazia = equivalentes).
+    """
+    async_sink = UniqueHashSink(winner_key='mtime', time_keys=('mtime',))
+    sync_sink = UniqueHashSink(winner_key='mtime', time_keys=('mtime',))
+    async_counters = scan_to_sink(roots, pastas_ignoradas, hash_func, async_sink, fused=fused,
+                                  max_in_flight=max_in_flight, latency=latency)
+    sync_counters = {}
+    for record in iter_scan_records(roots, pastas_ignoradas, hash_func, fused=fused, counters=sync_counters):
+        sync_sink.add(record)
+
+    def winners(sink):
+        return {file_hash: (record.mtime, record.lines) for file_hash, record in sink.winners.items()}
+
+    differences = []
+    if winners(async_sink) != winners(sync_sink):
+        differences.append(f"vencedores: {len(async_sink.winners)} (async) x {len(sync_sink.winners)} (síncrona)")
+    if async_sink.hour_counts() != sync_sink.hour_counts():
+        differences.append("contagens por hora diferentes")
+    for key in ('matched', 'inode_reused'):
+        if async_counters.get(key, 0) != sync_counters.get(key, 0):
+            differences.append(f"{key}: {async_counters.get(key, 0)} (async) x {sync_counters.get(key, 0)} (síncrona)")
+    return differences
+
+
+def _build_check_tree(root):
+    """Árvore pequena com cópias (mtimes diferentes), hard links, pasta ignorada e arquivo de outra extensão."""
+    for index in range(40):
+        folder = os.path.join(root, f"pasta{index % 4}", "sub")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"modulo{index}.py")
+        with open(path, "w") as file:
+            file.write("print(%d)\n" % (index % 15) * (index % 15 + 1)) # Cópias: index, index + 15, index + 30
+        os.utime(path, (1700000000 + index * 3600, 1700000000 + index * 3600))
+        if index % 10 == 0:
+            try:
+                os.link(path, os.path.join(root, f"link{index}.py"))
+            except OSError:
+                pass # Sistema de arquivos sem hard links: só o memo deixa de ser exercitado
+    os.makedirs(os.path.join(root, "__pycache__"))
+    with open(os.path.join(root, "__pycache__", "ignorado.py"), "w") as file:
+        file.write("x = 1\n")
+    with open(os.path.join(root, "leia-me.txt"), "w") as file:
+        file.write("não é .py\n")
+
+
+def main():
+    """Confere a varredura asyncio contra a síncrona: numa pasta (argumento) ou numa árvore temporária."""
+    pastas_ignoradas = {'__pycache__', '.git'}
+    if len(sys.argv) > 1:
+        differences = compare_with_sync_scan(sys.argv[1:], pastas_ignoradas)
+    else:
+        with tempfile.TemporaryDirectory() as root:
+            _build_check_tree(root)
+            differences = compare_with_sync_scan([root], pastas_ignoradas)
+    if differences:
+        print("Varredura asyncio DIFERENTE da síncrona:")
+        for difference in differences:
+            print(f"  - {difference}")
+        sys.exit(1)
+    print(f"Varredura asyncio (latência simulada de {ASYNC_CHECK_LATENCY}s) igual à síncrona: vencedores, horas e inodes reaproveitados.")
+
+
+if __name__ == "__main__":
+    main()
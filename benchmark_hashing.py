@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import tempfile
+from file_hashing import hash_file, new_hasher, HASH_CHUNK_SIZE
+
+# Tamanho (MB) do arquivo temporário gerado quando nenhum arquivo é informado
+BENCHMARK_FILE_SIZE_MB = 512
+# Quantas vezes cada estratégia é executada (vale o melhor tempo, com o arquivo já no cache do SO)
+BENCHMARK_REPEATS = 3
+# Algoritmos comparados em benchmark_hash_algorithms (mesmo formato de HASH_ALGORITHM dos scripts)
+BENCHMARK_ALGORITHMS = ["sha256", "sha1", "md5", "blake2b", "blake2b:16", "blake2s:16"]
+
+
+def hash_file_legacy(filepath, algorithm="sha256"):
+    """Estratégia original dos scripts: read() de 4096 bytes por vez."""
+    hasher = new_hasher(algorithm)
+    with open(filepath, 'rb') as file:
+        while True:
+            chunk = file.read(4096)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _best_throughput(func, filepath, repeats):
+    """Executa func(filepath) repeats vezes; retorna (MB/s do melhor tempo, conjunto de digests)."""
+    size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    best = None
+    digests = set()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        digests.add(func(filepath))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return (size_mb / best if best else float('inf')), digests
+
+
+def benchmark_hash_strategies(filepath, repeats=BENCHMARK_REPEATS, block_size=HASH_CHUNK_SIZE, algorithm="sha256"):
+    """Mede cada estratégia de leitura no mesmo arquivo e imprime MB/s. Retorna {estratégia: MB/s}."""
+    size = os.path.getsize(filepath)
+    strategies = {
+        'read 4 KB (original)': lambda path: hash_file_legacy(path, algorithm),
+        f'readinto {block_size // 1024} KB': lambda path: hash_file(path, block_size, float('inf'), algorithm),
+        f'mmap + memoryview {block_size // 1024} KB': lambda path: hash_file(path, block_size, 0, algorithm),
+    }
+
+    print(f"Arquivo: {filepath} ({size / (1024 * 1024):.1f} MB), {algorithm}, melhor de {repeats} execuções")
+    results = {}
+    digests = set()
+    for name, func in strategies.items():
+        results[name], strategy_digests = _best_throughput(func, filepath, repeats)
+        digests |= strategy_digests
+        print(f"  {name:<28} {results[name]:10.1f} MB/s")
+
+    if len(digests) != 1:
+        print("ERRO: as estratégias produziram hashes diferentes!")
+    return results
+
+
+def benchmark_hash_algorithms(filepath, algorithms=BENCHMARK_ALGORITHMS, repeats=BENCHMARK_REPEATS):
+    """Mede a vazão (MB/s) de cada algoritmo de digest com a leitura adaptativa de hash_file."""
+    print(f"Algoritmos de digest, melhor de {repeats} execuções:")
+    results = {}
+    for algorithm in algorithms:
+        results[algorithm], _ = _best_throughput(lambda path: hash_file(path, algorithm=algorithm), filepath, repeats)
+        print(f"  {algorithm:<28} {results[algorithm]:10.1f} MB/s")
+    return results
+
+
+def main():
+    if len(sys.argv) > 1:
+        benchmark_hash_strategies(sys.argv[1])
+        benchmark_hash_algorithms(sys.argv[1])
+        return
+
+    size_mb = BENCHMARK_FILE_SIZE_MB
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as temp:
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            temp.write(block)
+        temp_path = temp.name
+    try:
+        benchmark_hash_strategies(temp_path)
+        benchmark_hash_algorithms(temp_path)
+    finally:
+        os.remove(temp_path)
+
+
+if __name__ == "__main__":
+    main()
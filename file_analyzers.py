@@ -0,0 +1,141 @@
+import os
+import time
+import itertools
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from heatmap_scanner import scan_files, inode_key, SCAN_WORKERS_DEFAULT, SCAN_PENDING_PER_WORKER
+from file_hashing import hash_and_count_lines, hash_file, DEFAULT_HASH_ALGORITHM
+
+
+def make_analyzer(name, extensions, func, workers=1):
+    """Descreve um analisador: func(filepath) roda para cada arquivo terminado em uma das extensions.
+
+    workers é o orçamento próprio do analisador (tamanho do pool de threads dele):
+    um analisador lento ou pesado em I/O (ex. estatísticas de SQLite) não ocupa os
+    workers dos outros. O retorno de func vai para results[name]; exceções viram None.
+    """
+    return {'name': name, 'extensions': tuple(extensions), 'func': func, 'workers': max(1, int(workers))}
+
+
+def line_counter(extensions=(".py",), algorithm=DEFAULT_HASH_ALGORITHM, workers=SCAN_WORKERS_DEFAULT, name='lines'):
+    """Analisador de código-fonte: (hash, linhas) numa única leitura (hash_and_count_lines)."""
+    return make_analyzer(name, extensions, partial(hash_and_count_lines, algorithm=algorithm), workers)
+
+
+def content_hasher(extensions, algorithm=DEFAULT_HASH_ALGORITHM, workers=2, name='hash', **hash_options):
+    """Analisador que só calcula o hash do conteúdo (ex. bancos de dados, binários).
+
+    hash_options vai para hash_file (block_size, mmap_threshold). Falhas de leitura
+    viram None, como nos calculate_file_hash dos scripts.
+    """
+    return make_analyzer(name, extensions, partial(hash_file, algorithm=algorithm, **hash_options), workers)
+
+
+def _run_analyzer(func, filepath, metrics=None, name=None, size=0):
+    started = time.perf_counter()
+    try:
+        return func(filepath)
+    except Exception as e:
+        print(f"Erro ao analisar {filepath}: {e}")
+        return None
+    finally:
+        if metrics is not None:
+            metrics.add(name, time.perf_counter() - started, size, os.path.dirname(filepath))
+
+
+def scan_with_analyzers(roots, pastas_ignoradas, analyzers, counters=None, metrics=None):
+    """Percorre as raízes UMA vez e executa, para cada arquivo, todos os analisadores da extensão dele.
+
+    O walker (scan_files) recebe a união das extensões dos analisadores. Cada
+    analisador tem seu próprio pool com `workers` threads; um arquivo só é
+    entregue - (registro, {nome do analisador: resultado}) - quando todos os
+    analisadores dele terminaram. A ordem de saída é a de conclusão. O número de
+    tarefas pendentes é limitado (SCAN_PENDING_PER_WORKER por worker somado de
+    todos os pools), então o walker não corre à frente sem limite.
+    counters recebe os contadores do walker e counters['analyzed'] = {nome: arquivos}.
+    Com um ScanMetrics, cada analisador é um estágio (tempo medido na thread dele)
+    e o walker registra 'walk' e 'stat'. Um caminho cujo inode_key já foi
+    analisado (hard link, bind mount) recebe os mesmos resultados sem nova
+    leitura; counters['inode_reused'] conta esses arquivos.
+    """
+    if counters is None:
+        counters = {}
+    counters.setdefault('inode_reused', 0)
+    analyzed = counters.setdefault('analyzed', {})
+    for analyzer in analyzers:
+        analyzed.setdefault(analyzer['name'], 0)
+    extensions = tuple(sorted({extension for analyzer in analyzers for extension in analyzer['extensions']}))
+    max_pending = sum(analyzer['workers'] for analyzer in analyzers) * SCAN_PENDING_PER_WORKER
+
+    executors = {analyzer['name']: ThreadPoolExecutor(max_workers=analyzer['workers']) for analyzer in analyzers}
+    pending = {} # future -> (id do arquivo, nome do analisador)
+    in_progress = {} # id do arquivo -> [registro, resultados, analisadores restantes]
+    inode_results = {} # inode_key -> resultados já completos
+    inode_waiting = {} # inode_key em análise -> registros esperando os resultados
+
+    def reuse(record, results):
+        counters['inode_reused'] += 1
+        if metrics is not None:
+            metrics.add('inode_reuse', 0.0)
+            metrics.file_done()
+        return record, dict(results)
+
+    def collect(done):
+        for future in done:
+            file_id, name = pending.pop(future)
+            entry = in_progress[file_id]
+            entry[1][name] = future.result() # _run_analyzer já trata as exceções
+            analyzed[name] += 1
+            entry[2] -= 1
+            if entry[2] == 0:
+                del in_progress[file_id]
+                if metrics is not None:
+                    metrics.file_done(entry[0]['size'])
+                yield entry[0], entry[1]
+                key = inode_key(entry[0])
+                if key is not None:
+                    inode_results[key] = entry[1]
+                    for waiting in inode_waiting.pop(key, ()):
+                        yield reuse(waiting, entry[1])
+
+    try:
+        records = itertools.chain.from_iterable(
+            scan_files(root, pastas_ignoradas, extensions, counters, metrics=metrics) for root in roots)
+        for file_id, record in enumerate(records):
+            matching = [analyzer for analyzer in analyzers if record['filepath'].endswith(analyzer['extensions'])]
+            if not matching:
+                if metrics is not None:
+                    metrics.file_done()
+                yield record, {}
+                continue
+            key = inode_key(record)
+            if key is not None:
+                if key in inode_results:
+                    yield reuse(record, inode_results[key])
+                    continue
+                if key in inode_waiting:
+                    inode_waiting[key].append(record)
+                    continue
+                inode_waiting[key] = []
+            in_progress[file_id] = [record, {}, len(matching)]
+            for analyzer in matching:
+                future = executors[analyzer['name']].submit(_run_analyzer, analyzer['func'], record['filepath'],
+                                                            metrics, analyzer['name'], record['size'])
+                pending[future] = (file_id, analyzer['name'])
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def print_analyzer_stats(counters):
+    """Resumo da varredura: arquivos vistos e quantos cada analisador processou."""
+    print(f"Varredura única: {counters.get('scanned', 0)} arquivos vistos, {counters.get('matched', 0)} analisados.")
+    for name, count in counters.get('analyzed', {}).items():
+        print(f"  -> {name}: {count} arquivos")
+    print(f"  -> Leituras evitadas (mesmo inode por outro caminho): {counters.get('inode_reused', 0)}")
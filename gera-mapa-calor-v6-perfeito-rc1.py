@@ -1,10 +1,24 @@
 import os
+import sys
 import hashlib
 from datetime import datetime, date, timedelta
 import pandas as pd
 from PIL import Image, ImageDraw, ImageFont, ImageOps # ImageOps para possível espelhamento de texto
 import tkinter as tk
 from tkinter import filedialog
+from scan_cache import ScanCache
+from heatmap_scanner import scan_roots_concurrently, print_inode_reuse_stats
+from ignore_rules import IgnoreMatcher
+from file_hashing import hash_and_count_lines, hash_file
+from functools import partial
+from heatmap_watch import ActivityAggregate, watch_roots
+from scan_stream import UniqueHashSink, iter_scan_records, consume
+from record_store import FileRecordStore, save_snapshot, load_snapshot
+from async_scanner import scan_to_sink
+from scan_checkpoint import ScanCheckpoint, checkpoint_path_for
+from scan_metrics import ScanMetrics, metrics_report_path_for
+from scan_sampling import DirectorySampler, print_sample_estimate
+from git_activity import aggregate_git_activity
 import calendar
 
 # Configurações de Design (Ajustadas para alta densidade e maior resolução)
@@ -54,20 +68,69 @@ FONT_BOLD_NAME = "arialbd"
 FONT_LEGEND_NAME = "arial"
 # --- FIM DOS PARÂMETROS DE LAYOUT ---
 
-# Funções auxiliares (calculate_file_hash, get_file_times, count_lines_of_code, scan_directory_for_py_files)
+# --- Cache de Varredura ---
+USE_SCAN_CACHE = True # Reaproveita hash/linhas de arquivos inalterados entre execuções
+SCAN_CACHE_PATH = "heatmap_scan_cache.sqlite"
+SCAN_WORKERS = os.cpu_count() or 4 # Workers para hash/contagem de linhas, no total (divididos entre os processos das pastas; 1 = sequencial)
+SCAN_USE_PROCESSES = False # True = pool de processos (CPU); False = pool de threads (I/O)
+HASH_ALGORITHM = "blake2b:16" # Digest da deduplicação (qualquer do hashlib, ex. "sha256"; "blake2b:16" = rápido)
+SCAN_ROOT_PROCESSES = os.cpu_count() or 4 # Pastas varridas ao mesmo tempo, uma por processo (1 = uma de cada vez)
+USE_ASYNC_SCAN = False # True = varredura com asyncio (muitos stat/leituras em andamento; bom para SMB/NFS)
+ASYNC_MAX_IN_FLIGHT = 64 # Máximo de operações de disco/rede simultâneas na varredura asyncio
+
+# --- Checkpoint da Varredura ---
+USE_SCAN_CHECKPOINT = True # Grava o progresso de cada pasta durante a varredura (não vale para USE_ASYNC_SCAN)
+SCAN_CHECKPOINT_DIR = "heatmap_scan_checkpoints" # Um checkpoint por pasta selecionada; apagado quando a varredura termina
+SCAN_CHECKPOINT_INTERVAL_SECONDS = 5 # Intervalo mínimo entre gravações
+RESUME_SCAN = "--resume" in sys.argv # Rode com --resume para continuar do último checkpoint em vez de começar do zero
+
+# --- Métricas da Varredura ---
+SCAN_METRICS = True # Linha de progresso + tempo por estágio (walk, stat, hash+linhas, cache) e pastas mais lentas
+SCAN_METRICS_DIR = "heatmap_scan_metrics" # Relatório JSON de cada pasta selecionada (None = só no console)
+SCAN_PROGRESS_INTERVAL_SECONDS = 2 # Intervalo da linha de progresso (0 = só o resumo final)
+
+# --- Amostragem (prévia rápida de árvores enormes) ---
+SCAN_SAMPLE_FRACTION = None # Ex. 0.05 = hash/linhas de só 5% dos arquivos de cada pasta, contagens escaladas e IC 95% na legenda; None = exato
+SCAN_SAMPLE_MIN_PER_DIRECTORY = 2 # Mínimo sorteado por pasta (pastas pequenas são lidas inteiras)
+SCAN_SAMPLE_SEED = None # Inteiro = mesma amostra a cada execução; None = sorteio novo
+
+# --- Snapshot da Varredura ---
+SNAPSHOT_PATH = "heatmap_scan_snapshot_rc1.npz" # Resultado da varredura em colunas (NumPy .npz): redesenhar sem varrer (um arquivo por script)
+SAVE_SNAPSHOT = True # Grava o snapshot depois de cada varredura
+LOAD_SNAPSHOT = False # True = desenha a partir do snapshot, sem seletor de pastas e sem ler o disco
+
+# --- Modo de Observação ---
+WATCH_MODE = False # True = continua rodando e redesenha só os anos que mudaram
+WATCH_INTERVAL_SECONDS = 60 # Intervalo entre varreduras (só stat) das pastas
+
+# --- Fonte de Atividade ---
+ACTIVITY_SOURCE = "filesystem" # "filesystem" = datas dos arquivos; "git" = histórico de commits (cada pasta é um repositório)
+GIT_TIME_FIELD = "author" # "author" = data em que a mudança foi escrita; "committer" = data do commit
+
+# Pastas/arquivos que não entram na varredura: nomes (comparação em minúsculas) ou globs como '*.egg-info'
+# e '._*'; pastas iniciadas por '.' também são puladas
+_pastas_ignoradas = set([
+    'venv', '.venv', 'env', '.env', 'lib', 'lib64', 'site-packages', 'dist-packages', 'eggs',
+    'pip-wheel-metadata', '__pycache__', 'build', 'dist', 'docs', 'doc', 'etc', 'static',
+    'templates', 'media', 'node_modules', '.git', '.svn', '.hg', '.CVS', '.idea', '.vscode',
+    'spyder-py3', '.pylint.d', '.mypy_cache', '.pytest_cache', '__pypackages__', 'wheelhouse',
+    'htmlcov', '.coverage', 'coverage.xml', '*.egg-info', 'MANIFEST', 'sphinx-build', '_build',
+    '_static', '_templates', 'data', 'resources', 'assets', 'out', 'output', 'target', 'log',
+    'logs', 'tmp', 'temp', 'cache', 'caches', '.gradle', '.mvn', '.docker', '.vagrant', '.terraform',
+    'ansible', '.terraform.lock.hcl', '.DS_Store', '.Trashes', '$RECYCLE.BIN', 'System Volume Information',
+    '._*', '._.Trashes', '._.DS_Store', '.localized', '.AppleDouble',
+])
+_pastas_para_manter = {'test', 'tests', 'testing', 'integration-tests', 'unit-tests', 'functional-tests', 'benchmark', 'benchmarks', 'example', 'examples', 'sample', 'samples', 'notebooks'}
+PASTAS_IGNORADAS = _pastas_ignoradas.difference(_pastas_para_manter)
+USE_GITIGNORE = False # True = também respeita os .gitignore encontrados nas pastas varridas
+
+# Funções auxiliares (calculate_file_hash, get_file_times, count_lines_of_code, scan_directory_to_sink)
 # Mantidas EXATAMENTE como na versão anterior. Omitidas aqui por brevidade.
 
 def calculate_file_hash(filepath):
-    """Calcula o hash SHA256 de um arquivo."""
-    hasher = hashlib.sha256()
+    """Calcula o hash (HASH_ALGORITHM) de um arquivo."""
     try:
-        with open(filepath, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(filepath, algorithm=HASH_ALGORITHM)
     except Exception as e:
         print(f"Erro ao calcular hash de {filepath}: {e}")
         return None
@@ -114,75 +177,63 @@ def count_lines_of_code(filepath):
         return 0
 
 
-def scan_directory_for_py_files(directory):
-    """Varre o diretório em busca de arquivos .py, calcula hash e datas."""
-    file_data = []
-    unique_files_by_hash = {}
-    total_lines = 0
-
-    pastas_ignoradas = set([
-        'venv', '.venv', 'env', '.env', 'lib', 'lib64', 'site-packages', 'dist-packages', 'eggs',
-        'pip-wheel-metadata', '__pycache__', 'build', 'dist', 'docs', 'doc', 'etc', 'static',
-        'templates', 'media', 'node_modules', '.git', '.svn', '.hg', '.CVS', '.idea', '.vscode',
-        'spyder-py3', '.pylint.d', '.mypy_cache', '.pytest_cache', '__pypackages__', 'wheelhouse',
-        'htmlcov', '.coverage', 'coverage.xml', '*.egg-info', 'MANIFEST', 'sphinx-build', '_build',
-        '_static', '_templates', 'data', 'resources', 'assets', 'out', 'output', 'target', 'log',
-        'logs', 'tmp', 'temp', 'cache', 'caches', '.gradle', '.mvn', '.docker', '.vagrant', '.terraform',
-        'ansible', '.terraform.lock.hcl', '.DS_Store', '.Trashes', '$RECYCLE.BIN', 'System Volume Information',
-        '._*', '._.Trashes', '._.DS_Store', '.localized', '.AppleDouble',
-    ])
-    pastas_para_manter = {'test', 'tests', 'testing', 'integration-tests', 'unit-tests', 'functional-tests', 'benchmark', 'benchmarks', 'example', 'examples', 'sample', 'samples', 'notebooks'}
-    pastas_ignoradas = pastas_ignoradas.difference(pastas_para_manter)
+def scan_directory_to_sink(directory, cache=None, workers=SCAN_WORKERS, use_processes=SCAN_USE_PROCESSES):
+    """Varre o diretório em busca de arquivos .py e agrega em streaming num UniqueHashSink.
 
+    Fica o arquivo de mtime mais recente por hash: a memória depende do número de
+    hashes únicos, não do número de arquivos percorridos. As contagens por hora
+    saem depois do FileRecordStore, então o sink só deduplica. O sink é pequeno e
+    picklable (volta do processo filho). Retorna (sink, sampler): com
+    SCAN_SAMPLE_FRACTION, sampler é o DirectorySampler com os estratos de cada
+    pasta (a amostragem usa a varredura com threads e não grava checkpoint);
+    sem amostragem, None.
+    """
     print(f"Iniciando varredura em: {directory}")
-    scanned_files_count = 0
-    py_files_count = 0
-
-    for pasta_raiz, subpastas, arquivos in os.walk(directory, topdown=True):
-        subpastas[:] = [
-            subpasta for subpasta in subpastas
-            if subpasta.lower() not in pastas_ignoradas and not subpasta.startswith('.')
-        ]
-        for arquivo in arquivos:
-            scanned_files_count += 1
-            if arquivo.endswith(".py"):
-                py_files_count += 1
-                caminho_arquivo = os.path.join(pasta_raiz, arquivo)
-                file_hash = calculate_file_hash(caminho_arquivo)
-                creation_time, modification_time = get_file_times(caminho_arquivo)
-
-                if file_hash and creation_time and modification_time:
-                    is_newer = True
-                    if file_hash in unique_files_by_hash:
-                        # Garante que a comparação seja feita apenas se o tempo existente for válido
-                        existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
-                        if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
-                           is_newer = False
-
-                    if is_newer:
-                        lines = count_lines_of_code(caminho_arquivo)
-                         # Subtrai linhas antigas apenas se existirem e forem número válido
-                        if file_hash in unique_files_by_hash:
-                            existing_lines = unique_files_by_hash[file_hash].get('lines')
-                            if isinstance(existing_lines, (int, float)):
-                                total_lines -= existing_lines
-
-                        unique_files_by_hash[file_hash] = {
-                            'creation_time': creation_time,
-                            'modification_time': modification_time,
-                            'filepath': caminho_arquivo,
-                            'lines': lines,
-                            'hash': file_hash
-                        }
-                        # Adiciona novas linhas apenas se for um número válido
-                        if isinstance(lines, (int, float)):
-                             total_lines += lines
-
+    walk_counters = {'scanned': 0, 'matched': 0}
+    sink = UniqueHashSink(winner_key='mtime', time_keys=())
+    sampler = DirectorySampler(SCAN_SAMPLE_FRACTION, SCAN_SAMPLE_MIN_PER_DIRECTORY, SCAN_SAMPLE_SEED) if SCAN_SAMPLE_FRACTION else None
+    metrics = ScanMetrics(os.path.basename(os.path.abspath(directory)), SCAN_PROGRESS_INTERVAL_SECONDS) if SCAN_METRICS else None
+
+    # O walker alimenta o pool; o sink roda só nesta thread
+    ignore_matcher = IgnoreMatcher(PASTAS_IGNORADAS, use_gitignore=USE_GITIGNORE)
+    # Hash + linhas numa única leitura binária por arquivo (sem decodificar texto)
+    hash_func = partial(hash_and_count_lines, algorithm=HASH_ALGORITHM)
+    if USE_ASYNC_SCAN and sampler is None:
+        scan_to_sink([directory], ignore_matcher, hash_func, sink, extensions=(".py",), cache=cache, fused=True,
+                     max_in_flight=ASYNC_MAX_IN_FLIGHT, counters=walk_counters, metrics=metrics)
+    else:
+        checkpoint = None
+        if USE_SCAN_CHECKPOINT and sampler is None:
+            checkpoint = ScanCheckpoint(checkpoint_path_for(directory, SCAN_CHECKPOINT_DIR), directory, HASH_ALGORITHM,
+                                        SCAN_CHECKPOINT_INTERVAL_SECONDS)
+            if RESUME_SCAN:
+                checkpoint.resume(sink)
+            else:
+                checkpoint.start()
+        records = iter_scan_records([directory], ignore_matcher, hash_func, (".py",),
+                                    cache, workers, use_processes, fused=True, counters=walk_counters,
+                                    checkpoint=checkpoint, metrics=metrics, sampler=sampler)
+        try:
+            consume(records, sink)
+        except BaseException:
+            # Interrompida (Ctrl+C, erro): o progresso fica gravado para o --resume
+            if checkpoint is not None:
+                checkpoint.close()
+            raise
+        if checkpoint is not None:
+            checkpoint.finish()
+
+    if metrics is not None:
+        metrics.print_summary() # Antes dos outros prints: fecha a linha de progresso
+        if SCAN_METRICS_DIR:
+            metrics.write_json(metrics_report_path_for(directory, SCAN_METRICS_DIR))
+    scanned_files_count = walk_counters['scanned']
+    py_files_count = walk_counters['matched']
     print(f"Varredura concluída. Total de arquivos escaneados: {scanned_files_count}. Arquivos .py encontrados: {py_files_count}.")
-    print(f"Arquivos .py únicos (baseado no hash e mtime): {len(unique_files_by_hash)}.")
-
-    file_data = list(unique_files_by_hash.values())
-    return pd.DataFrame(file_data), total_lines, len(unique_files_by_hash)
+    print(f"Arquivos .py únicos (baseado no hash e mtime): {sink.unique_count()}.")
+    print_inode_reuse_stats(walk_counters)
+    ignore_matcher.print_stats()
+    return sink, sampler
 
 def draw_simple_rectangle(draw_context, position, size, fill_color):
     """Desenha um retângulo simples."""
@@ -191,98 +242,182 @@ def draw_simple_rectangle(draw_context, position, size, fill_color):
     # Adicionado +1 na coordenada final para garantir preenchimento completo do pixel
     draw_context.rectangle([x, y, x + width , y + height ], fill=fill_color, outline=None)
 
-def generate_final_detailed_heatmap(
-    df_activity_full, # DataFrame com todos os dados
-    start_year_input, # Ano inicial fornecido pelo usuário
-    time_column,
+def load_detailed_heatmap_fonts():
+    """Fontes do heatmap detalhado: (ano, mês, eixos, legenda, título)."""
+    try:
+        windows_font_dir = r"C:\Windows\Fonts"
+        font_year_label = ImageFont.truetype(os.path.join(windows_font_dir, FONT_BOLD_NAME + ".ttf"), FONT_SIZE_YEAR)
+        font_month_label = ImageFont.truetype(os.path.join(windows_font_dir, FONT_BOLD_NAME + ".ttf"), FONT_SIZE_MONTH)
+        font_axis_label = ImageFont.truetype(os.path.join(windows_font_dir, FONT_NAME + ".ttf"), FONT_SIZE_AXIS)
+        font_legend = ImageFont.truetype(os.path.join(windows_font_dir, FONT_LEGEND_NAME + ".ttf"), FONT_SIZE_LEGEND)
+        font_title = ImageFont.truetype(os.path.join(windows_font_dir, FONT_BOLD_NAME + ".ttf"), FONT_SIZE_TITLE)
+    except IOError:
+        print("Fontes Arial não encontradas. Usando fontes padrão.")
+        font_year_label, font_month_label, font_axis_label, font_legend, font_title = [ImageFont.load_default()] * 5
+    return font_year_label, font_month_label, font_axis_label, font_legend, font_title
+
+def detailed_month_grid_size():
+    """(largura, altura) da grade de UM MÊS (fixas) e largura total do conteúdo."""
+    month_grid_width = DAYS_IN_MONTH_MAX * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) - HOUR_SQUARE_PADDING
+    month_grid_height = HOURS_IN_DAY * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) - HOUR_SQUARE_PADDING
+    # Largura total baseada em MONTHS_PER_ROW
+    total_content_width = MONTHS_PER_ROW * month_grid_width + max(0, MONTHS_PER_ROW - 1) * MONTH_GRID_PADDING_X
+    return month_grid_width, month_grid_height, total_content_width
+
+def detailed_year_block_height(num_active_months):
+    """Altura do bloco de um ano (rótulo + linhas de meses ativos), sem o padding entre anos."""
+    _, month_grid_height, _ = detailed_month_grid_size()
+    if num_active_months == 0:
+        return 0
+    num_month_rows_this_year = (num_active_months + MONTHS_PER_ROW - 1) // MONTHS_PER_ROW
+    year_content_height = num_month_rows_this_year * (MONTH_LABEL_HEIGHT + month_grid_height) + max(0, num_month_rows_this_year - 1) * MONTH_GRID_PADDING_Y
+    return YEAR_LABEL_HEIGHT + year_content_height
+
+def render_detailed_year_block(year, active_months_in_year, hour_counts, fonts):
+    """Desenha o bloco de UM ano numa imagem própria (tile) e a retorna.
+
+    O tile inclui os YEAR_BLOCK_PADDING_Y pixels abaixo do bloco (onde ficam os
+    números dos dias da última linha de meses). hour_counts é
+    {(ano, mês, dia, hora): contagem}.
+    """
+    font_year_label, font_month_label, font_axis_label, font_legend, font_title = fonts
+    month_grid_width, month_grid_height, total_content_width = detailed_month_grid_size()
+    image_width = MARGIN_LEFT + total_content_width + MARGIN_RIGHT
+    tile_height = detailed_year_block_height(len(active_months_in_year)) + YEAR_BLOCK_PADDING_Y
+    image = Image.new('RGB', (int(image_width), int(tile_height)), IMAGE_BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+
+    print(f"Desenhando ano: {year}...")
+    year_start_y = 0
+
+    # Desenha Rótulo do Ano
+    year_text = str(year)
+    try: year_text_w = draw.textlength(year_text, font=font_year_label)
+    except: year_text_w = draw.textbbox((0,0), year_text, font=font_year_label)[2]
+    year_label_x = MARGIN_LEFT + (total_content_width - year_text_w) / 2
+    year_label_y = year_start_y
+    draw.text((year_label_x, year_label_y), year_text, font=font_year_label, fill=FONT_COLOR)
+
+    current_month_base_y = year_start_y + YEAR_LABEL_HEIGHT
+
+    # --- Desenhar Grades Mensais ATIVAS dentro do Ano ---
+    for active_month_idx, month in enumerate(active_months_in_year):
+        month_row_index = active_month_idx // MONTHS_PER_ROW
+        month_col_index = active_month_idx % MONTHS_PER_ROW
+
+        # Calcula posição X e Y da grade deste mês ATIVO
+        month_start_x = MARGIN_LEFT + month_col_index * (month_grid_width + MONTH_GRID_PADDING_X)
+        month_start_y = current_month_base_y + month_row_index * (MONTH_LABEL_HEIGHT + month_grid_height + MONTH_GRID_PADDING_Y)
+
+        # Desenha Rótulo do Mês
+        month_name = date(year, month, 1).strftime('%B') # Nome completo
+        try: month_text_w = draw.textlength(month_name, font=font_month_label)
+        except: month_text_w = draw.textbbox((0,0), month_name, font=font_month_label)[2]
+        month_label_x = month_start_x + (month_grid_width - month_text_w) / 2
+        month_label_y = month_start_y
+        draw.text((month_label_x, month_label_y), month_name, font=font_month_label, fill=FONT_COLOR)
+
+        grid_start_y = month_start_y + MONTH_LABEL_HEIGHT
+
+        # Desenha Rótulos de Eixo (Hora/Dia) - com mais espaçamento
+        if month_col_index == 0: # Horas à esquerda da primeira coluna de meses
+            for hr in range(0, 24, 4): # 0h, 4h, 8h ... 20h
+                hour_text = f"{hr:02d}h"
+                try: text_h = font_axis_label.getmetrics()[0]
+                except: text_h = 10
+                text_y = grid_start_y + hr * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) + (HOUR_SQUARE_SIZE - text_h // 2)
+                draw.text((MARGIN_LEFT - 35, text_y), hour_text, font=font_axis_label, fill=FONT_COLOR, anchor="lm")
+
+        # Dias abaixo da grade
+        day_label_y = grid_start_y + month_grid_height + 10
+        days_to_label = [1, 10, 20, DAYS_IN_MONTH_MAX]
+        for day_label in days_to_label:
+             col = day_label - 1
+             text_x = month_start_x + col * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) + HOUR_SQUARE_SIZE / 2
+             draw.text((text_x, day_label_y), str(day_label), font=font_axis_label, fill=FONT_COLOR, anchor="mt")
+
+        # --- Desenhar quadrados de Hora/Dia para o mês ativo ---
+        days_in_this_month = calendar.monthrange(year, month)[1]
+        for day in range(1, days_in_this_month + 1): # Itera só até o dia real do mês
+            for hour in range(HOURS_IN_DAY):
+                pixel_x = month_start_x + (day - 1) * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING)
+                pixel_y = grid_start_y + hour * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING)
+
+                count = hour_counts.get((year, month, day, hour), 0)
+                color_index = 0
+                if count > 0:
+                    color_index = min(count, len(HEATMAP_COLORS) - 1)
+                    if color_index == 0: color_index = 1 # Garante que 1 tenha cor > 0
+                fill_color = HEATMAP_COLORS[color_index]
+
+                draw_simple_rectangle(draw, (pixel_x, pixel_y), (HOUR_SQUARE_SIZE, HOUR_SQUARE_SIZE), fill_color)
+    return image
+
+def render_detailed_heatmap_from_counts(
+    hour_counts, # {(ano, mês, dia, hora): contagem}
+    start_year_input,
     output_filepath,
     title_suffix,
     folder_names,
     total_unique_files_overall,
-    total_lines_overall
+    total_lines_overall,
+    year_tiles=None,
+    dirty_years=None,
+    fonts=None,
+    sample_estimate=None,
+    confirm_large=True
     ):
-    """Gera o heatmap final: alta resolução, ano inicial, ignora meses vazios."""
-
-    if df_activity_full.empty or time_column not in df_activity_full.columns:
-        print(f"DataFrame vazio ou coluna de tempo '{time_column}' não encontrada. Heatmap não gerado.")
+    """Monta o heatmap final a partir das contagens horárias já agregadas.
+
+    year_tiles (dict ano -> (meses ativos, tile)) guarda os blocos já desenhados
+    entre chamadas: só anos ausentes, com meses ativos diferentes ou presentes em
+    dirty_years são redesenhados (modo de observação). Título, legendas e a
+    colagem dos blocos são refeitos sempre (são baratos). Com sample_estimate
+    (DirectorySampler.estimate_totals), a legenda inferior mostra os totais
+    estimados com a margem do IC 95% e a fração lida. Com confirm_large=False
+    (modo de observação, sem ninguém no terminal) uma imagem acima do limite só
+    gera o aviso, sem a pergunta que bloquearia o ciclo.
+    """
+    if year_tiles is None:
+        year_tiles = {}
+    dirty_years = set(dirty_years or ())
+
+    # Filtra pelo ano inicial solicitado (só células com atividade)
+    hour_counts = {cell: count for cell, count in hour_counts.items() if cell[0] >= start_year_input and count > 0}
+    if not hour_counts:
+        print(f"Nenhuma atividade encontrada a partir do ano {start_year_input} ({title_suffix}). Heatmap não gerado.")
         return
 
-    # 1. Preparação Inicial e Filtro por Ano
-    df_activity = df_activity_full.copy() # Trabalha com uma cópia
-    df_activity[time_column] = pd.to_datetime(df_activity[time_column], errors='coerce')
-    df_activity = df_activity.dropna(subset=[time_column])
-
-    # Filtra pelo ano inicial solicitado
-    df_activity = df_activity[df_activity[time_column].dt.year >= start_year_input]
-
-    if df_activity.empty:
-        print(f"Nenhuma atividade encontrada a partir do ano {start_year_input} para '{time_column}'. Heatmap não gerado.")
-        return
-
-    # Extrair componentes e calcular contagens HORÁRIAS
-    df_activity['year'] = df_activity[time_column].dt.year
-    df_activity['month'] = df_activity[time_column].dt.month
-    df_activity['day'] = df_activity[time_column].dt.day
-    df_activity['hour'] = df_activity[time_column].dt.hour
-    activity_counts = df_activity.groupby(['year', 'month', 'day', 'hour']).size()
-
-    if activity_counts.empty:
-         print(f"Nenhuma contagem de atividade gerada a partir de {start_year_input}. Heatmap não gerado.")
-         return
-
-    max_activity_hourly = activity_counts.max()
+    max_activity_hourly = max(hour_counts.values())
     print(f"Máxima atividade horária ({title_suffix}, >= {start_year_input}): {max_activity_hourly}")
 
     # 2. Identificar Anos e Meses *COM DADOS* após o filtro
-    years_with_data = sorted(df_activity['year'].unique())
-    if not years_with_data:
-        print(f"Nenhum ano com dados encontrado a partir de {start_year_input}. Heatmap não gerado.")
-        return
+    active_year_months = sorted({(year, month) for year, month, _, _ in hour_counts})
+    years_with_data = sorted({year for year, _ in active_year_months})
     min_year, max_year = years_with_data[0], years_with_data[-1]
     num_years_with_data = len(years_with_data)
     print(f"Anos com dados ({title_suffix}, {min_year}-{max_year}): {num_years_with_data} anos")
 
-    # Obter tuplas (ano, mês) únicas que têm contagens > 0
-    active_year_months = sorted(list(activity_counts.index.droplevel([2, 3]).unique()))
-
     # 3. Configurar Fontes
-    try:
-        windows_font_dir = r"C:\Windows\Fonts"
-        font_year_label = ImageFont.truetype(os.path.join(windows_font_dir, FONT_BOLD_NAME + ".ttf"), FONT_SIZE_YEAR)
-        font_month_label = ImageFont.truetype(os.path.join(windows_font_dir, FONT_BOLD_NAME + ".ttf"), FONT_SIZE_MONTH)
-        font_axis_label = ImageFont.truetype(os.path.join(windows_font_dir, FONT_NAME + ".ttf"), FONT_SIZE_AXIS)
-        font_legend = ImageFont.truetype(os.path.join(windows_font_dir, FONT_LEGEND_NAME + ".ttf"), FONT_SIZE_LEGEND)
-        font_title = ImageFont.truetype(os.path.join(windows_font_dir, FONT_BOLD_NAME + ".ttf"), FONT_SIZE_TITLE)
-    except IOError:
-        print("Fontes Arial não encontradas. Usando fontes padrão.")
-        font_year_label, font_month_label, font_axis_label, font_legend, font_title = [ImageFont.load_default()] * 5
+    if fonts is None:
+        fonts = load_detailed_heatmap_fonts()
+    font_year_label, font_month_label, font_axis_label, font_legend, font_title = fonts
 
     # 4. Calcular Dimensões da Imagem (Layout Dinâmico)
-    # Dimensões da grade de UM MÊS (fixas)
-    month_grid_width = DAYS_IN_MONTH_MAX * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) - HOUR_SQUARE_PADDING
-    month_grid_height = HOURS_IN_DAY * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) - HOUR_SQUARE_PADDING
-
-    # Largura total baseada em MONTHS_PER_ROW
-    total_content_width = MONTHS_PER_ROW * month_grid_width + max(0, MONTHS_PER_ROW - 1) * MONTH_GRID_PADDING_X
+    month_grid_width, month_grid_height, total_content_width = detailed_month_grid_size()
     image_width = MARGIN_LEFT + total_content_width + MARGIN_RIGHT
 
     # Altura total calculada dinamicamente somando alturas dos anos (que dependem dos meses ativos)
     total_dynamic_height = 0
     year_block_heights = {} # Armazena altura de cada ano para cálculo de offset posterior
+    active_months_by_year = {}
     for year in years_with_data:
-        active_months_in_year = [m for y, m in active_year_months if y == year]
-        num_active_months = len(active_months_in_year)
-        if num_active_months == 0:
-            year_block_heights[year] = 0
-            continue # Pula anos sem meses ativos (não deveria acontecer com a lógica atual, mas seguro)
+        active_months_by_year[year] = [m for y, m in active_year_months if y == year]
+        year_block_heights[year] = detailed_year_block_height(len(active_months_by_year[year]))
+        total_dynamic_height += year_block_heights[year]
 
-        num_month_rows_this_year = (num_active_months + MONTHS_PER_ROW - 1) // MONTHS_PER_ROW
-        year_content_height = num_month_rows_this_year * (MONTH_LABEL_HEIGHT + month_grid_height) + max(0, num_month_rows_this_year - 1) * MONTH_GRID_PADDING_Y
-        current_year_total_height = YEAR_LABEL_HEIGHT + year_content_height
-        year_block_heights[year] = current_year_total_height
-        total_dynamic_height += current_year_total_height
-
-    image_height = MARGIN_TOP + MARGIN_BOTTOM + total_dynamic_height + max(0, num_years_with_data - 1) * YEAR_BLOCK_PADDING_Y
+    legend_extra_height = (FONT_SIZE_LEGEND + 8) if sample_estimate else 0 # Linha da amostragem
+    image_height = MARGIN_TOP + MARGIN_BOTTOM + legend_extra_height + total_dynamic_height + max(0, num_years_with_data - 1) * YEAR_BLOCK_PADDING_Y
 
     print(f"Dimensões FINAIS estimadas da imagem: {int(image_width)} x {int(image_height)} pixels")
     # Aviso mais forte devido à resolução aumentada
@@ -291,10 +426,11 @@ def generate_final_detailed_heatmap(
          print("A imagem resultante será EXTREMAMENTE GRANDE devido à alta resolução e período.")
          print("A geração pode consumir GIGABYTES de RAM e/ou FALHAR.")
          print("Considere usar um ano inicial mais recente ou reduzir MONTHS_PER_ROW / HOUR_SQUARE_SIZE.")
-         confirm = input("Deseja continuar mesmo assim? (s/N): ")
-         if confirm.lower() != 's':
-             print("Geração cancelada.")
-             return
+         if confirm_large:
+             confirm = input("Deseja continuar mesmo assim? (s/N): ")
+             if confirm.lower() != 's':
+                 print("Geração cancelada.")
+                 return
 
     # 5. Criar Imagem e Desenhar Elementos Estáticos
     image = Image.new('RGB', (int(image_width), int(image_height)), IMAGE_BACKGROUND_COLOR)
@@ -335,95 +471,42 @@ def generate_final_detailed_heatmap(
          draw.text((temp_x, legend_y_start), text, font=font_legend, fill=FONT_COLOR)
          temp_x += text_w + 20
 
-    # 6. Desenhar Blocos Anuais (Apenas com meses ativos)
+    # 6. Blocos Anuais (Apenas com meses ativos): redesenha só os anos alterados, cola todos
+    for year in list(year_tiles):
+        if year not in active_months_by_year:
+            del year_tiles[year]
     current_y_offset = MARGIN_TOP # Começa abaixo do título/legenda
-
     for year in years_with_data:
-        print(f"Desenhando ano: {year}...")
-        year_start_y = current_y_offset
-        active_months_in_year = sorted([m for y, m in active_year_months if y == year])
-
-        if not active_months_in_year: # Segurança, não deve ocorrer
-            current_y_offset += YEAR_BLOCK_PADDING_Y # Pula espaço se ano ficou vazio
-            continue
-
-        # Desenha Rótulo do Ano
-        year_text = str(year)
-        try: year_text_w = draw.textlength(year_text, font=font_year_label)
-        except: year_text_w = draw.textbbox((0,0), year_text, font=font_year_label)[2]
-        year_label_x = MARGIN_LEFT + (total_content_width - year_text_w) / 2
-        year_label_y = year_start_y
-        draw.text((year_label_x, year_label_y), year_text, font=font_year_label, fill=FONT_COLOR)
-
-        current_month_base_y = year_start_y + YEAR_LABEL_HEIGHT
-
-        # --- Desenhar Grades Mensais ATIVAS dentro do Ano ---
-        for active_month_idx, month in enumerate(active_months_in_year):
-            month_row_index = active_month_idx // MONTHS_PER_ROW
-            month_col_index = active_month_idx % MONTHS_PER_ROW
-
-            # Calcula posição X e Y da grade deste mês ATIVO
-            month_start_x = MARGIN_LEFT + month_col_index * (month_grid_width + MONTH_GRID_PADDING_X)
-            month_start_y = current_month_base_y + month_row_index * (MONTH_LABEL_HEIGHT + month_grid_height + MONTH_GRID_PADDING_Y)
-
-            # Desenha Rótulo do Mês
-            month_name = date(year, month, 1).strftime('%B') # Nome completo
-            try: month_text_w = draw.textlength(month_name, font=font_month_label)
-            except: month_text_w = draw.textbbox((0,0), month_name, font=font_month_label)[2]
-            month_label_x = month_start_x + (month_grid_width - month_text_w) / 2
-            month_label_y = month_start_y
-            draw.text((month_label_x, month_label_y), month_name, font=font_month_label, fill=FONT_COLOR)
-
-            grid_start_y = month_start_y + MONTH_LABEL_HEIGHT
-
-            # Desenha Rótulos de Eixo (Hora/Dia) - com mais espaçamento
-            if month_col_index == 0: # Horas à esquerda da primeira coluna de meses
-                for hr in range(0, 24, 4): # 0h, 4h, 8h ... 20h
-                    hour_text = f"{hr:02d}h"
-                    try: text_h = font_axis_label.getmetrics()[0]
-                    except: text_h = 10
-                    text_y = grid_start_y + hr * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) + (HOUR_SQUARE_SIZE - text_h // 2)
-                    draw.text((MARGIN_LEFT - 35, text_y), hour_text, font=font_axis_label, fill=FONT_COLOR, anchor="lm")
-
-            # Dias abaixo da grade
-            day_label_y = grid_start_y + month_grid_height + 10
-            days_to_label = [1, 10, 20, DAYS_IN_MONTH_MAX]
-            for day_label in days_to_label:
-                 col = day_label - 1
-                 text_x = month_start_x + col * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING) + HOUR_SQUARE_SIZE / 2
-                 draw.text((text_x, day_label_y), str(day_label), font=font_axis_label, fill=FONT_COLOR, anchor="mt")
-
-            # --- Desenhar quadrados de Hora/Dia para o mês ativo ---
-            days_in_this_month = calendar.monthrange(year, month)[1]
-            for day in range(1, days_in_this_month + 1): # Itera só até o dia real do mês
-                for hour in range(HOURS_IN_DAY):
-                    pixel_x = month_start_x + (day - 1) * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING)
-                    pixel_y = grid_start_y + hour * (HOUR_SQUARE_SIZE + HOUR_SQUARE_PADDING)
-
-                    count = activity_counts.get((year, month, day, hour), 0)
-                    color_index = 0
-                    if count > 0:
-                        color_index = min(count, len(HEATMAP_COLORS) - 1)
-                        if color_index == 0: color_index = 1 # Garante que 1 tenha cor > 0
-                    fill_color = HEATMAP_COLORS[color_index]
-
-                    draw_simple_rectangle(draw, (pixel_x, pixel_y), (HOUR_SQUARE_SIZE, HOUR_SQUARE_SIZE), fill_color)
-
+        active_months_in_year = active_months_by_year[year]
+        cached = year_tiles.get(year)
+        if cached is None or cached[0] != active_months_in_year or year in dirty_years:
+            year_counts = {cell: count for cell, count in hour_counts.items() if cell[0] == year}
+            cached = (active_months_in_year, render_detailed_year_block(year, active_months_in_year, year_counts, fonts))
+            year_tiles[year] = cached
+        image.paste(cached[1], (0, int(current_y_offset)))
         # Atualiza o offset Y para o próximo ano usando a altura calculada ANTES
         current_y_offset += year_block_heights[year] + YEAR_BLOCK_PADDING_Y
 
     # 7. Desenhar Legenda Inferior
-    legend_bottom_y = image_height - MARGIN_BOTTOM + 30 # Posição
+    legend_bottom_y = image_height - MARGIN_BOTTOM - legend_extra_height + 30 # Posição
     folder_names_text = ", ".join(folder_names)
     folders_scanned_text = f"Pastas: {folder_names_text}"
-    total_files_text = f"Arquivos .py Únicos: {total_unique_files_overall}"
-    total_lines_text = f"Linhas de Código: {total_lines_overall:,}".replace(",",".")
+    if sample_estimate:
+        total_files_text = f"Arquivos .py Únicos (estimado): {sample_estimate['files']:,} ± {sample_estimate['files_margin']:,} (IC 95%)".replace(",",".")
+        total_lines_text = f"Linhas de Código (estimado): {sample_estimate['lines']:,} ± {sample_estimate['lines_margin']:,} (IC 95%)".replace(",",".")
+    else:
+        total_files_text = f"Arquivos .py Únicos: {total_unique_files_overall}"
+        total_lines_text = f"Linhas de Código: {total_lines_overall:,}".replace(",",".")
     date_range_text = f"Período Exibido: {min_year} - {max_year} ({title_suffix})"
 
     draw.text((MARGIN_LEFT, legend_bottom_y), date_range_text, font=font_legend, fill=FONT_COLOR)
     draw.text((MARGIN_LEFT, legend_bottom_y + FONT_SIZE_LEGEND + 8), folders_scanned_text, font=font_legend, fill=FONT_COLOR)
     draw.text((MARGIN_LEFT, legend_bottom_y + 2 * (FONT_SIZE_LEGEND + 8)), total_files_text, font=font_legend, fill=FONT_COLOR)
     draw.text((MARGIN_LEFT, legend_bottom_y + 3 * (FONT_SIZE_LEGEND + 8)), total_lines_text, font=font_legend, fill=FONT_COLOR)
+    if sample_estimate:
+        sample_text = (f"Amostragem estratificada por pasta: {sample_estimate['sampled']:,} de {sample_estimate['population']:,} "
+                       f"arquivos lidos ({sample_estimate['fraction']:.1%}); contagens horárias escaladas").replace(",",".")
+        draw.text((MARGIN_LEFT, legend_bottom_y + 4 * (FONT_SIZE_LEGEND + 8)), sample_text, font=font_legend, fill=FONT_COLOR)
 
     # 8. Salvar Imagem
     try:
@@ -434,21 +517,112 @@ def generate_final_detailed_heatmap(
         if isinstance(e, (MemoryError, ValueError)):
              print("Provavelmente causado pelo tamanho excessivo da imagem. Tente um período menor ou resolução menor.")
 
+def generate_final_detailed_heatmap(
+    df_activity_full, # DataFrame com todos os dados
+    start_year_input, # Ano inicial fornecido pelo usuário
+    time_column,
+    output_filepath,
+    title_suffix,
+    folder_names,
+    total_unique_files_overall,
+    total_lines_overall,
+    sample_estimate=None
+    ):
+    """Gera o heatmap final: alta resolução, ano inicial, ignora meses vazios.
+
+    Com uma coluna 'weight' (pesos de amostragem) cada célula soma os pesos em
+    vez de contar linhas; sample_estimate vai para a legenda.
+    """
+
+    if df_activity_full.empty or time_column not in df_activity_full.columns:
+        print(f"DataFrame vazio ou coluna de tempo '{time_column}' não encontrada. Heatmap não gerado.")
+        return
+
+    # 1. Preparação Inicial e Filtro por Ano
+    df_activity = df_activity_full.copy() # Trabalha com uma cópia
+    df_activity[time_column] = pd.to_datetime(df_activity[time_column], errors='coerce')
+    df_activity = df_activity.dropna(subset=[time_column])
+
+    # Filtra pelo ano inicial solicitado
+    df_activity = df_activity[df_activity[time_column].dt.year >= start_year_input]
+
+    if df_activity.empty:
+        print(f"Nenhuma atividade encontrada a partir do ano {start_year_input} para '{time_column}'. Heatmap não gerado.")
+        return
+
+    # Extrair componentes e calcular contagens HORÁRIAS
+    df_activity['year'] = df_activity[time_column].dt.year
+    df_activity['month'] = df_activity[time_column].dt.month
+    df_activity['day'] = df_activity[time_column].dt.day
+    df_activity['hour'] = df_activity[time_column].dt.hour
+    if 'weight' in df_activity.columns:
+        activity_counts = df_activity.groupby(['year', 'month', 'day', 'hour'])['weight'].sum().round()
+    else:
+        activity_counts = df_activity.groupby(['year', 'month', 'day', 'hour']).size()
+
+    if activity_counts.empty:
+         print(f"Nenhuma contagem de atividade gerada a partir de {start_year_input}. Heatmap não gerado.")
+         return
+
+    render_detailed_heatmap_from_counts(
+        {tuple(int(part) for part in cell): int(count) for cell, count in activity_counts.items()},
+        start_year_input,
+        output_filepath,
+        title_suffix,
+        folder_names,
+        total_unique_files_overall,
+        total_lines_overall,
+        sample_estimate=sample_estimate
+    )
+
+def watch_directories(directory_paths, start_year_requested, output_paths, folder_base_names, cache=None):
+    """Modo de observação: mantém os heatmaps de criados/modificados atualizados.
+
+    Só arquivos com stat diferente são lidos; cada heatmap redesenha apenas os anos
+    cujas células horárias mudaram. output_paths = {'ctime': png, 'mtime': png}.
+    """
+    aggregate = ActivityAggregate(time_keys=('ctime', 'mtime'), winner_key='mtime')
+    hash_func = partial(hash_and_count_lines, algorithm=HASH_ALGORITHM)
+    titles = {'ctime': 'Criados', 'mtime': 'Modificados'}
+    year_tiles = {'ctime': {}, 'mtime': {}}
+    fonts = load_detailed_heatmap_fonts()
+
+    def redraw(aggregate, cycle):
+        for time_key in ('ctime', 'mtime'):
+            dirty_years = aggregate.pop_dirty_years(time_key)
+            hour_counts = aggregate.hour_counts(time_key)
+            if not hour_counts:
+                continue
+            start_year = start_year_requested or min(year for year, _, _, _ in hour_counts)
+            render_detailed_heatmap_from_counts(
+                hour_counts, start_year, output_paths[time_key], titles[time_key], folder_base_names,
+                aggregate.unique_count(), int(aggregate.total_lines), year_tiles[time_key], dirty_years, fonts,
+                confirm_large=False
+            )
+
+    watch_roots(directory_paths, IgnoreMatcher(PASTAS_IGNORADAS, use_gitignore=USE_GITIGNORE), hash_func, aggregate, redraw,
+                interval=WATCH_INTERVAL_SECONDS, cache=cache, workers=SCAN_WORKERS, fused=True)
+
 # --- Função Principal ---
 if __name__ == "__main__":
     root = tk.Tk()
     root.withdraw()
 
-    directory_paths = []
-    while True:
-        path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
-        if not path:
-            if not directory_paths:
-                print("Nenhuma pasta selecionada. Saindo.")
-                exit()
-            else:
-                break
-        directory_paths.append(path)
+    if LOAD_SNAPSHOT:
+        # Pastas e arquivos vêm do snapshot; o disco não é varrido
+        snapshot_store, snapshot_metadata = load_snapshot(SNAPSHOT_PATH)
+        directory_paths = snapshot_metadata.get('roots', [])
+    else:
+        directory_paths = []
+        while True:
+            path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
+            if not path:
+                if not directory_paths:
+                    print("Nenhuma pasta selecionada. Saindo.")
+                    exit()
+                else:
+                    break
+            directory_paths.append(path)
 
     # --- Pergunta o Ano Inicial ---
     current_actual_year = datetime.now().year
@@ -469,57 +643,97 @@ if __name__ == "__main__":
             print("Entrada inválida. Por favor, digite um número de ano.")
     # -----------------------------
 
-    # (Lógica de agregação de arquivos únicos mantida)
-    overall_unique_files = {}
-    overall_total_lines = 0
-    folder_base_names = []
-
-    for i, dir_path in enumerate(directory_paths):
-        folder_base_names.append(os.path.basename(dir_path))
-        print(f"\n--- Varrendo pasta {i+1}: {dir_path} ---")
-        df_files, _, _ = scan_directory_for_py_files(dir_path)
-
-        for index, row in df_files.iterrows():
-             file_hash = row.get('hash')
-             modification_time = row.get('modification_time')
-             lines = row.get('lines')
-
-             # Validação básica dos dados da linha
-             if not file_hash or not isinstance(modification_time, datetime) or not isinstance(lines, (int, float)):
-                 # print(f"Aviso: Dados inválidos ou ausentes para linha {index}. Pulando.")
-                 continue # Pula linha se dados essenciais faltam ou tipo incorreto
-
-             is_newer_overall = True
-             if file_hash in overall_unique_files:
-                  existing_mtime = overall_unique_files[file_hash].get('modification_time')
-                  if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
-                       is_newer_overall = False
-
-             if is_newer_overall:
-                  if file_hash in overall_unique_files:
-                       existing_lines = overall_unique_files[file_hash].get('lines')
-                       if isinstance(existing_lines, (int, float)):
-                            overall_total_lines -= existing_lines
-
-                  overall_unique_files[file_hash] = row.to_dict()
-                  overall_total_lines += lines
-
-    unique_files_df_combined = pd.DataFrame(list(overall_unique_files.values()))
-    total_unique_files_combined = len(unique_files_df_combined)
-
-    if not unique_files_df_combined.empty:
-        if 'creation_time' in unique_files_df_combined.columns:
-            unique_files_df_combined['creation_time'] = pd.to_datetime(unique_files_df_combined['creation_time'], errors='coerce')
-        if 'modification_time' in unique_files_df_combined.columns:
-            unique_files_df_combined['modification_time'] = pd.to_datetime(unique_files_df_combined['modification_time'], errors='coerce')
+    if ACTIVITY_SOURCE == "git":
+        # Datas vêm dos commits (sobrevivem a checkout/cópia) e nenhum arquivo é lido
+        folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+        git_activity = aggregate_git_activity(directory_paths, (".py",), GIT_TIME_FIELD)
+        if not git_activity['hour_counts']:
+            print("\nNenhum commit com arquivos .py encontrado nas pastas especificadas.")
+            exit()
+        folder_name_for_output = "_".join(folder_base_names)
+        folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
+        output_folder_path = os.path.join("output_heatmaps_final_detailed", f"heatmap_{folder_name_for_output}_{folder_hash_combined}_final_detailed")
+        os.makedirs(output_folder_path, exist_ok=True)
+        actual_start_year = start_year_requested or min(year for year, _, _, _ in git_activity['hour_counts'])
+        render_detailed_heatmap_from_counts(
+            git_activity['hour_counts'],
+            actual_start_year,
+            os.path.join(output_folder_path, f"heatmap_{folder_name_for_output}_{folder_hash_combined}_git_final.png"),
+            'Commits',
+            folder_base_names,
+            git_activity['files'], # Arquivos .py distintos tocados pelos commits
+            git_activity['lines_added'] # Linhas adicionadas nos commits
+        )
+        exit()
+
+    if WATCH_MODE:
+        folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+        folder_name_for_output = "_".join(folder_base_names)
+        folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
+        output_folder_path = os.path.join("output_heatmaps_final_detailed", f"heatmap_{folder_name_for_output}_{folder_hash_combined}_final_detailed")
+        os.makedirs(output_folder_path, exist_ok=True)
+        output_paths = {
+            'ctime': os.path.join(output_folder_path, f"heatmap_{folder_name_for_output}_{folder_hash_combined}_created_final.png"),
+            'mtime': os.path.join(output_folder_path, f"heatmap_{folder_name_for_output}_{folder_hash_combined}_modified_final.png"),
+        }
+        print(f"\nObservando {len(directory_paths)} pasta(s) a cada {WATCH_INTERVAL_SECONDS}s (Ctrl+C para sair). Heatmaps em: {output_folder_path}")
+        scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+        watch_directories(directory_paths, start_year_requested, output_paths, folder_base_names, scan_cache)
+        if scan_cache is not None:
+            scan_cache.save()
+            scan_cache.print_stats()
+        exit()
 
+    # (Lógica de agregação de arquivos únicos mantida)
+    # Todas as pastas são varridas ao mesmo tempo (um processo por pasta, discos diferentes em paralelo).
+    # Junção: para cada hash fica o arquivo de mtime mais recente (empate: a primeira pasta selecionada)
+    folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+    combined_sampler = None # DirectorySampler juntando as pastas (só com SCAN_SAMPLE_FRACTION)
+    if LOAD_SNAPSHOT:
+        combined_store = snapshot_store
+    else:
+        for i, dir_path in enumerate(directory_paths):
+            print(f"\n--- Varrendo pasta {i+1}: {dir_path} ---")
+        scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+        scan_results = scan_roots_concurrently(directory_paths, scan_directory_to_sink, scan_cache, SCAN_ROOT_PROCESSES, SCAN_WORKERS)
+
+        # Junção em streaming: os sinks são somados na ordem das pastas (o empate fica com a primeira)
+        combined_sink = UniqueHashSink(winner_key='mtime', time_keys=())
+        for scan_sink, scan_sampler in scan_results:
+            combined_sink.merge(scan_sink)
+            if scan_sampler is not None:
+                if combined_sampler is None:
+                    combined_sampler = scan_sampler
+                else:
+                    combined_sampler.merge(scan_sampler)
+        # Um arquivo por hash em colunas NumPy (epochs int64, digest de 16 bytes, linhas int32)
+        combined_store = FileRecordStore.from_records(combined_sink.records())
+        del scan_results, combined_sink
+
+        if scan_cache is not None:
+            scan_cache.save()
+            scan_cache.print_stats()
+        if SAVE_SNAPSHOT and combined_sampler is not None:
+            print("Varredura por amostragem: snapshot não gravado (ele guarda só varreduras exatas).")
+        elif SAVE_SNAPSHOT:
+            save_snapshot(SNAPSHOT_PATH, combined_store, {'roots': directory_paths, 'hash_algorithm': HASH_ALGORITHM, 'winner_key': 'mtime'})
+    overall_total_lines = combined_store.total_lines()
+    print(f"Registros em colunas: {len(combined_store)} arquivos, {combined_store.nbytes() / (1024 * 1024):.1f} MB.")
+
+    total_unique_files_combined = len(combined_store)
+    sample_weights = sample_estimate = None
+    if combined_sampler is not None:
+        # Cada arquivo lido representa N/k arquivos da pasta dele
+        sample_weights = combined_sampler.weights(combined_store)
+        sample_estimate = combined_sampler.estimate_totals(combined_store)
+        print_sample_estimate(sample_estimate)
+
+    if total_unique_files_combined:
         # Determina o ano inicial real se o usuário não especificou
-        min_year_found_c = unique_files_df_combined['creation_time'].dt.year.min() if 'creation_time' in unique_files_df_combined.columns and not unique_files_df_combined['creation_time'].isnull().all() else float('inf')
-        min_year_found_m = unique_files_df_combined['modification_time'].dt.year.min() if 'modification_time' in unique_files_df_combined.columns and not unique_files_df_combined['modification_time'].isnull().all() else float('inf')
-        min_year_found = int(min(min_year_found_c, min_year_found_m))
+        min_year_found = combined_store.min_year()
 
         if start_year_requested == 0: # Se usuário não especificou, usa o mínimo encontrado
-             actual_start_year = min_year_found if min_year_found != float('inf') else current_actual_year
+             actual_start_year = min_year_found if min_year_found is not None else current_actual_year
              print(f"Ano mais antigo encontrado: {actual_start_year}. Usando como início.")
         else: # Usuário especificou, usa o que ele pediu
              actual_start_year = start_year_requested
@@ -541,36 +755,30 @@ if __name__ == "__main__":
         # Gerar heatmap FINAL DETALHADO para CREATED times
         output_filename_created = f"heatmap_{folder_name_for_output}_{folder_hash_combined}_created_final.png"
         output_filepath_created = os.path.join(output_folder_path, output_filename_created)
-        if 'creation_time' in unique_files_df_combined.columns:
-            generate_final_detailed_heatmap(
-                unique_files_df_combined,
-                actual_start_year,
-                'creation_time',
-                output_filepath_created,
-                'Criados',
-                folder_base_names,
-                total_unique_files_combined,
-                overall_total_lines
-            )
-        else:
-            print("Coluna 'creation_time' não encontrada. Pulando heatmap de criados.")
+        render_detailed_heatmap_from_counts(
+            combined_store.hour_counts('ctime', actual_start_year, sample_weights),
+            actual_start_year,
+            output_filepath_created,
+            'Criados',
+            folder_base_names,
+            total_unique_files_combined,
+            overall_total_lines,
+            sample_estimate=sample_estimate
+        )
 
         # Gerar heatmap FINAL DETALHADO para MODIFIED times
         output_filename_modified = f"heatmap_{folder_name_for_output}_{folder_hash_combined}_modified_final.png"
         output_filepath_modified = os.path.join(output_folder_path, output_filename_modified)
-        if 'modification_time' in unique_files_df_combined.columns:
-            generate_final_detailed_heatmap(
-                unique_files_df_combined,
-                actual_start_year,
-                'modification_time',
-                output_filepath_modified,
-                'Modificados',
-                folder_base_names,
-                total_unique_files_combined,
-                overall_total_lines
-            )
-        else:
-            print("Coluna 'modification_time' não encontrada. Pulando heatmap de modificados.")
+        render_detailed_heatmap_from_counts(
+            combined_store.hour_counts('mtime', actual_start_year, sample_weights),
+            actual_start_year,
+            output_filepath_modified,
+            'Modificados',
+            folder_base_names,
+            total_unique_files_combined,
+            overall_total_lines,
+            sample_estimate=sample_estimate
+        )
 
 
         print(f"\nProcesso completo. Heatmaps PNG finais detalhados gerados em: {output_folder_path}")
@@ -10,8 +10,15 @@ import matplotlib.ticker as mticker
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog
+from scan_cache import ScanCache
+from heatmap_scanner import scan_files, iter_hashed_files, staged_dedup, print_staged_dedup_stats, print_inode_reuse_stats, is_staged_key
+from file_hashing import hash_file
 from collections import defaultdict # To store active slots per date
 import traceback # For better error reporting
+import itertools
+from git_activity import aggregate_git_activity
+from record_store import FileRecordStore, save_snapshot, load_snapshot
+from activity_warehouse import ActivityWarehouse
 
 # --- Design Constants - Blue/Ice/Ocean Theme ---
 DARK_BG_COLOR = '#1f1f1f'
@@ -22,17 +29,33 @@ COLOR_AREA_FILL = '#0ea5e9'
 COLOR_AREA_EDGE = '#0284c7'
 FONT_NAME = "Arial" # Consider 'DejaVu Sans' or others if Arial not found
 
+# --- Scan Cache ---
+USE_SCAN_CACHE = True # Reuse hashes of unchanged files between runs
+SCAN_CACHE_PATH = "heatmap_scan_cache.sqlite"
+SCAN_WORKERS = os.cpu_count() or 4 # Hashing workers (1 = sequential)
+SCAN_USE_PROCESSES = False # True = process pool, False = thread pool
+USE_STAGED_DEDUP = True # Size -> prefix -> full hash; all folders are scanned in a single pass
+HASH_ALGORITHM = "blake2b:16" # Dedup digest: any hashlib name ("sha256", ...), "name:bytes" for blake2b/blake2s
+
+# --- Scan Snapshot ---
+SNAPSHOT_PATH = "heatmap_scan_snapshot_time.npz" # Columnar scan result (NumPy .npz): re-render without rescanning (one file per script)
+SAVE_SNAPSHOT = True # Write the snapshot after every scan
+LOAD_SNAPSHOT = False # True = draw from the snapshot: no folder dialog, no disk access
+
+# --- Activity Warehouse ---
+WAREHOUSE_PATH = "heatmap_activity_warehouse.sqlite" # History of every scan (SQLite in WAL mode, indexed queries)
+RECORD_TO_WAREHOUSE = True # Record every filesystem scan in the warehouse
+CHARTS_FROM_WAREHOUSE = False # True = charts from every recorded scan: no folder dialog, no disk access
+
+# --- Activity Source ---
+ACTIVITY_SOURCE = "filesystem" # "filesystem" = file ctime/mtime; "git" = commit history (each folder is a repository)
+GIT_TIME_FIELD = "author" # "author" = when the change was written; "committer" = when it was committed
+
 # --- File Scanning Functions (Simplified) ---
 def calculate_file_hash(filepath):
-    """Calcula o hash SHA256 de um arquivo."""
-    hasher = hashlib.sha256()
+    """Calcula o hash (HASH_ALGORITHM) de um arquivo (blocos grandes ou mmap, conforme o tamanho)."""
     try:
-        with open(filepath, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk: break
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(filepath, algorithm=HASH_ALGORITHM)
     except FileNotFoundError:
         # print(f"Aviso: Arquivo não encontrado ao calcular hash: {filepath}")
         return None
@@ -65,65 +88,71 @@ def get_file_times(filepath):
 
 # Removed count_lines_of_code function as it's not needed
 
-def scan_directory_for_py_files_simplified(directory):
-    """Varre o diretório por .py, obtém hash e datas (sem LOC)."""
+def scan_directory_for_py_files_simplified(directory, cache=None, workers=SCAN_WORKERS, use_processes=SCAN_USE_PROCESSES, staged=False):
+    """Varre o diretório por .py, obtém hash e datas (sem LOC).
+
+    `directory` can also be a list of folders scanned together. With staged=True
+    files with a unique size are never read and 'hash' holds a synthetic key, so
+    every folder that must be deduplicated together has to go in the same call.
+    """
     unique_files_by_hash = {} # Store latest file info per hash
     pastas_ignoradas = set(['venv', '.venv', 'env', '.env', 'lib', 'lib64', 'site-packages', 'dist-packages', 'eggs','pip-wheel-metadata', '__pycache__', 'build', 'dist', 'docs', 'doc', 'etc', 'static','templates', 'media', 'node_modules', '.git', '.svn', '.hg', '.CVS', '.idea', '.vscode','spyder-py3', '.pylint.d', '.mypy_cache', '.pytest_cache', '__pypackages__', 'wheelhouse','htmlcov', '.coverage', 'coverage.xml', '*.egg-info', 'MANIFEST', 'sphinx-build', '_build','_static', '_templates', 'data', 'resources', 'assets', 'out', 'output', 'target', 'log','logs', 'tmp', 'temp', 'cache', 'caches', '.gradle', '.mvn', '.docker', '.vagrant', '.terraform','ansible', '.terraform.lock.hcl', '.DS_Store', '.Trashes', '$RECYCLE.BIN', 'System Volume Information','._*', '._.Trashes', '._.DS_Store', '.localized', '.AppleDouble'])
     pastas_para_manter = {'test', 'tests', 'testing', 'integration-tests', 'unit-tests', 'functional-tests', 'benchmark', 'benchmarks', 'example', 'examples', 'sample', 'samples', 'notebooks'}
     pastas_ignoradas = pastas_ignoradas.difference(pastas_para_manter)
 
-    print(f"Iniciando varredura simplificada em: {directory}")
-    scanned_files_count = 0
-    py_files_count = 0
-    skipped_files_time_error = 0
+    roots = [directory] if isinstance(directory, str) else list(directory)
+    print(f"Iniciando varredura simplificada em: {', '.join(roots)}")
+    walk_counters = {'scanned': 0, 'matched': 0, 'errors': 0}
     skipped_files_hash_error = 0
 
-    for pasta_raiz, subpastas, arquivos in os.walk(directory, topdown=True):
-        # Filter subdirectories in place
-        subpastas[:] = [sp for sp in subpastas if sp.lower() not in pastas_ignoradas and not sp.startswith('.')]
-
-        for arquivo in arquivos:
-            scanned_files_count += 1
-            if not arquivo.endswith(".py"):
-                continue # Skip non-python files early
-
-            py_files_count += 1
-            caminho_arquivo = os.path.join(pasta_raiz, arquivo)
-
-            # 1. Get Timestamps
-            ctime, mtime = get_file_times(caminho_arquivo)
-            if not ctime or not mtime:
-                skipped_files_time_error += 1
-                continue # Skip if timestamps couldn't be retrieved
-
-            # 2. Get Hash
-            file_hash = calculate_file_hash(caminho_arquivo)
-            if not file_hash:
-                skipped_files_hash_error += 1
-                continue # Skip if hash couldn't be calculated
-
-            # 3. Check if newer than existing entry for the same hash
-            is_newer = True
-            if file_hash in unique_files_by_hash:
-                existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
-                # Ensure existing_mtime is valid before comparison
-                if isinstance(existing_mtime, datetime) and mtime <= existing_mtime:
-                    is_newer = False
-
-            if is_newer:
-                unique_files_by_hash[file_hash] = {
-                    'creation_time': ctime,
-                    'modification_time': mtime,
-                    'filepath': caminho_arquivo,
-                    # 'lines': 0, # No longer storing lines
-                    'hash': file_hash
-                }
+    # The walker feeds the hashing pool; dedup below runs on this thread only
+    py_files = itertools.chain.from_iterable(scan_files(root, pastas_ignoradas, (".py",), walk_counters) for root in roots)
+    dedup_counters = {}
+    if staged:
+        identified_files = staged_dedup(py_files, calculate_file_hash, workers=workers, use_processes=use_processes, cache=cache, counters=dedup_counters)
+    else:
+        identified_files = ((record, file_hash) for record, file_hash, _ in iter_hashed_files(py_files, calculate_file_hash, None, workers, use_processes, cache, counters=dedup_counters))
+    for record, file_hash in identified_files:
+        caminho_arquivo = record['filepath']
+        # 1. Get Hash (computed by the pool)
+        if not file_hash:
+            skipped_files_hash_error += 1
+            continue # Skip if hash couldn't be calculated
+
+        # 2. Timestamps come from the walker's single stat per file
+        ctime = datetime.fromtimestamp(record['ctime'])
+        mtime = datetime.fromtimestamp(record['mtime'])
+
+        # 3. Check if newer than existing entry for the same hash
+        is_newer = True
+        if file_hash in unique_files_by_hash:
+            existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
+            # Ensure existing_mtime is valid before comparison
+            if isinstance(existing_mtime, datetime) and mtime <= existing_mtime:
+                is_newer = False
+
+        if is_newer:
+            unique_files_by_hash[file_hash] = {
+                'creation_time': ctime,
+                'modification_time': mtime,
+                'filepath': caminho_arquivo,
+                # 'lines': 0, # No longer storing lines
+                'hash': file_hash,
+                'hash_algorithm': HASH_ALGORITHM
+            }
+
+    scanned_files_count = walk_counters['scanned']
+    py_files_count = walk_counters['matched']
+    skipped_files_time_error = walk_counters['errors'] # stat failures are counted by the walker
 
     print(f"Varredura concluída. Total: {scanned_files_count}, Python: {py_files_count}, Únicos: {len(unique_files_by_hash)}")
     if skipped_files_time_error > 0:
         print(f"  -> Aviso: {skipped_files_time_error} arquivos pulados por erro ao obter datas.")
     if skipped_files_hash_error > 0:
          print(f"  -> Aviso: {skipped_files_hash_error} arquivos pulados por erro ao calcular hash.")
+    if staged:
+        print_staged_dedup_stats(dedup_counters)
+    print_inode_reuse_stats(dedup_counters)
 
     return pd.DataFrame(list(unique_files_by_hash.values()))
 
@@ -212,43 +241,159 @@ def create_yearly_time_chart(
             plt.close(fig)
 
 
+# --- Daily Hours Estimate + Charts (shared by the filesystem and git sources) ---
+def plot_estimated_daily_hours(active_slots_by_date, folder_base_names):
+    """Estimate hours per day (0.5h per active 30-min slot) and draw the yearly charts."""
+    # --- Calculate Daily Hours ---
+    if not active_slots_by_date:
+         print("Aviso: Nenhum slot de tempo ativo encontrado.")
+    else:
+        min_date = min(active_slots_by_date.keys())
+        max_date = max(active_slots_by_date.keys())
+        print(f"Período de atividade detectado: {min_date} a {max_date}")
+
+        all_dates = pd.date_range(start=min_date, end=max_date, freq='D')
+        daily_hours_list = []
+        for current_dt in all_dates:
+            current_date_obj = current_dt.date() # Get date object for lookup
+            num_active_slots = len(active_slots_by_date.get(current_date_obj, set()))
+            estimated_hours = num_active_slots * 0.5
+            daily_hours_list.append({'date': current_dt, 'hours': estimated_hours})
+
+        if not daily_hours_list:
+              print("Nenhum dado de horas diárias para processar.")
+              return
+
+        # Convert to Pandas Series
+        daily_hours_df = pd.DataFrame(daily_hours_list)
+        daily_hours_series = daily_hours_df.set_index('date')['hours']
+        daily_hours_series = daily_hours_series.sort_index() # Ensure sorted
+
+        # --- Create Output Folder ---
+        folder_name_for_output = "_".join(fn.replace(" ", "_") for fn in folder_base_names) # Sanitize names
+        folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
+        output_folder_name = f"project_time_{folder_name_for_output}_{folder_hash_combined}"
+        output_folder_path = os.path.join(".", output_folder_name)
+        os.makedirs(output_folder_path, exist_ok=True)
+        print(f"\nGráficos de tempo estimado serão salvos em: {output_folder_path}")
+
+        # --- Generate Charts for Each Year ---
+        years_with_data = sorted(daily_hours_series.index.year.unique())
+        print(f"Anos com atividade encontrados: {years_with_data}")
+
+        for year in years_with_data:
+            # Filter data for the specific year
+            # Make sure index is datetime before filtering
+            if not pd.api.types.is_datetime64_any_dtype(daily_hours_series.index):
+                daily_hours_series.index = pd.to_datetime(daily_hours_series.index)
+            yearly_data = daily_hours_series[daily_hours_series.index.year == year]
+
+            if yearly_data.empty or yearly_data.sum() <= 0:
+                 print(f"  -> Pulando ano {year}: Sem dados de tempo estimado > 0.")
+                 continue # Skip year if no data
+
+            # Generate Bar Chart
+            output_filename_bar = f"time_bar_{year}_{folder_name_for_output}_{folder_hash_combined}.png"
+            output_filepath_bar = os.path.join(output_folder_path, output_filename_bar)
+            create_yearly_time_chart(
+                yearly_data.copy(), year, output_filepath_bar, chart_type='bar', # Pass a copy
+                title_prefix=f"Tempo Estimado (Barras) - {', '.join(folder_base_names)}"
+            )
+
+            # Generate Area Chart ("Waves")
+            output_filename_area = f"time_area_{year}_{folder_name_for_output}_{folder_hash_combined}.png"
+            output_filepath_area = os.path.join(output_folder_path, output_filename_area)
+            create_yearly_time_chart(
+                yearly_data.copy(), year, output_filepath_area, chart_type='area', # Pass a copy
+                title_prefix=f"Tempo Estimado (Área) - {', '.join(folder_base_names)}"
+            )
+
+        print(f"\nProcesso completo. Gráficos PNG de tempo estimado gerados em: {output_folder_path}")
+
+
 # --- Main Execution ---
 if __name__ == "__main__":
     try: # Wrap main execution in try/except for better error catching
         root = tk.Tk(); root.withdraw()
-        directory_paths = []
-        while True:
-            path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
-            if not path:
-                if not directory_paths: print("Nenhuma pasta selecionada. Saindo."); exit()
-                else: break
-            directory_paths.append(path)
+        if CHARTS_FROM_WAREHOUSE:
+            # Active 30-min slots come from one indexed query over all recorded runs; nothing is scanned
+            with ActivityWarehouse(WAREHOUSE_PATH) as warehouse:
+                folder_base_names = [os.path.basename(dir_path) for dir_path in warehouse.roots()]
+                active_slots_by_date = warehouse.slots_by_date()
+            plot_estimated_daily_hours(active_slots_by_date, folder_base_names)
+            exit()
+
+        if LOAD_SNAPSHOT:
+            # Folders and files come from the snapshot; the disk is not scanned
+            snapshot_store, snapshot_metadata = load_snapshot(SNAPSHOT_PATH)
+            directory_paths = snapshot_metadata.get('roots', [])
+        else:
+            directory_paths = []
+            while True:
+                path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
+                if not path:
+                    if not directory_paths: print("Nenhuma pasta selecionada. Saindo."); exit()
+                    else: break
+                directory_paths.append(path)
+
+        if ACTIVITY_SOURCE == "git":
+            # Commit timestamps (streamed from git log) feed the same 30-min slots; no file is hashed
+            folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+            git_activity = aggregate_git_activity(directory_paths, (".py",), GIT_TIME_FIELD)
+            plot_estimated_daily_hours(git_activity['slots_by_date'], folder_base_names)
+            exit()
 
         # --- Aggregation Logic ---
-        overall_unique_files_df_list = []
-        folder_base_names = []
-
-        print("\n--- Iniciando Varredura Combinada ---")
-        for i, dir_path in enumerate(directory_paths):
-            folder_base_names.append(os.path.basename(dir_path))
-            print(f"--- Varrendo pasta {i+1}: {dir_path} ---")
-            # Use the simplified scan function
-            df_files = scan_directory_for_py_files_simplified(dir_path)
-            if not df_files.empty:
-                overall_unique_files_df_list.append(df_files)
-
-        if not overall_unique_files_df_list:
-             print("\nNenhum arquivo .py encontrado nas pastas especificadas.")
-             exit()
-
-        # Combine dataframes and keep only the latest modification per hash
-        combined_df = pd.concat(overall_unique_files_df_list, ignore_index=True)
-        # Ensure times are datetime objects *before* finding the latest
-        combined_df['creation_time'] = pd.to_datetime(combined_df['creation_time'], errors='coerce')
-        combined_df['modification_time'] = pd.to_datetime(combined_df['modification_time'], errors='coerce')
-        combined_df = combined_df.dropna(subset=['modification_time', 'creation_time', 'hash']) # Drop rows with invalid data
-        # Keep the row with the latest modification_time for each hash
-        latest_files_df = combined_df.loc[combined_df.groupby('hash')['modification_time'].idxmax()]
+        if LOAD_SNAPSHOT:
+            folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+            latest_files_df = snapshot_store.to_frame(snapshot_metadata.get('hash_algorithm'))
+        else:
+            overall_unique_files_df_list = []
+            folder_base_names = []
+
+            print("\n--- Iniciando Varredura Combinada ---")
+            scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+            if USE_STAGED_DEDUP:
+                # Staged dedup keys are only comparable within one call: scan all folders together
+                folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+                df_files = scan_directory_for_py_files_simplified(directory_paths, scan_cache, staged=True)
+                if not df_files.empty:
+                    overall_unique_files_df_list.append(df_files)
+            else:
+                for i, dir_path in enumerate(directory_paths):
+                    folder_base_names.append(os.path.basename(dir_path))
+                    print(f"--- Varrendo pasta {i+1}: {dir_path} ---")
+                    # Use the simplified scan function
+                    df_files = scan_directory_for_py_files_simplified(dir_path, scan_cache)
+                    if not df_files.empty:
+                        overall_unique_files_df_list.append(df_files)
+            if scan_cache is not None:
+                scan_cache.save()
+                scan_cache.print_stats()
+
+            if not overall_unique_files_df_list:
+                 print("\nNenhum arquivo .py encontrado nas pastas especificadas.")
+                 exit()
+
+            # Combine dataframes and keep only the latest modification per hash
+            combined_df = pd.concat(overall_unique_files_df_list, ignore_index=True)
+            # Ensure times are datetime objects *before* finding the latest
+            combined_df['creation_time'] = pd.to_datetime(combined_df['creation_time'], errors='coerce')
+            combined_df['modification_time'] = pd.to_datetime(combined_df['modification_time'], errors='coerce')
+            combined_df = combined_df.dropna(subset=['modification_time', 'creation_time', 'hash']) # Drop rows with invalid data
+            # Keep the row with the latest modification_time for each hash (never comparing hashes of different algorithms)
+            latest_files_df = combined_df.loc[combined_df.groupby(['hash_algorithm', 'hash'])['modification_time'].idxmax()]
+            if (SAVE_SNAPSHOT or RECORD_TO_WAREHOUSE) and not latest_files_df.empty:
+                scan_store = FileRecordStore.from_frame(latest_files_df)
+                if SAVE_SNAPSHOT:
+                    save_snapshot(SNAPSHOT_PATH, scan_store,
+                                  {'roots': directory_paths, 'hash_algorithm': HASH_ALGORITHM, 'winner_key': 'mtime',
+                                   'dedup': 'staged' if USE_STAGED_DEDUP else 'full'})
+                if RECORD_TO_WAREHOUSE:
+                    with ActivityWarehouse(WAREHOUSE_PATH) as warehouse:
+                        # Staged-dedup keys ("tamanho:...", "prefixo:...") only identify files within this run
+                        warehouse.record_run(scan_store, directory_paths, HASH_ALGORITHM, 'mtime',
+                                             run_scoped=[is_staged_key(key) for key in latest_files_df['hash']])
 
         total_unique_files_combined = len(latest_files_df)
         print(f"--- Varredura Combinada Concluída: {total_unique_files_combined} arquivos .py únicos ---")
@@ -271,73 +416,7 @@ if __name__ == "__main__":
                         except AttributeError:
                            print(f"Aviso: Erro ao processar timestamp {ts} para o arquivo {row.get('filepath')}")
 
-
-            # --- Calculate Daily Hours ---
-            daily_hours_data = {}
-            if not active_slots_by_date:
-                 print("Aviso: Nenhum slot de tempo ativo encontrado.")
-            else:
-                min_date = min(active_slots_by_date.keys())
-                max_date = max(active_slots_by_date.keys())
-                print(f"Período de atividade detectado: {min_date} a {max_date}")
-
-                all_dates = pd.date_range(start=min_date, end=max_date, freq='D')
-                daily_hours_list = []
-                for current_dt in all_dates:
-                    current_date_obj = current_dt.date() # Get date object for lookup
-                    num_active_slots = len(active_slots_by_date.get(current_date_obj, set()))
-                    estimated_hours = num_active_slots * 0.5
-                    daily_hours_list.append({'date': current_dt, 'hours': estimated_hours})
-
-                if not daily_hours_list:
-                      print("Nenhum dado de horas diárias para processar.")
-                      exit()
-
-                # Convert to Pandas Series
-                daily_hours_df = pd.DataFrame(daily_hours_list)
-                daily_hours_series = daily_hours_df.set_index('date')['hours']
-                daily_hours_series = daily_hours_series.sort_index() # Ensure sorted
-
-                # --- Create Output Folder ---
-                folder_name_for_output = "_".join(fn.replace(" ", "_") for fn in folder_base_names) # Sanitize names
-                folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
-                output_folder_name = f"project_time_{folder_name_for_output}_{folder_hash_combined}"
-                output_folder_path = os.path.join(".", output_folder_name)
-                os.makedirs(output_folder_path, exist_ok=True)
-                print(f"\nGráficos de tempo estimado serão salvos em: {output_folder_path}")
-
-                # --- Generate Charts for Each Year ---
-                years_with_data = sorted(daily_hours_series.index.year.unique())
-                print(f"Anos com atividade encontrados: {years_with_data}")
-
-                for year in years_with_data:
-                    # Filter data for the specific year
-                    # Make sure index is datetime before filtering
-                    if not pd.api.types.is_datetime64_any_dtype(daily_hours_series.index):
-                        daily_hours_series.index = pd.to_datetime(daily_hours_series.index)
-                    yearly_data = daily_hours_series[daily_hours_series.index.year == year]
-
-                    if yearly_data.empty or yearly_data.sum() <= 0:
-                         print(f"  -> Pulando ano {year}: Sem dados de tempo estimado > 0.")
-                         continue # Skip year if no data
-
-                    # Generate Bar Chart
-                    output_filename_bar = f"time_bar_{year}_{folder_name_for_output}_{folder_hash_combined}.png"
-                    output_filepath_bar = os.path.join(output_folder_path, output_filename_bar)
-                    create_yearly_time_chart(
-                        yearly_data.copy(), year, output_filepath_bar, chart_type='bar', # Pass a copy
-                        title_prefix=f"Tempo Estimado (Barras) - {', '.join(folder_base_names)}"
-                    )
-
-                    # Generate Area Chart ("Waves")
-                    output_filename_area = f"time_area_{year}_{folder_name_for_output}_{folder_hash_combined}.png"
-                    output_filepath_area = os.path.join(output_folder_path, output_filename_area)
-                    create_yearly_time_chart(
-                        yearly_data.copy(), year, output_filepath_area, chart_type='area', # Pass a copy
-                        title_prefix=f"Tempo Estimado (Área) - {', '.join(folder_base_names)}"
-                    )
-
-                print(f"\nProcesso completo. Gráficos PNG de tempo estimado gerados em: {output_folder_path}")
+            plot_estimated_daily_hours(active_slots_by_date, folder_base_names)
 
         else:
             print("\nNenhum arquivo .py único válido encontrado após combinação e filtragem.")
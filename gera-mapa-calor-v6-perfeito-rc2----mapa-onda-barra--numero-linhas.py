@@ -10,6 +10,12 @@ import matplotlib.ticker as mticker
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog
+from scan_cache import ScanCache
+from heatmap_scanner import scan_files, iter_hashed_files, scan_roots_concurrently
+from record_store import FileRecordStore, save_snapshot, load_snapshot
+from activity_warehouse import ActivityWarehouse, daily_frame
+from file_hashing import hash_and_count_lines, hash_file
+from functools import partial
 import calendar
 from collections import defaultdict
 
@@ -21,18 +27,29 @@ COLOR_CREATED_LOC = '#ef4444' # Lighter red/coral for LOC in newly created files
 COLOR_MODIFIED_LOC = '#b91c1c' # Darker red for LOC in modified files
 FONT_NAME = "Arial"
 
+# --- Cache de Varredura ---
+USE_SCAN_CACHE = True # Reaproveita hash/linhas de arquivos inalterados entre execuções
+SCAN_CACHE_PATH = "heatmap_scan_cache.sqlite"
+SCAN_WORKERS = os.cpu_count() or 4 # Workers para hash/contagem de linhas, no total (divididos entre os processos das pastas; 1 = sequencial)
+SCAN_USE_PROCESSES = False # True = pool de processos (CPU); False = pool de threads (I/O)
+HASH_ALGORITHM = "blake2b:16" # Digest da deduplicação (qualquer do hashlib, ex. "sha256"; "blake2b:16" = rápido)
+SCAN_ROOT_PROCESSES = os.cpu_count() or 4 # Pastas varridas ao mesmo tempo, uma por processo (1 = uma de cada vez)
+
+# --- Snapshot da Varredura ---
+SNAPSHOT_PATH = "heatmap_scan_snapshot_loc.npz" # Resultado da varredura em colunas (NumPy .npz): redesenhar sem varrer (um arquivo por script)
+SAVE_SNAPSHOT = True # Grava o snapshot depois de cada varredura
+LOAD_SNAPSHOT = False # True = desenha a partir do snapshot, sem seletor de pastas e sem ler o disco
+
+# --- Armazém de Atividade ---
+WAREHOUSE_PATH = "heatmap_activity_warehouse.sqlite" # Histórico de todas as varreduras (SQLite em WAL, consultas indexadas)
+RECORD_TO_WAREHOUSE = True # Grava cada varredura no armazém
+CHARTS_FROM_WAREHOUSE = False # True = gráficos de todas as varreduras gravadas: sem seletor de pastas e sem ler o disco
+
 # --- File Scanning Functions (Keep as is from previous script) ---
 def calculate_file_hash(filepath):
-    """Calcula o hash SHA256 de um arquivo."""
-    hasher = hashlib.sha256()
+    """Calcula o hash (HASH_ALGORITHM) de um arquivo."""
     try:
-        with open(filepath, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(filepath, algorithm=HASH_ALGORITHM)
     except Exception as e:
         # print(f"Erro ao calcular hash de {filepath}: {e}") # Optional: reduce noise
         return None
@@ -82,7 +99,7 @@ def count_lines_of_code(filepath):
         return 0
 
 
-def scan_directory_for_py_files(directory):
+def scan_directory_for_py_files(directory, cache=None, workers=SCAN_WORKERS, use_processes=SCAN_USE_PROCESSES):
     """Varre o diretório em busca de arquivos .py, calcula hash, datas e LOC."""
     # (Implementation is identical to the previous version, including ignored folders)
     file_data = []
@@ -104,52 +121,44 @@ def scan_directory_for_py_files(directory):
     pastas_ignoradas = pastas_ignoradas.difference(pastas_para_manter)
 
     print(f"Iniciando varredura em: {directory}")
-    scanned_files_count = 0
-    py_files_count = 0
-
-    for pasta_raiz, subpastas, arquivos in os.walk(directory, topdown=True):
-        subpastas[:] = [
-            subpasta for subpasta in subpastas
-            if subpasta.lower() not in pastas_ignoradas and not subpasta.startswith('.')
-        ]
-        for arquivo in arquivos:
-            scanned_files_count += 1
-            if arquivo.endswith(".py"):
-                py_files_count += 1
-                caminho_arquivo = os.path.join(pasta_raiz, arquivo)
-                file_hash = calculate_file_hash(caminho_arquivo)
-                creation_time, modification_time = get_file_times(caminho_arquivo)
-
-                if file_hash and creation_time and modification_time:
-                    is_newer = True
-                    if file_hash in unique_files_by_hash:
-                        existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
-                        if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
-                           is_newer = False
-
-                    if is_newer:
-                        lines = count_lines_of_code(caminho_arquivo)
-                        # Ensure lines is numeric before proceeding
-                        if not isinstance(lines, (int, float)):
-                           lines = 0 # Default to 0 if count failed
-
-                        if file_hash in unique_files_by_hash:
-                            existing_lines = unique_files_by_hash[file_hash].get('lines')
-                            if isinstance(existing_lines, (int, float)):
-                                total_lines -= existing_lines # Subtract old LOC count
-
-                        unique_files_by_hash[file_hash] = {
-                            'creation_time': creation_time,
-                            'modification_time': modification_time,
-                            'filepath': caminho_arquivo,
-                            'lines': lines, # Store the calculated LOC
-                            'hash': file_hash
-                        }
-                        total_lines += lines # Add new LOC count
-
-    # print(f"Varredura concluída. Total de arquivos escaneados: {scanned_files_count}. Arquivos .py encontrados: {py_files_count}.")
-    # print(f"Arquivos .py únicos (baseado no hash e mtime): {len(unique_files_by_hash)}.")
-    # print(f"Total de linhas de código (aproximado): {total_lines}") # Optional: Print total LOC sum
+
+    # O walker alimenta o pool; a deduplicação abaixo roda só nesta thread
+    py_files = scan_files(directory, pastas_ignoradas, (".py",))
+    # Hash + linhas numa única leitura binária por arquivo (sem decodificar texto)
+    hashed_files = iter_hashed_files(py_files, partial(hash_and_count_lines, algorithm=HASH_ALGORITHM), None, workers, use_processes, cache, fused=True)
+    for record, file_hash, file_lines in hashed_files:
+        caminho_arquivo = record['filepath']
+        # Datas vêm do mesmo stat feito pelo walker (sem getctime/getmtime extras)
+        creation_time = datetime.fromtimestamp(record['ctime'])
+        modification_time = datetime.fromtimestamp(record['mtime'])
+
+        if file_hash and creation_time and modification_time:
+            is_newer = True
+            if file_hash in unique_files_by_hash:
+                existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
+                if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
+                   is_newer = False
+
+            if is_newer:
+                lines = file_lines
+                # Ensure lines is numeric before proceeding
+                if not isinstance(lines, (int, float)):
+                   lines = 0 # Default to 0 if count failed
+
+                if file_hash in unique_files_by_hash:
+                    existing_lines = unique_files_by_hash[file_hash].get('lines')
+                    if isinstance(existing_lines, (int, float)):
+                        total_lines -= existing_lines # Subtract old LOC count
+
+                unique_files_by_hash[file_hash] = {
+                    'creation_time': creation_time,
+                    'modification_time': modification_time,
+                    'filepath': caminho_arquivo,
+                    'lines': lines, # Store the calculated LOC
+                    'hash': file_hash,
+                    'hash_algorithm': HASH_ALGORITHM # Hashes de algoritmos diferentes nunca se misturam
+                }
+                total_lines += lines # Add new LOC count
 
     file_data = list(unique_files_by_hash.values())
     return pd.DataFrame(file_data), total_lines, len(unique_files_by_hash)
@@ -240,61 +249,112 @@ def create_yearly_loc_chart(
         print(f"  -> ERRO ao salvar o gráfico {output_filepath}: {e}")
     plt.close(fig)
 
+# --- LOC Charts for Each Year (shared by the scan and the warehouse) ---
+def plot_daily_loc(daily_activity_loc, folder_base_names, total_unique_files_combined, overall_total_lines):
+    """Gera um gráfico de LOC por ano a partir da soma diária de linhas (created_loc, modified_loc)."""
+    # --- Create Output Folder ---
+    folder_name_for_output = "_".join(folder_base_names)
+    folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
+    output_folder_name = f"loc_charts_{folder_name_for_output}_{folder_hash_combined}" # Changed folder name
+    output_folder_path = os.path.join(".", output_folder_name)
+    os.makedirs(output_folder_path, exist_ok=True)
+    print(f"\nGráficos de atividade de LOC serão salvos em: {output_folder_path}")
+    print(f"Total de arquivos .py únicos combinados: {total_unique_files_combined}")
+    print(f"Total de linhas de código nesses arquivos: {overall_total_lines:,}".replace(",", "."))
+
+
+    # --- Generate Chart for Each Year ---
+    years_with_data = sorted(daily_activity_loc.index.year.unique())
+    print(f"Anos com atividade de LOC encontrados: {years_with_data}")
+
+    for year in years_with_data:
+        yearly_data_loc = daily_activity_loc[daily_activity_loc.index.year == year]
+
+        # Define output filename for this year's LOC chart
+        output_filename = f"loc_activity_{year}_{folder_name_for_output}_{folder_hash_combined}.png" # Changed file name prefix
+        output_filepath = os.path.join(output_folder_path, output_filename)
+
+        # Call the updated plotting function
+        create_yearly_loc_chart(
+            yearly_data_loc,
+            year,
+            output_filepath,
+            title_prefix=f"Atividade Diária (LOC) - {', '.join(folder_base_names)}" # Add folder names to title
+        )
+
+    print(f"\nProcesso completo. Gráficos PNG de atividade de LOC gerados em: {output_folder_path}")
+
 # --- Main Execution ---
 if __name__ == "__main__":
     root = tk.Tk()
     root.withdraw()
 
-    directory_paths = []
-    while True:
-        path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
-        if not path:
-            if not directory_paths:
-                print("Nenhuma pasta selecionada. Saindo.")
-                exit()
-            else:
-                break
-        directory_paths.append(path)
+    if CHARTS_FROM_WAREHOUSE:
+        # Somas diárias de LOC vêm de consultas agregadas no armazém (todas as execuções); o disco não é varrido.
+        # Arquivos criados e modificados no mesmo dia contam só como criados, como na agregação abaixo
+        with ActivityWarehouse(WAREHOUSE_PATH) as warehouse:
+            folder_base_names = [os.path.basename(dir_path) for dir_path in warehouse.roots()]
+            daily_activity_loc = daily_frame({'created_loc': warehouse.daily_lines('created'),
+                                              'modified_loc': warehouse.daily_lines('modified', exclude_created_same_day=True)})
+            total_unique_files_combined, overall_total_lines = warehouse.totals()
+        if daily_activity_loc.empty or daily_activity_loc.sum().sum() == 0:
+            print(f"Nenhuma atividade de LOC gravada no armazém {WAREHOUSE_PATH}.")
+        else:
+            plot_daily_loc(daily_activity_loc, folder_base_names, total_unique_files_combined, overall_total_lines)
+        exit()
+
+    if LOAD_SNAPSHOT:
+        # Pastas e arquivos vêm do snapshot; o disco não é varrido
+        snapshot_store, snapshot_metadata = load_snapshot(SNAPSHOT_PATH, require_lines=True) # LOC sem linhas seria um gráfico zerado
+        directory_paths = snapshot_metadata.get('roots', [])
+    else:
+        directory_paths = []
+        while True:
+            path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
+            if not path:
+                if not directory_paths:
+                    print("Nenhuma pasta selecionada. Saindo.")
+                    exit()
+                else:
+                    break
+            directory_paths.append(path)
 
     # --- Aggregation Logic (Same folder scanning) ---
-    overall_unique_files = {}
-    overall_total_lines = 0
-    folder_base_names = []
-
-    for i, dir_path in enumerate(directory_paths):
-        folder_base_names.append(os.path.basename(dir_path))
-        print(f"\n--- Varrendo pasta {i+1}: {dir_path} ---")
-        # Scan returns df_files, total_lines_in_folder, unique_files_in_folder
-        df_files, folder_lines, folder_unique_count = scan_directory_for_py_files(dir_path)
-        print(f"    Arquivos .py únicos na pasta: {folder_unique_count}, Linhas: {folder_lines}")
-
-
-        for index, row in df_files.iterrows():
-             file_hash = row.get('hash')
-             modification_time = row.get('modification_time')
-             lines = row.get('lines') # Get the LOC for this file
-
-             # Basic validation
-             if not file_hash or not isinstance(modification_time, datetime) or not isinstance(lines, (int, float)):
-                 # print(f"Aviso: Dados inválidos ou ausentes para linha {index} em {dir_path}. Pulando.")
-                 continue
-
-             is_newer_overall = True
-             if file_hash in overall_unique_files:
-                  existing_mtime = overall_unique_files[file_hash].get('modification_time')
-                  if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
-                       is_newer_overall = False
-
-             if is_newer_overall:
-                  if file_hash in overall_unique_files:
-                       existing_lines = overall_unique_files[file_hash].get('lines')
-                       if isinstance(existing_lines, (int, float)):
-                            overall_total_lines -= existing_lines # Subtract old LOC
-
-                  overall_unique_files[file_hash] = row.to_dict()
-                  overall_total_lines += lines # Add new LOC
-
-    unique_files_df_combined = pd.DataFrame(list(overall_unique_files.values()))
+    # Todas as pastas são varridas ao mesmo tempo (um processo por pasta, discos diferentes em paralelo).
+    # Junção: para cada hash fica o arquivo de mtime mais recente (empate: a primeira pasta selecionada)
+    folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+    if LOAD_SNAPSHOT:
+        unique_files_df_combined = snapshot_store.to_frame(snapshot_metadata.get('hash_algorithm'))
+        overall_total_lines = snapshot_store.total_lines()
+    else:
+        for i, dir_path in enumerate(directory_paths):
+            print(f"\n--- Varrendo pasta {i+1}: {dir_path} ---")
+        scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+        scan_results = scan_roots_concurrently(directory_paths, scan_directory_for_py_files, scan_cache, SCAN_ROOT_PROCESSES, SCAN_WORKERS)
+        for dir_path, (_, folder_lines, folder_unique_count) in zip(directory_paths, scan_results):
+            print(f"    {os.path.basename(dir_path)}: arquivos .py únicos na pasta: {folder_unique_count}, Linhas: {folder_lines}")
+
+        overall_total_lines = 0
+        unique_files_df_combined = pd.DataFrame()
+        df_files_list = [df_files for df_files, _, _ in scan_results if not df_files.empty]
+        if df_files_list:
+            combined_df = pd.concat(df_files_list, ignore_index=True)
+            combined_df = combined_df.dropna(subset=['hash', 'modification_time', 'lines'])
+            unique_files_df_combined = combined_df.loc[combined_df.groupby('hash')['modification_time'].idxmax()].reset_index(drop=True)
+            overall_total_lines = int(unique_files_df_combined['lines'].sum())
+
+        if scan_cache is not None:
+            scan_cache.save()
+            scan_cache.print_stats()
+        if (SAVE_SNAPSHOT or RECORD_TO_WAREHOUSE) and not unique_files_df_combined.empty:
+            scan_store = FileRecordStore.from_frame(unique_files_df_combined)
+            if SAVE_SNAPSHOT:
+                save_snapshot(SNAPSHOT_PATH, scan_store,
+                              {'roots': directory_paths, 'hash_algorithm': HASH_ALGORITHM, 'winner_key': 'mtime'})
+            if RECORD_TO_WAREHOUSE:
+                with ActivityWarehouse(WAREHOUSE_PATH) as warehouse:
+                    warehouse.record_run(scan_store, directory_paths, HASH_ALGORITHM, 'mtime')
+
     total_unique_files_combined = len(unique_files_df_combined)
 
     if not unique_files_df_combined.empty:
@@ -353,37 +413,7 @@ if __name__ == "__main__":
         if daily_activity_loc.empty or daily_activity_loc.sum().sum() == 0:
             print("Nenhuma atividade de LOC diária encontrada após agregação.")
         else:
-            # --- Create Output Folder ---
-            folder_name_for_output = "_".join(folder_base_names)
-            folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
-            output_folder_name = f"loc_charts_{folder_name_for_output}_{folder_hash_combined}" # Changed folder name
-            output_folder_path = os.path.join(".", output_folder_name)
-            os.makedirs(output_folder_path, exist_ok=True)
-            print(f"\nGráficos de atividade de LOC serão salvos em: {output_folder_path}")
-            print(f"Total de arquivos .py únicos combinados: {total_unique_files_combined}")
-            print(f"Total de linhas de código nesses arquivos: {overall_total_lines:,}".replace(",", "."))
-
-
-            # --- Generate Chart for Each Year ---
-            years_with_data = sorted(daily_activity_loc.index.year.unique())
-            print(f"Anos com atividade de LOC encontrados: {years_with_data}")
-
-            for year in years_with_data:
-                yearly_data_loc = daily_activity_loc[daily_activity_loc.index.year == year]
-
-                # Define output filename for this year's LOC chart
-                output_filename = f"loc_activity_{year}_{folder_name_for_output}_{folder_hash_combined}.png" # Changed file name prefix
-                output_filepath = os.path.join(output_folder_path, output_filename)
-
-                # Call the updated plotting function
-                create_yearly_loc_chart(
-                    yearly_data_loc,
-                    year,
-                    output_filepath,
-                    title_prefix=f"Atividade Diária (LOC) - {', '.join(folder_base_names)}" # Add folder names to title
-                )
-
-            print(f"\nProcesso completo. Gráficos PNG de atividade de LOC gerados em: {output_folder_path}")
+            plot_daily_loc(daily_activity_loc, folder_base_names, total_unique_files_combined, overall_total_lines)
 
     else:
         print("\nNenhum arquivo .py único encontrado ou dados de tempo inválidos nas pastas especificadas.")
\ No newline at end of file
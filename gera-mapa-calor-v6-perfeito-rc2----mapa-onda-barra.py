@@ -10,6 +10,12 @@ import matplotlib.ticker as mticker
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog
+from scan_cache import ScanCache
+from heatmap_scanner import scan_files, iter_hashed_files, scan_roots_concurrently, print_inode_reuse_stats
+from record_store import FileRecordStore, save_snapshot, load_snapshot
+from activity_warehouse import ActivityWarehouse, daily_frame
+from file_hashing import hash_and_count_lines, hash_file
+from functools import partial
 import calendar
 from collections import defaultdict
 
@@ -27,18 +33,29 @@ COLOR_MODIFIED = '#b91c1c' # Darker red (Tailwind red-700)
 # Let's stick to the 2-color scheme first based on 'Ocorrências'
 FONT_NAME = "Arial" # Use Arial or a common sans-serif
 
+# --- Cache de Varredura ---
+USE_SCAN_CACHE = True # Reaproveita hash/linhas de arquivos inalterados entre execuções
+SCAN_CACHE_PATH = "heatmap_scan_cache.sqlite"
+SCAN_WORKERS = os.cpu_count() or 4 # Workers para hash/contagem de linhas, no total (divididos entre os processos das pastas; 1 = sequencial)
+SCAN_USE_PROCESSES = False # True = pool de processos (CPU); False = pool de threads (I/O)
+HASH_ALGORITHM = "blake2b:16" # Digest da deduplicação (qualquer do hashlib, ex. "sha256"; "blake2b:16" = rápido)
+SCAN_ROOT_PROCESSES = os.cpu_count() or 4 # Pastas varridas ao mesmo tempo, uma por processo (1 = uma de cada vez)
+
+# --- Snapshot da Varredura ---
+SNAPSHOT_PATH = "heatmap_scan_snapshot_activity.npz" # Resultado da varredura em colunas (NumPy .npz): redesenhar sem varrer (um arquivo por script)
+SAVE_SNAPSHOT = True # Grava o snapshot depois de cada varredura
+LOAD_SNAPSHOT = False # True = desenha a partir do snapshot, sem seletor de pastas e sem ler o disco
+
+# --- Armazém de Atividade ---
+WAREHOUSE_PATH = "heatmap_activity_warehouse.sqlite" # Histórico de todas as varreduras (SQLite em WAL, consultas indexadas)
+RECORD_TO_WAREHOUSE = True # Grava cada varredura no armazém
+CHARTS_FROM_WAREHOUSE = False # True = gráficos de todas as varreduras gravadas: sem seletor de pastas e sem ler o disco
+
 # --- File Scanning Functions (Keep as is from previous script) ---
 def calculate_file_hash(filepath):
-    """Calcula o hash SHA256 de um arquivo."""
-    hasher = hashlib.sha256()
+    """Calcula o hash (HASH_ALGORITHM) de um arquivo."""
     try:
-        with open(filepath, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(filepath, algorithm=HASH_ALGORITHM)
     except Exception as e:
         print(f"Erro ao calcular hash de {filepath}: {e}")
         return None
@@ -79,7 +96,7 @@ def count_lines_of_code(filepath):
         print(f"Erro geral ao processar {filepath} para contagem de linhas: {e}")
         return 0
 
-def scan_directory_for_py_files(directory):
+def scan_directory_for_py_files(directory, cache=None, workers=SCAN_WORKERS, use_processes=SCAN_USE_PROCESSES):
     """Varre o diretório em busca de arquivos .py, calcula hash e datas."""
     file_data = []
     unique_files_by_hash = {}
@@ -100,48 +117,48 @@ def scan_directory_for_py_files(directory):
     pastas_ignoradas = pastas_ignoradas.difference(pastas_para_manter)
 
     print(f"Iniciando varredura em: {directory}")
-    scanned_files_count = 0
-    py_files_count = 0
-
-    for pasta_raiz, subpastas, arquivos in os.walk(directory, topdown=True):
-        subpastas[:] = [
-            subpasta for subpasta in subpastas
-            if subpasta.lower() not in pastas_ignoradas and not subpasta.startswith('.')
-        ]
-        for arquivo in arquivos:
-            scanned_files_count += 1
-            if arquivo.endswith(".py"):
-                py_files_count += 1
-                caminho_arquivo = os.path.join(pasta_raiz, arquivo)
-                file_hash = calculate_file_hash(caminho_arquivo)
-                creation_time, modification_time = get_file_times(caminho_arquivo)
-
-                if file_hash and creation_time and modification_time:
-                    is_newer = True
-                    if file_hash in unique_files_by_hash:
-                        existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
-                        if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
-                           is_newer = False
-
-                    if is_newer:
-                        lines = count_lines_of_code(caminho_arquivo)
-                        if file_hash in unique_files_by_hash:
-                            existing_lines = unique_files_by_hash[file_hash].get('lines')
-                            if isinstance(existing_lines, (int, float)):
-                                total_lines -= existing_lines
-
-                        unique_files_by_hash[file_hash] = {
-                            'creation_time': creation_time,
-                            'modification_time': modification_time,
-                            'filepath': caminho_arquivo,
-                            'lines': lines,
-                            'hash': file_hash
-                        }
-                        if isinstance(lines, (int, float)):
-                             total_lines += lines
-
+    walk_counters = {'scanned': 0, 'matched': 0}
+
+    # O walker alimenta o pool; a deduplicação abaixo roda só nesta thread
+    py_files = scan_files(directory, pastas_ignoradas, (".py",), walk_counters)
+    # Hash + linhas numa única leitura binária por arquivo (sem decodificar texto)
+    hashed_files = iter_hashed_files(py_files, partial(hash_and_count_lines, algorithm=HASH_ALGORITHM), None, workers, use_processes, cache, fused=True, counters=walk_counters)
+    for record, file_hash, file_lines in hashed_files:
+        caminho_arquivo = record['filepath']
+        # Datas vêm do mesmo stat feito pelo walker (sem getctime/getmtime extras)
+        creation_time = datetime.fromtimestamp(record['ctime'])
+        modification_time = datetime.fromtimestamp(record['mtime'])
+
+        if file_hash and creation_time and modification_time:
+            is_newer = True
+            if file_hash in unique_files_by_hash:
+                existing_mtime = unique_files_by_hash[file_hash].get('modification_time')
+                if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
+                   is_newer = False
+
+            if is_newer:
+                lines = file_lines
+                if file_hash in unique_files_by_hash:
+                    existing_lines = unique_files_by_hash[file_hash].get('lines')
+                    if isinstance(existing_lines, (int, float)):
+                        total_lines -= existing_lines
+
+                unique_files_by_hash[file_hash] = {
+                    'creation_time': creation_time,
+                    'modification_time': modification_time,
+                    'filepath': caminho_arquivo,
+                    'lines': lines,
+                    'hash': file_hash,
+                    'hash_algorithm': HASH_ALGORITHM # Hashes de algoritmos diferentes nunca se misturam
+                }
+                if isinstance(lines, (int, float)):
+                     total_lines += lines
+
+    scanned_files_count = walk_counters['scanned']
+    py_files_count = walk_counters['matched']
     print(f"Varredura concluída. Total de arquivos escaneados: {scanned_files_count}. Arquivos .py encontrados: {py_files_count}.")
     print(f"Arquivos .py únicos (baseado no hash e mtime): {len(unique_files_by_hash)}.")
+    print_inode_reuse_stats(walk_counters)
 
     file_data = list(unique_files_by_hash.values())
     return pd.DataFrame(file_data), total_lines, len(unique_files_by_hash)
@@ -241,57 +258,106 @@ def create_yearly_activity_chart(
         print(f"  -> ERRO ao salvar o gráfico {output_filepath}: {e}")
     plt.close(fig) # Close the figure to free memory
 
+# --- Charts for Each Year (shared by the scan and the warehouse) ---
+def plot_daily_activity(daily_activity, folder_base_names):
+    """Gera um gráfico de atividade por ano a partir da contagem diária (created_count, modified_count)."""
+    # --- Create Output Folder ---
+    folder_name_for_output = "_".join(folder_base_names)
+    folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
+    output_folder_name = f"activity_charts_{folder_name_for_output}_{folder_hash_combined}"
+    output_folder_path = os.path.join(".", output_folder_name) # Save in current dir subfolder
+    os.makedirs(output_folder_path, exist_ok=True)
+    print(f"\nGráficos de atividade serão salvos em: {output_folder_path}")
+
+    # --- Generate Chart for Each Year ---
+    years_with_data = sorted(daily_activity.index.year.unique())
+    print(f"Anos com atividade encontrados: {years_with_data}")
+
+    for year in years_with_data:
+        # Filter data for the current year
+        yearly_data = daily_activity[daily_activity.index.year == year]
+
+        # Define output filename for this year's chart
+        output_filename = f"activity_{year}_{folder_name_for_output}_{folder_hash_combined}.png"
+        output_filepath = os.path.join(output_folder_path, output_filename)
+
+        # Call the plotting function
+        create_yearly_activity_chart(
+            yearly_data,
+            year,
+            output_filepath,
+            title_prefix=f"Atividade Diária ({', '.join(folder_base_names)})" # Add folder names to title
+        )
+
+    print(f"\nProcesso completo. Gráficos PNG de atividade gerados em: {output_folder_path}")
+
 # --- Main Execution ---
 if __name__ == "__main__":
     root = tk.Tk()
     root.withdraw()
 
-    directory_paths = []
-    while True:
-        path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
-        if not path:
-            if not directory_paths:
-                print("Nenhuma pasta selecionada. Saindo.")
-                exit()
-            else:
-                break
-        directory_paths.append(path)
+    if CHARTS_FROM_WAREHOUSE:
+        # Contagens diárias vêm de consultas agregadas no armazém (todas as execuções); o disco não é varrido
+        with ActivityWarehouse(WAREHOUSE_PATH) as warehouse:
+            folder_base_names = [os.path.basename(dir_path) for dir_path in warehouse.roots()]
+            daily_activity = daily_frame({'created_count': warehouse.daily_counts('created'),
+                                          'modified_count': warehouse.daily_counts('modified')})
+        if daily_activity.empty:
+            print(f"Nenhuma varredura gravada no armazém {WAREHOUSE_PATH}.")
+        else:
+            plot_daily_activity(daily_activity, folder_base_names)
+        exit()
+
+    if LOAD_SNAPSHOT:
+        # Pastas e arquivos vêm do snapshot; o disco não é varrido
+        snapshot_store, snapshot_metadata = load_snapshot(SNAPSHOT_PATH)
+        directory_paths = snapshot_metadata.get('roots', [])
+    else:
+        directory_paths = []
+        while True:
+            path = filedialog.askdirectory(title=f"Selecione a pasta #{len(directory_paths) + 1} (Cancele para parar)")
+            if not path:
+                if not directory_paths:
+                    print("Nenhuma pasta selecionada. Saindo.")
+                    exit()
+                else:
+                    break
+            directory_paths.append(path)
 
     # --- Aggregation Logic (Same as before) ---
-    overall_unique_files = {}
-    overall_total_lines = 0
-    folder_base_names = []
-
-    for i, dir_path in enumerate(directory_paths):
-        folder_base_names.append(os.path.basename(dir_path))
-        print(f"\n--- Varrendo pasta {i+1}: {dir_path} ---")
-        # Scan returns df_files, total_lines_in_folder, unique_files_in_folder
-        df_files, _, _ = scan_directory_for_py_files(dir_path)
-
-        for index, row in df_files.iterrows():
-             file_hash = row.get('hash')
-             modification_time = row.get('modification_time')
-             lines = row.get('lines')
-
-             if not file_hash or not isinstance(modification_time, datetime) or not isinstance(lines, (int, float)):
-                 continue
-
-             is_newer_overall = True
-             if file_hash in overall_unique_files:
-                  existing_mtime = overall_unique_files[file_hash].get('modification_time')
-                  if isinstance(existing_mtime, datetime) and modification_time <= existing_mtime:
-                       is_newer_overall = False
-
-             if is_newer_overall:
-                  if file_hash in overall_unique_files:
-                       existing_lines = overall_unique_files[file_hash].get('lines')
-                       if isinstance(existing_lines, (int, float)):
-                            overall_total_lines -= existing_lines
-
-                  overall_unique_files[file_hash] = row.to_dict()
-                  overall_total_lines += lines
-
-    unique_files_df_combined = pd.DataFrame(list(overall_unique_files.values()))
+    # Todas as pastas são varridas ao mesmo tempo (um processo por pasta, discos diferentes em paralelo).
+    # Junção: para cada hash fica o arquivo de mtime mais recente (empate: a primeira pasta selecionada)
+    folder_base_names = [os.path.basename(dir_path) for dir_path in directory_paths]
+    if LOAD_SNAPSHOT:
+        unique_files_df_combined = snapshot_store.to_frame(snapshot_metadata.get('hash_algorithm'))
+        overall_total_lines = snapshot_store.total_lines()
+    else:
+        for i, dir_path in enumerate(directory_paths):
+            print(f"\n--- Varrendo pasta {i+1}: {dir_path} ---")
+        scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+        scan_results = scan_roots_concurrently(directory_paths, scan_directory_for_py_files, scan_cache, SCAN_ROOT_PROCESSES, SCAN_WORKERS)
+
+        overall_total_lines = 0
+        unique_files_df_combined = pd.DataFrame()
+        df_files_list = [df_files for df_files, _, _ in scan_results if not df_files.empty]
+        if df_files_list:
+            combined_df = pd.concat(df_files_list, ignore_index=True)
+            combined_df = combined_df.dropna(subset=['hash', 'modification_time', 'lines'])
+            unique_files_df_combined = combined_df.loc[combined_df.groupby('hash')['modification_time'].idxmax()].reset_index(drop=True)
+            overall_total_lines = int(unique_files_df_combined['lines'].sum())
+
+        if scan_cache is not None:
+            scan_cache.save()
+            scan_cache.print_stats()
+        if (SAVE_SNAPSHOT or RECORD_TO_WAREHOUSE) and not unique_files_df_combined.empty:
+            scan_store = FileRecordStore.from_frame(unique_files_df_combined)
+            if SAVE_SNAPSHOT:
+                save_snapshot(SNAPSHOT_PATH, scan_store,
+                              {'roots': directory_paths, 'hash_algorithm': HASH_ALGORITHM, 'winner_key': 'mtime'})
+            if RECORD_TO_WAREHOUSE:
+                with ActivityWarehouse(WAREHOUSE_PATH) as warehouse:
+                    warehouse.record_run(scan_store, directory_paths, HASH_ALGORITHM, 'mtime')
+
     total_unique_files_combined = len(unique_files_df_combined)
 
     if not unique_files_df_combined.empty:
@@ -326,35 +392,7 @@ if __name__ == "__main__":
         if daily_activity.empty:
             print("Nenhuma atividade diária encontrada após agregação.")
         else:
-            # --- Create Output Folder ---
-            folder_name_for_output = "_".join(folder_base_names)
-            folder_hash_combined = hashlib.sha256(folder_name_for_output.encode()).hexdigest()[:8]
-            output_folder_name = f"activity_charts_{folder_name_for_output}_{folder_hash_combined}"
-            output_folder_path = os.path.join(".", output_folder_name) # Save in current dir subfolder
-            os.makedirs(output_folder_path, exist_ok=True)
-            print(f"\nGráficos de atividade serão salvos em: {output_folder_path}")
-
-            # --- Generate Chart for Each Year ---
-            years_with_data = sorted(daily_activity.index.year.unique())
-            print(f"Anos com atividade encontrados: {years_with_data}")
-
-            for year in years_with_data:
-                # Filter data for the current year
-                yearly_data = daily_activity[daily_activity.index.year == year]
-
-                # Define output filename for this year's chart
-                output_filename = f"activity_{year}_{folder_name_for_output}_{folder_hash_combined}.png"
-                output_filepath = os.path.join(output_folder_path, output_filename)
-
-                # Call the plotting function
-                create_yearly_activity_chart(
-                    yearly_data,
-                    year,
-                    output_filepath,
-                    title_prefix=f"Atividade Diária ({', '.join(folder_base_names)})" # Add folder names to title
-                )
-
-            print(f"\nProcesso completo. Gráficos PNG de atividade gerados em: {output_folder_path}")
+            plot_daily_activity(daily_activity, folder_base_names)
 
     else:
         print("\nNenhum arquivo .py único encontrado ou dados de tempo inválidos nas pastas especificadas.")
\ No newline at end of file
@@ -5,6 +5,8 @@ import pandas as pd
 from PIL import Image, ImageDraw, ImageFont
 import tkinter as tk
 from tkinter import filedialog
+from file_hashing import hash_file
+from ignore_rules import IgnoreMatcher
 
 # Configurações de Design 100% Compatíveis com a Imagem de Exemplo
 IMAGE_BACKGROUND_COLOR = (30, 30, 30)
@@ -60,18 +62,13 @@ FONT_DAY_OF_WEEK_NAME = "arialbd" # Nome da fonte Arial Bold (sem extensão)
 FONT_NAME = "arial" # Nome da fonte Arial (sem extensão)
 FONT_LEGEND_NAME = "arial" # Fonte para legendas
 
+HASH_ALGORITHM = "blake2b:16" # Digest da deduplicação (qualquer do hashlib, ex. "sha256")
+
 
 def calculate_file_hash(filepath):
-    """Calcula o hash SHA256 de um arquivo."""
-    hasher = hashlib.sha256()
+    """Calcula o hash (HASH_ALGORITHM) de um arquivo."""
     try:
-        with open(filepath, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(filepath, algorithm=HASH_ALGORITHM)
     except Exception as e:
         print(f"Erro ao calcular hash de {filepath}: {e}")
         return None
@@ -112,15 +109,15 @@ def scan_directory_for_py_files(directory):
         '._*', '._.Trashes', '._.DS_Store', '.localized', '.AppleDouble',
     ])
     pastas_para_manter = {'test', 'tests', 'testing', 'integration-tests', 'unit-tests', 'functional-tests', 'benchmark', 'benchmarks', 'example', 'examples', 'sample', 'samples', 'notebooks'}
-    pastas_ignoradas = pastas_ignoradas.difference(pastas_para_manter)
+    ignore_matcher = IgnoreMatcher(pastas_ignoradas, keep=pastas_para_manter) # Globs como '*.egg-info' também valem
 
     for pasta_raiz, subpastas, arquivos in os.walk(directory):
         subpastas[:] = [
             subpasta for subpasta in subpastas
-            if subpasta.lower() not in pastas_ignoradas and not subpasta.startswith('.')
+            if ignore_matcher.match(subpasta, os.path.join(pasta_raiz, subpasta), True) is None
         ]
         for arquivo in arquivos:
-            if arquivo.endswith(".py"):
+            if arquivo.endswith(".py") and ignore_matcher.match(arquivo, os.path.join(pasta_raiz, arquivo), False) is None:
                 caminho_arquivo = os.path.join(pasta_raiz, arquivo)
                 file_hash = calculate_file_hash(caminho_arquivo)
                 creation_time = get_original_creation_time(caminho_arquivo)
@@ -138,6 +135,7 @@ def scan_directory_for_py_files(directory):
             'filepath': file_info['filepath'],
             'creation_time': file_info['creation_time'],
             'hash': file_hash_val,
+            'hash_algorithm': HASH_ALGORITHM,
             'lines': file_info['lines']
         })
     return pd.DataFrame(file_data), total_lines
@@ -0,0 +1,107 @@
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+# Executável do git (no PATH por padrão)
+GIT_EXECUTABLE = "git"
+# Separador de registro ASCII: marca o início de cada commit na saída do git log
+_COMMIT_MARKER = "\x1e"
+
+
+def iter_git_file_events(repo_path, extensions=(".py",), time_field="author", git_executable=GIT_EXECUTABLE):
+    """Gera um evento por (commit, arquivo) lendo `git log --numstat` em streaming.
+
+    Cada evento é {'commit', 'time' (datetime local), 'filepath' (relativo ao
+    repositório), 'added', 'deleted'}. time_field="author" usa a data do autor
+    (quando a mudança foi escrita); "committer" usa a data do commit (muda em
+    rebase/cherry-pick). A saída é lida linha a linha: o histórico inteiro nunca
+    fica em memória. Commits de merge não trazem arquivos. Erros (pasta que não é
+    repositório, git ausente) são impressos e o gerador termina sem eventos.
+    """
+    date_format = "%ct" if time_field == "committer" else "%at"
+    command = [git_executable, "-C", repo_path, "-c", "core.quotepath=off", "log",
+               "--no-renames", "--numstat", f"--format={_COMMIT_MARKER}%H {date_format}"]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, encoding="utf-8", errors="replace")
+    except OSError as e:
+        print(f"Erro ao executar git para {repo_path}: {e}")
+        return
+
+    finished = False
+    try:
+        commit = None
+        moment = None
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith(_COMMIT_MARKER):
+                commit, timestamp = line[1:].split(" ", 1)
+                moment = datetime.fromtimestamp(int(timestamp))
+                continue
+            if not line or commit is None:
+                continue
+            parts = line.split("\t", 2)
+            if len(parts) != 3:
+                continue
+            added, deleted, filepath = parts
+            if extensions and not filepath.endswith(extensions):
+                continue
+            yield {
+                'commit': commit,
+                'time': moment,
+                'filepath': filepath,
+                'added': int(added) if added.isdigit() else 0, # '-' em arquivos binários
+                'deleted': int(deleted) if deleted.isdigit() else 0,
+            }
+        finished = True
+    finally:
+        if not finished and process.poll() is None:
+            process.kill() # Consumidor parou antes do fim do histórico
+        process.stdout.close()
+        error_output = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0 and finished:
+            print(f"Erro ao ler histórico git de {repo_path}: {error_output.strip()}")
+
+
+def slot_index(moment):
+    """Índice do intervalo de 30 minutos do dia (0-47), o mesmo do estimador de horas."""
+    return moment.hour * 2 + (0 if moment.minute < 30 else 1)
+
+
+def aggregate_git_activity(repo_paths, extensions=(".py",), time_field="author", git_executable=GIT_EXECUTABLE):
+    """Uma passada pelo histórico de cada repositório alimentando as duas agregações.
+
+    Retorna {'hour_counts': {(ano, mês, dia, hora): eventos}, 'slots_by_date':
+    {date: set(slots de 30 min)}, 'events', 'commits', 'files' (arquivos distintos
+    tocados), 'lines_added'}. A memória cresce com o número de células/dias e de
+    arquivos distintos, não com o número de commits.
+    """
+    hour_counts = defaultdict(int)
+    slots_by_date = defaultdict(set)
+    files = set()
+    totals = {'events': 0, 'commits': 0, 'lines_added': 0}
+
+    for repo_index, repo_path in enumerate(repo_paths):
+        print(f"Lendo histórico git de: {repo_path}")
+        last_commit = None
+        for event in iter_git_file_events(repo_path, extensions, time_field, git_executable):
+            moment = event['time']
+            hour_counts[(moment.year, moment.month, moment.day, moment.hour)] += 1
+            slots_by_date[moment.date()].add(slot_index(moment))
+            files.add((repo_index, event['filepath']))
+            totals['events'] += 1
+            totals['lines_added'] += event['added']
+            if event['commit'] != last_commit:
+                totals['commits'] += 1
+                last_commit = event['commit']
+
+    print(f"Histórico git: {totals['commits']} commits, {totals['events']} alterações de arquivo, {len(files)} arquivos distintos.")
+    return {
+        'hour_counts': dict(hour_counts),
+        'slots_by_date': slots_by_date,
+        'events': totals['events'],
+        'commits': totals['commits'],
+        'files': len(files),
+        'lines_added': totals['lines_added'],
+    }
@@ -0,0 +1,447 @@
+import os
+import time
+import hashlib
+from collections import defaultdict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait, as_completed
+from scan_cache import ScanCache
+from ignore_rules import IgnoreMatcher
+
+# Número padrão de workers para hash/contagem de linhas em paralelo
+SCAN_WORKERS_DEFAULT = os.cpu_count() or 4
+# Quantas tarefas por worker podem ficar pendentes antes do walker esperar (limita memória)
+SCAN_PENDING_PER_WORKER = 8
+# Bytes iniciais lidos no estágio de prefixo da deduplicação por tamanho
+PREFIX_HASH_BYTES = 8192
+
+
+def make_file_record(filepath, stat_result, inode=None):
+    """Monta o registro de um arquivo (caminho + metadados) a partir de UM stat."""
+    return {
+        'filepath': filepath,
+        'size': stat_result.st_size,
+        'ctime': stat_result.st_ctime,
+        'mtime': stat_result.st_mtime,
+        'mtime_ns': stat_result.st_mtime_ns,
+        'inode': inode if inode is not None else stat_result.st_ino,
+        'device': stat_result.st_dev,
+    }
+
+
+def scan_files(directory, pastas_ignoradas, extensions=(".py",), counters=None, skip_files_in=None, on_directory=None,
+               metrics=None):
+    """Percorre o diretório com os.scandir e gera um registro por arquivo encontrado.
+
+    Cada registro traz filepath, size, ctime, mtime, mtime_ns, inode e device vindos
+    de um único DirEntry.stat(); arquivos com outras extensões nem chegam a ser
+    "statados". pastas_ignoradas pode ser um IgnoreMatcher (globs, .gitignore e
+    contagem por regra) ou um conjunto de nomes, compilado num IgnoreMatcher; as
+    pastas excluídas (e as iniciadas por '.') são podadas antes de serem listadas.
+    Se counters for um dict, 'scanned', 'matched', 'errors' e 'ignored' são
+    atualizados. Para checkpoint/retomada: arquivos de pastas em skip_files_in não
+    são entregues (as subpastas continuam sendo percorridas) e, depois de listar
+    cada pasta, on_directory(pasta, arquivos entregues) é chamado - a pasta é a
+    mesma de os.path.dirname(record['filepath']).
+    Com um ScanMetrics, o tempo de listagem de cada pasta vai para o estágio
+    'walk' e o de cada DirEntry.stat() para 'stat' (ambos somados à pasta).
+    """
+    if counters is None:
+        counters = {}
+    for key in ('scanned', 'matched', 'errors', 'ignored'):
+        counters.setdefault(key, 0)
+    matcher = pastas_ignoradas if isinstance(pastas_ignoradas, IgnoreMatcher) else IgnoreMatcher(pastas_ignoradas)
+
+    pending_dirs = [(directory, matcher)]
+    while pending_dirs:
+        pasta_atual, parent_matcher = pending_dirs.pop()
+        started = time.perf_counter()
+        try:
+            with os.scandir(pasta_atual) as iterator:
+                entries = list(iterator)
+        except OSError:
+            # Mesma política do os.walk: pastas ilegíveis são puladas
+            counters['errors'] += 1
+            continue
+        pasta_matcher = parent_matcher.for_directory(pasta_atual, [entry.name for entry in entries]) \
+            if parent_matcher.use_gitignore else parent_matcher
+        dir_key = os.path.dirname(os.path.join(pasta_atual, ''))
+        if metrics is not None:
+            metrics.add('walk', time.perf_counter() - started, directory=dir_key)
+        skip_files = skip_files_in is not None and dir_key in skip_files_in
+        delivered = 0
+        subpastas = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if pasta_matcher.match(entry.name, entry.path, True) is None:
+                        subpastas.append((entry.path, pasta_matcher))
+                    else:
+                        counters['ignored'] += 1
+                    continue
+                if skip_files or not entry.is_file():
+                    continue
+                counters['scanned'] += 1
+                if not entry.name.endswith(extensions):
+                    continue
+                if pasta_matcher.match(entry.name, entry.path, False) is not None:
+                    counters['ignored'] += 1
+                    continue
+                if metrics is None:
+                    record = make_file_record(entry.path, entry.stat(), entry.inode())
+                else:
+                    started = time.perf_counter()
+                    record = make_file_record(entry.path, entry.stat(), entry.inode())
+                    metrics.add('stat', time.perf_counter() - started, directory=dir_key)
+            except OSError:
+                counters['errors'] += 1
+                continue
+            counters['matched'] += 1
+            delivered += 1
+            yield record
+        if on_directory is not None and not skip_files:
+            on_directory(dir_key, delivered)
+        # Invertido para manter a ordem de visita em profundidade do os.walk
+        pending_dirs.extend(reversed(subpastas))
+
+
+def inode_key(record):
+    """Identidade do conteúdo pelo stat: (device, inode, tamanho, mtime_ns); None sem inode.
+
+    Caminhos diferentes com a mesma chave (hard links, bind mounts) são o mesmo
+    arquivo. No Windows o DirEntry.stat() traz st_dev 0; a letra da unidade do
+    caminho entra no lugar para não misturar inodes de volumes diferentes.
+    """
+    if not record.get('inode'):
+        return None
+    device = record.get('device') or os.path.splitdrive(record['filepath'])[0]
+    return device, record['inode'], record['size'], record['mtime_ns']
+
+
+def hash_and_count_file(filepath, hash_func, count_func=None, fused=False):
+    """Hash e (opcionalmente) linhas de um arquivo: (hash, linhas ou None). É a tarefa dos workers."""
+    if fused:
+        return hash_func(filepath)
+    file_hash = hash_func(filepath)
+    lines = count_func(filepath) if (count_func and file_hash) else None
+    return file_hash, lines
+
+
+def _timed_hash_and_count(filepath, hash_func, count_func, fused=False):
+    """Como hash_and_count_file, mas mede no próprio worker: (hash, linhas, (s no hash, s na contagem ou None))."""
+    started = time.perf_counter()
+    if fused:
+        file_hash, lines = hash_func(filepath)
+        return file_hash, lines, (time.perf_counter() - started, None)
+    file_hash = hash_func(filepath)
+    hashed = time.perf_counter()
+    if not (count_func and file_hash):
+        return file_hash, None, (hashed - started, None)
+    lines = count_func(filepath)
+    return file_hash, lines, (hashed - started, time.perf_counter() - hashed)
+
+
+def iter_hashed_files(records, hash_func, count_func=None, workers=SCAN_WORKERS_DEFAULT,
+                      use_processes=False, cache=None, fused=False, metrics=None, counters=None, on_read=None):
+    """Gera (registro, hash, linhas) para cada registro do walker, calculando em um pool.
+
+    Com workers <= 1 o cálculo é sequencial. O cache (ScanCache) é consultado e
+    atualizado apenas na thread chamadora, usando os metadados do próprio registro
+    (nenhum stat extra); só arquivos novos/alterados são lidos. Com
+    use_processes=True, hash_func/count_func precisam ser funções de módulo
+    (picklable). Com fused=True, hash_func já devolve (hash, linhas) numa única
+    leitura (ex.: file_hashing.hash_and_count_lines) e count_func é ignorado.
+    A ordem de saída é a de conclusão, não a do walker.
+    Com um ScanMetrics, o tempo medido dentro do worker vai para 'hash',
+    'line_count' ou 'hash+line_count' (fused), as consultas ao cache para 'cache'
+    e cada arquivo entregue atualiza a linha de progresso.
+    Resultados são memorizados por inode_key: um caminho que aponta para um
+    inode já lido (ou em leitura no pool) reaproveita hash e linhas sem abrir o
+    arquivo; counters['inode_reused'] conta essas leituras evitadas.
+    on_read(registro), se informado, é chamado só para os arquivos realmente
+    lidos com sucesso (nunca para acertos do cache nem reaproveitamentos de inode).
+    """
+    if counters is None:
+        counters = {}
+    counters.setdefault('inode_reused', 0)
+    need_lines = fused or count_func is not None
+    inode_results = {} # inode_key -> (hash, linhas) já calculados
+    inode_waiting = {} # inode_key em leitura no pool -> registros esperando o resultado
+    task = hash_and_count_file if metrics is None else _timed_hash_and_count
+    hash_stage = 'hash+line_count' if fused else 'hash'
+
+    def from_cache(record):
+        if cache is None:
+            return None
+        if metrics is None:
+            return cache.lookup(record, need_lines=need_lines)
+        started = time.perf_counter()
+        cached = cache.lookup(record, need_lines=need_lines)
+        if cached is not None:
+            metrics.add('cache', time.perf_counter() - started)
+            metrics.file_done()
+        return cached
+
+    def measure(record, result):
+        """Separa (hash, linhas) do resultado da tarefa e registra os tempos medidos no worker."""
+        if metrics is None:
+            return result
+        file_hash, lines, (hash_seconds, count_seconds) = result
+        directory = os.path.dirname(record['filepath'])
+        metrics.add(hash_stage, hash_seconds, record['size'], directory)
+        if count_seconds is not None:
+            metrics.add('line_count', count_seconds, record['size'], directory)
+        metrics.file_done(record['size'])
+        return file_hash, lines
+
+    def store(record, file_hash, lines):
+        if cache is not None and file_hash:
+            cache.store(record, file_hash, lines)
+
+    def reuse(record, file_hash, lines):
+        """Entrega um caminho repetido com o resultado do mesmo inode (sem leitura)."""
+        counters['inode_reused'] += 1
+        if metrics is not None:
+            metrics.add('inode_reuse', 0.0)
+            metrics.file_done()
+        store(record, file_hash, lines)
+        return record, file_hash, lines
+
+    def known(record):
+        """Resultado do cache ou do memo de inodes; None quando o arquivo precisa ser lido."""
+        cached = from_cache(record)
+        key = inode_key(record)
+        if cached is not None:
+            if key is not None:
+                inode_results.setdefault(key, (cached['hash'], cached['lines']))
+            return record, cached['hash'], cached['lines']
+        if key in inode_results:
+            return reuse(record, *inode_results[key])
+        return None
+
+    def remember(record, file_hash, lines):
+        key = inode_key(record)
+        if key is not None and file_hash:
+            inode_results[key] = (file_hash, lines)
+
+    if workers <= 1:
+        for record in records:
+            result = known(record)
+            if result is not None:
+                yield result
+                continue
+            file_hash, lines = measure(record, task(record['filepath'], hash_func, count_func, fused))
+            if on_read is not None and file_hash:
+                on_read(record)
+            store(record, file_hash, lines)
+            remember(record, file_hash, lines)
+            yield record, file_hash, lines
+        return
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    max_pending = workers * SCAN_PENDING_PER_WORKER
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            record = pending.pop(future)
+            try:
+                file_hash, lines = measure(record, future.result())
+            except Exception as e:
+                print(f"Erro ao processar {record['filepath']} no worker: {e}")
+                file_hash, lines = None, None
+            if on_read is not None and file_hash:
+                on_read(record)
+            store(record, file_hash, lines)
+            remember(record, file_hash, lines)
+            yield record, file_hash, lines
+            for waiting in inode_waiting.pop(inode_key(record), ()):
+                if file_hash:
+                    yield reuse(waiting, file_hash, lines)
+                else:
+                    # A leitura falhou: cada caminho que esperava por ela é lido por conta própria
+                    pending[executor.submit(task, waiting['filepath'], hash_func, count_func, fused)] = waiting
+
+    with executor_class(max_workers=workers) as executor:
+        for record in records:
+            result = known(record)
+            if result is not None:
+                yield result
+                continue
+            key = inode_key(record)
+            if key is not None:
+                if key in inode_waiting:
+                    inode_waiting[key].append(record)
+                    continue
+                inode_waiting[key] = []
+
+            pending[executor.submit(task, record['filepath'], hash_func, count_func, fused)] = record
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+
+def hash_file_prefix(filepath, prefix_bytes=PREFIX_HASH_BYTES):
+    """Digest (só para agrupamento) dos primeiros prefix_bytes de um arquivo."""
+    try:
+        with open(filepath, 'rb') as file:
+            return hashlib.sha1(file.read(prefix_bytes)).hexdigest()
+    except OSError as e:
+        print(f"Erro ao ler prefixo de {filepath}: {e}")
+        return None
+
+
+# Prefixos das chaves sintéticas de staged_dedup (identificam arquivos só dentro da mesma chamada)
+STAGED_KEY_PREFIXES = ("tamanho:", "prefixo:")
+
+
+def is_staged_key(identity):
+    """True para uma chave sintética de staged_dedup, que não pode ser comparada com outra varredura."""
+    return isinstance(identity, str) and identity.startswith(STAGED_KEY_PREFIXES)
+
+
+def staged_dedup(records, hash_func, prefix_bytes=PREFIX_HASH_BYTES, workers=SCAN_WORKERS_DEFAULT,
+                 use_processes=False, cache=None, counters=None):
+    """Identifica arquivos de conteúdo igual lendo o mínimo possível. Gera (registro, identidade).
+
+    Estágios: (1) agrupa por tamanho - tamanho único não pode ser duplicata;
+    (2) nos tamanhos repetidos lê só os primeiros prefix_bytes; (3) hash completo
+    (hash_func) apenas quando os prefixos também coincidem. A identidade é o hash
+    completo quando calculado, ou uma chave sintética ("tamanho:..."/"prefixo:...")
+    que é única dentro do conjunto. Por isso todas as raízes que serão comparadas
+    entre si precisam passar pela MESMA chamada. O particionamento resultante é o
+    mesmo da deduplicação por SHA-256 de todos os arquivos.
+    """
+    if counters is None:
+        counters = {}
+    for key in ('files', 'size_unique', 'prefix_unique', 'full_hashed', 'full_known', 'errors', 'bytes_total', 'bytes_read'):
+        counters.setdefault(key, 0)
+
+    # Só leituras de verdade contam bytes: acertos do cache e inodes reaproveitados não abrem o arquivo
+    def prefix_read(record):
+        counters['bytes_read'] += min(record['size'], prefix_bytes)
+
+    read_paths = set()
+
+    def full_read(record):
+        read_paths.add(record['filepath'])
+        counters['full_hashed'] += 1
+        counters['bytes_read'] += record['size']
+
+    by_size = defaultdict(list)
+    for record in records:
+        by_size[record['size']].append(record)
+        counters['files'] += 1
+        counters['bytes_total'] += record['size']
+
+    # 1. Tamanho único: nenhum byte lido
+    size_collisions = []
+    for size, group in by_size.items():
+        if len(group) == 1:
+            counters['size_unique'] += 1
+            yield group[0], f"tamanho:{size}"
+        else:
+            size_collisions.extend(group)
+    by_size = None
+
+    # 2. Prefixo (os primeiros KB) apenas para tamanhos repetidos
+    by_prefix = defaultdict(list)
+    prefix_func = partial(hash_file_prefix, prefix_bytes=prefix_bytes)
+    for record, prefix_digest, _ in iter_hashed_files(size_collisions, prefix_func, None, workers, use_processes,
+                                                      counters=counters, on_read=prefix_read):
+        if prefix_digest is None:
+            counters['errors'] += 1
+            continue
+        by_prefix[(record['size'], prefix_digest)].append(record)
+
+    prefix_collisions = []
+    same_content_groups = {}
+    for (size, prefix_digest), group in by_prefix.items():
+        if len(group) == 1:
+            counters['prefix_unique'] += 1
+            yield group[0], f"prefixo:{size}:{prefix_digest}"
+        elif size <= prefix_bytes:
+            # O prefixo já cobriu o arquivo inteiro: conteúdo idêntico, basta um hash por grupo
+            same_content_groups[group[0]['filepath']] = group
+            prefix_collisions.append(group[0])
+        else:
+            prefix_collisions.extend(group)
+    by_prefix = None
+
+    # 3. Hash completo só quando tamanho E prefixo coincidem (acertos do cache não leem nada)
+    for record, file_hash, _ in iter_hashed_files(prefix_collisions, hash_func, None, workers, use_processes, cache,
+                                                  counters=counters, on_read=full_read):
+        group = same_content_groups.pop(record['filepath'], [record])
+        if not file_hash:
+            counters['errors'] += len(group)
+            continue
+        if record['filepath'] not in read_paths:
+            counters['full_known'] += 1 # Hash completo do cache ou de outro caminho do mesmo inode
+        for member in group:
+            yield member, file_hash
+
+
+def print_staged_dedup_stats(counters):
+    """Resumo da deduplicação em estágios (quantos arquivos pararam em cada estágio)."""
+    bytes_total = counters.get('bytes_total', 0)
+    bytes_read = counters.get('bytes_read', 0)
+    ratio = bytes_read / bytes_total if bytes_total else 0.0
+    print(f"Dedup por tamanho: {counters.get('files', 0)} arquivos | "
+          f"tamanho único: {counters.get('size_unique', 0)} | prefixo único: {counters.get('prefix_unique', 0)} | "
+          f"hash completo: {counters.get('full_hashed', 0)} lidos + {counters.get('full_known', 0)} do cache/inode")
+    print(f"  -> Bytes lidos: {bytes_read:,} de {bytes_total:,} ({ratio:.1%})".replace(",", "."))
+
+
+def print_inode_reuse_stats(counters):
+    """Leituras evitadas pelo memo de inodes de iter_hashed_files (hard links, bind mounts)."""
+    print(f"  -> Leituras evitadas (mesmo inode por outro caminho): {counters.get('inode_reused', 0)}")
+
+
+def _scan_root_in_process(scan_func, root, cache_path=None, cache_algorithm=None, workers=None):
+    """Executado no processo filho: varre uma raiz com um ScanCache próprio.
+
+    O filho não grava o cache; devolve as entradas novas e as estatísticas para o
+    processo principal, que é o único a escrever no arquivo.
+    """
+    cache = ScanCache(cache_path, cache_algorithm) if cache_path else None
+    result = scan_func(root, cache) if workers is None else scan_func(root, cache, workers)
+    if cache is None:
+        return result, None
+    return result, (cache.take_dirty(), cache.hits, cache.misses)
+
+
+def scan_roots_concurrently(roots, scan_func, cache=None, max_processes=SCAN_WORKERS_DEFAULT, workers=None):
+    """Varre várias raízes ao mesmo tempo, cada uma em um processo. Retorna os resultados na ordem de roots.
+
+    scan_func(raiz, cache[, workers]) precisa ser uma função de módulo (picklable),
+    ex. o scan_directory_for_py_files do script. Com max_processes <= 1 (ou uma raiz
+    só) as raízes são varridas em sequência neste processo. A ordem do retorno é a
+    de roots (não a de conclusão) para que a junção dos resultados seja determinística.
+    workers é o orçamento TOTAL do pool de hash: cada processo recebe
+    max(1, workers // processos), para não abrir processos x workers threads
+    disputando o mesmo disco. Com workers=None vale o padrão do scan_func.
+    """
+    if max_processes <= 1 or len(roots) <= 1:
+        if workers is None:
+            return [scan_func(root, cache) for root in roots]
+        return [scan_func(root, cache, workers) for root in roots]
+
+    cache_path = cache.cache_path if cache is not None else None
+    cache_algorithm = cache.algorithm if cache is not None else None
+    results = [None] * len(roots)
+    processes = min(max_processes, len(roots))
+    workers_per_process = max(1, workers // processes) if workers is not None else None
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(_scan_root_in_process, scan_func, root, cache_path, cache_algorithm, workers_per_process): index
+            for index, root in enumerate(roots)
+        }
+        for future in as_completed(futures):
+            result, cache_state = future.result()
+            results[futures[future]] = result
+            if cache is not None and cache_state is not None:
+                cache.merge(*cache_state)
+    return results
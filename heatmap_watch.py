@@ -0,0 +1,166 @@
+import time
+from collections import defaultdict
+from datetime import datetime, date
+from heatmap_scanner import scan_files, iter_hashed_files, SCAN_WORKERS_DEFAULT
+from ignore_rules import IgnoreMatcher
+
+# Intervalo padrão entre duas varreduras (só stat) no modo de observação
+WATCH_INTERVAL_SECONDS_DEFAULT = 60
+
+
+def snapshot_roots(roots, pastas_ignoradas, extensions=(".py",)):
+    """Estado atual das raízes: {filepath: registro do walker}. Nenhum arquivo é lido."""
+    snapshot = {}
+    for root in roots:
+        for record in scan_files(root, pastas_ignoradas, extensions):
+            snapshot[record['filepath']] = record
+    return snapshot
+
+
+def diff_snapshots(previous, current):
+    """Compara dois snapshots pelos dados de stat. Retorna (novos, alterados, removidos)."""
+    added = []
+    modified = []
+    for filepath, record in current.items():
+        old = previous.get(filepath)
+        if old is None:
+            added.append(filepath)
+        elif (old['size'] != record['size'] or old['mtime_ns'] != record['mtime_ns']
+                or old['inode'] != record['inode']):
+            modified.append(filepath)
+    removed = [filepath for filepath in previous if filepath not in current]
+    return added, modified, removed
+
+
+class ActivityAggregate:
+    """Deduplicação por hash + contagens por (ano, mês, dia, hora), atualizadas incrementalmente.
+
+    Cada hash conta uma vez, na data do seu representante: o arquivo com o maior
+    winner_key ('mtime' ou 'ctime') entre os que têm aquele conteúdo - a mesma
+    regra dos scripts. Para cada chave de tempo em time_keys há uma grade de
+    contagens própria; toda célula que muda marca o seu ano como "sujo" para que
+    só esses blocos anuais sejam redesenhados.
+    """
+
+    def __init__(self, time_keys=('ctime',), winner_key='ctime'):
+        self.time_keys = tuple(time_keys)
+        self.winner_key = winner_key
+        self.members = defaultdict(dict) # hash -> {filepath: (registro, linhas)}
+        self.path_hash = {} # filepath -> hash
+        self.representative = {} # hash -> (registro, linhas) que está sendo contado
+        self.cell_counts = {key: defaultdict(int) for key in self.time_keys}
+        self.dirty_years = {key: set() for key in self.time_keys}
+        self.total_lines = 0
+
+    def _cell(self, record, time_key):
+        moment = datetime.fromtimestamp(record[time_key])
+        return (moment.year, moment.month, moment.day, moment.hour)
+
+    def _count(self, entry, delta):
+        record, lines = entry
+        for time_key in self.time_keys:
+            cell = self._cell(record, time_key)
+            counts = self.cell_counts[time_key]
+            counts[cell] += delta
+            if counts[cell] <= 0:
+                del counts[cell]
+            self.dirty_years[time_key].add(cell[0])
+        if isinstance(lines, (int, float)):
+            self.total_lines += delta * lines
+
+    def _refresh(self, file_hash):
+        """Recalcula o representante de um hash e ajusta só as células afetadas."""
+        old = self.representative.pop(file_hash, None)
+        members = self.members.get(file_hash)
+        new = max(members.values(), key=lambda entry: entry[0][self.winner_key]) if members else None
+        if old is not None and new is not None and old[0] is new[0] and old[1] == new[1]:
+            self.representative[file_hash] = old
+            return
+        if old is not None:
+            self._count(old, -1)
+        if new is not None:
+            self.representative[file_hash] = new
+            self._count(new, +1)
+
+    def add(self, record, file_hash, lines=None):
+        """Inclui (ou atualiza) um arquivo já com hash calculado."""
+        self.remove(record['filepath'])
+        self.members[file_hash][record['filepath']] = (record, lines)
+        self.path_hash[record['filepath']] = file_hash
+        self._refresh(file_hash)
+
+    def remove(self, filepath):
+        """Retira um arquivo (apagado ou prestes a ser recalculado)."""
+        file_hash = self.path_hash.pop(filepath, None)
+        if file_hash is None:
+            return
+        members = self.members[file_hash]
+        members.pop(filepath, None)
+        if not members:
+            del self.members[file_hash]
+        self._refresh(file_hash)
+
+    def unique_count(self):
+        return len(self.representative)
+
+    def hour_counts(self, time_key=None):
+        """{(ano, mês, dia, hora): arquivos únicos} da chave de tempo (padrão: a primeira)."""
+        return dict(self.cell_counts[time_key or self.time_keys[0]])
+
+    def day_counts_by_year(self, time_key=None):
+        """{ano: {date: arquivos únicos}} somando as horas de cada dia."""
+        by_year = defaultdict(lambda: defaultdict(int))
+        for (year, month, day, _), count in self.cell_counts[time_key or self.time_keys[0]].items():
+            by_year[year][date(year, month, day)] += count
+        return {year: dict(days) for year, days in by_year.items()}
+
+    def pop_dirty_years(self, time_key=None):
+        """Anos com alguma célula alterada desde a última chamada (e limpa a marcação)."""
+        time_key = time_key or self.time_keys[0]
+        dirty = self.dirty_years[time_key]
+        self.dirty_years[time_key] = set()
+        return dirty
+
+
+def watch_roots(roots, pastas_ignoradas, hash_func, aggregate, on_change, extensions=(".py",),
+                interval=WATCH_INTERVAL_SECONDS_DEFAULT, cache=None, workers=SCAN_WORKERS_DEFAULT,
+                fused=False, max_cycles=None, sleep=time.sleep):
+    """Observa as raízes por polling e mantém `aggregate` atualizado.
+
+    A cada ciclo as raízes são percorridas só com stat (scan_files); apenas
+    arquivos novos ou com tamanho/mtime/inode diferentes são lidos (com o cache,
+    se houver). on_change(aggregate, ciclo) é chamado no primeiro ciclo e sempre
+    que algo mudou; quem desenha consulta aggregate.pop_dirty_years() para saber
+    quais anos redesenhar. Roda até Ctrl+C ou até max_cycles ciclos. Um
+    IgnoreMatcher reaproveitado tem skip_counts zerado a cada ciclo (contagens
+    do último ciclo, não a soma de todos).
+    """
+    previous = {}
+    cycle = 0
+    try:
+        while True:
+            if isinstance(pastas_ignoradas, IgnoreMatcher):
+                pastas_ignoradas.reset_counts()
+            current = snapshot_roots(roots, pastas_ignoradas, extensions)
+            added, modified, removed = diff_snapshots(previous, current)
+            for filepath in removed + modified:
+                aggregate.remove(filepath)
+            changed_records = [current[filepath] for filepath in added + modified]
+            for record, file_hash, lines in iter_hashed_files(changed_records, hash_func, None, workers, False, cache, fused):
+                if file_hash:
+                    aggregate.add(record, file_hash, lines)
+            previous = current
+
+            if cycle == 0 or added or modified or removed:
+                print(f"[{datetime.now():%H:%M:%S}] Observação: {len(added)} novos, {len(modified)} alterados, "
+                      f"{len(removed)} removidos ({aggregate.unique_count()} únicos).")
+                on_change(aggregate, cycle)
+                if cache is not None:
+                    cache.save()
+            cycle += 1
+            if max_cycles is not None and cycle >= max_cycles:
+                break
+            sleep(interval)
+    except KeyboardInterrupt:
+        print("\nObservação encerrada.")
+    return aggregate
@@ -0,0 +1,180 @@
+import os
+import re
+import fnmatch
+
+# Rótulo da regra embutida que poda pastas ocultas (nome iniciado por '.')
+HIDDEN_RULE = ".* (pastas ocultas)"
+GITIGNORE_FILENAME = ".gitignore"
+
+
+def _is_glob(pattern):
+    return any(char in pattern for char in "*?[")
+
+
+def _gitignore_regex(pattern):
+    """Traduz um padrão do .gitignore para regex ('*' e '?' não atravessam '/', '**' atravessa)."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                parts.append("[" + pattern[i + 1:end].replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+class _GitignoreRules:
+    """Regras de UM arquivo .gitignore, válidas para a pasta dele e subpastas."""
+
+    def __init__(self, base_dir, lines, source):
+        self.base_prefix_len = len(base_dir.rstrip("/\\")) + 1
+        self.rules = [] # (regex, só_pastas, negação, ancorada, rótulo)
+        for raw_line in lines:
+            line = raw_line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            pattern = line[1:] if negate else line
+            if pattern.startswith("\\"):
+                pattern = pattern[1:] # '\#' e '\!' escapam o primeiro caractere
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            anchored = "/" in pattern
+            pattern = pattern.lstrip("/")
+            if not pattern:
+                continue
+            self.rules.append((_gitignore_regex(pattern), dir_only, negate, anchored, f"{source}: {line}"))
+
+    def decide(self, name, path, is_dir, decision):
+        """Aplica as regras em ordem (a última que casar vence). decision = (ignorar, rótulo) ou None."""
+        relpath = None
+        for regex, dir_only, negate, anchored, label in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if anchored:
+                if relpath is None:
+                    relpath = path[self.base_prefix_len:].replace("\\", "/")
+                matched = regex.match(relpath)
+            else:
+                matched = regex.match(name)
+            if matched:
+                decision = (not negate, label)
+        return decision
+
+
+class IgnoreMatcher:
+    """Regras de exclusão compiladas uma única vez para o walker.
+
+    - nomes literais (comparação em minúsculas, como o antigo `in pastas_ignoradas`);
+    - globs ('*.egg-info', '._*', ...) combinados em UMA regex sem diferenciar
+      maiúsculas;
+    - pastas ocultas (iniciadas por '.'), se skip_hidden;
+    - opcionalmente os .gitignore encontrados durante a varredura (valem para a
+      pasta onde estão e as de baixo; '!' reinclui; padrão com '/' é ancorado).
+    Nomes em `keep` nunca são excluídos pelas regras literais/glob. Pastas
+    excluídas são podadas antes de serem listadas. skip_counts guarda, por
+    regra, quantas pastas e arquivos ela excluiu.
+    """
+
+    def __init__(self, patterns=(), keep=(), skip_hidden=True, use_gitignore=False):
+        self.keep = {name.lower() for name in keep}
+        self.literals = {}
+        globs = []
+        for pattern in patterns:
+            if _is_glob(pattern):
+                globs.append(pattern)
+            else:
+                self.literals.setdefault(pattern.lower(), pattern)
+        self.glob_labels = globs
+        self.glob_regex = None
+        if globs:
+            combined = "|".join(f"(?P<g{index}>{fnmatch.translate(pattern)})" for index, pattern in enumerate(globs))
+            self.glob_regex = re.compile(combined, re.IGNORECASE)
+        self.skip_hidden = skip_hidden
+        self.use_gitignore = use_gitignore
+        self.gitignore_chain = ()
+        self.skip_counts = {}
+
+    def _count(self, label, is_dir):
+        counts = self.skip_counts.get(label)
+        if counts is None:
+            counts = self.skip_counts[label] = {'dirs': 0, 'files': 0}
+        counts['dirs' if is_dir else 'files'] += 1
+
+    def match(self, name, path, is_dir):
+        """Retorna o rótulo da regra que exclui a entrada (e a contabiliza) ou None."""
+        label = None
+        lowered = name.lower()
+        if lowered not in self.keep:
+            if lowered in self.literals:
+                label = self.literals[lowered]
+            elif self.glob_regex is not None:
+                matched = self.glob_regex.match(name)
+                if matched:
+                    label = self.glob_labels[int(matched.lastgroup[1:])]
+        if label is None and is_dir and self.skip_hidden and name.startswith('.'):
+            label = HIDDEN_RULE
+        if label is None and self.gitignore_chain:
+            decision = None
+            for rules in self.gitignore_chain:
+                decision = rules.decide(name, path, is_dir, decision)
+            if decision is not None and decision[0]:
+                label = decision[1]
+        if label is not None:
+            self._count(label, is_dir)
+        return label
+
+    def for_directory(self, dirpath, entry_names):
+        """Matcher para as entradas de dirpath: inclui o .gitignore dela, se houver.
+
+        entry_names são os nomes já listados da pasta (evita um stat extra). O
+        objeto devolvido compartilha skip_counts com este.
+        """
+        if not self.use_gitignore or GITIGNORE_FILENAME not in entry_names:
+            return self
+        gitignore_path = os.path.join(dirpath, GITIGNORE_FILENAME)
+        try:
+            with open(gitignore_path, encoding="utf-8", errors="replace") as file:
+                rules = _GitignoreRules(dirpath, file, gitignore_path)
+        except OSError as e:
+            print(f"Aviso: não foi possível ler {gitignore_path}: {e}")
+            return self
+        child = object.__new__(IgnoreMatcher)
+        child.__dict__.update(self.__dict__)
+        child.gitignore_chain = self.gitignore_chain + (rules,)
+        return child
+
+    def reset_counts(self):
+        """Zera skip_counts (no mesmo dict: os matchers de subpastas o compartilham)."""
+        self.skip_counts.clear()
+
+    def print_stats(self, limit=15):
+        """Resumo: quantas pastas/arquivos cada regra excluiu (as que mais excluíram primeiro)."""
+        if not self.skip_counts:
+            print("Regras de exclusão: nada foi excluído.")
+            return
+        total_dirs = sum(counts['dirs'] for counts in self.skip_counts.values())
+        total_files = sum(counts['files'] for counts in self.skip_counts.values())
+        print(f"Regras de exclusão: {total_dirs} pastas podadas, {total_files} arquivos ignorados.")
+        ranked = sorted(self.skip_counts.items(), key=lambda item: (item[1]['dirs'] + item[1]['files']), reverse=True)
+        for label, counts in ranked[:limit]:
+            print(f"  -> {label}: {counts['dirs']} pastas, {counts['files']} arquivos")
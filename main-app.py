@@ -1,8 +1,14 @@
 import os
 import hashlib
 from datetime import datetime, date, timedelta
-import pandas as pd
 from PIL import Image, ImageDraw, ImageFont
+from scan_cache import ScanCache
+from heatmap_scanner import scan_files, iter_hashed_files, staged_dedup, print_staged_dedup_stats, print_inode_reuse_stats
+from ignore_rules import IgnoreMatcher
+from file_hashing import hash_file
+from heatmap_watch import ActivityAggregate, watch_roots
+from scan_stream import UniqueHashSink, make_scan_record, consume
+from record_store import FileRecordStore, save_snapshot, load_snapshot
 
 # Configurações de Design 100% Compatíveis com a Imagem de Exemplo
 IMAGE_BACKGROUND_COLOR = (30, 30, 30)
@@ -37,18 +43,49 @@ FONT_SIZE_DAY = 12
 FONT_DAY_OF_WEEK_NAME = "arialbd" # Nome da fonte Arial Bold (sem extensão)
 FONT_NAME = "arial" # Nome da fonte Arial (sem extensão)
 
+# Cache persistente de varredura (pula re-hash de arquivos inalterados entre execuções)
+USE_SCAN_CACHE = True
+SCAN_CACHE_PATH = "heatmap_scan_cache.sqlite"
+
+# Hash em paralelo: número de workers (1 = sequencial) e pool de processos em vez de threads
+SCAN_WORKERS = os.cpu_count() or 4
+SCAN_USE_PROCESSES = False
+# Dedup em estágios: só lê arquivos cujo tamanho colide (e só faz hash completo se o prefixo também colidir)
+USE_STAGED_DEDUP = True
+# Algoritmo do hash de deduplicação (qualquer do hashlib; "nome:bytes" para blake2b/blake2s)
+HASH_ALGORITHM = "blake2b:16"
+
+# Modo de observação: continua rodando e atualiza o heatmap só quando arquivos mudam
+WATCH_MODE = False
+WATCH_INTERVAL_SECONDS = 60 # Intervalo entre varreduras (só stat) das pastas
+
+# Snapshot da varredura em colunas (NumPy .npz): redesenhar sem varrer de novo
+SNAPSHOT_PATH = "heatmap_scan_snapshot_unified.npz" # Separado dos scripts rc1/rc2: aqui vence o ctime mais recente
+SAVE_SNAPSHOT = True # Grava o snapshot depois de cada varredura
+LOAD_SNAPSHOT = False # True = desenha a partir do snapshot, sem seletor de pasta e sem ler o disco
+
+# Pastas/arquivos que não entram na varredura: nomes (comparação em minúsculas) ou globs como '*.egg-info'
+# e '._*'; pastas iniciadas por '.' também são puladas
+_pastas_ignoradas = set([
+    'venv', '.venv', 'env', '.env', 'lib', 'lib64', 'site-packages', 'dist-packages', 'eggs',
+    'pip-wheel-metadata', '__pycache__', 'build', 'dist', 'docs', 'doc', 'etc', 'static',
+    'templates', 'media', 'node_modules', '.git', '.svn', '.hg', '.CVS', '.idea', '.vscode',
+    'spyder-py3', '.pylint.d', '.mypy_cache', '.pytest_cache', '__pypackages__', 'wheelhouse',
+    'htmlcov', '.coverage', 'coverage.xml', '*.egg-info', 'MANIFEST', 'sphinx-build', '_build',
+    '_static', '_templates', 'data', 'resources', 'assets', 'out', 'output', 'target', 'log',
+    'logs', 'tmp', 'temp', 'cache', 'caches', '.gradle', '.mvn', '.docker', '.vagrant', '.terraform',
+    '.ansible', '.terraform.lock.hcl', '.DS_Store', '.Trashes', '$RECYCLE.BIN', 'System Volume Information',
+    '._*', '._.Trashes', '._.DS_Store', '.localized', '.AppleDouble',
+])
+_pastas_para_manter = {'test', 'tests', 'testing', 'integration-tests', 'unit-tests', 'functional-tests', 'benchmark', 'benchmarks', 'example', 'examples', 'sample', 'samples', 'notebooks'}
+PASTAS_IGNORADAS = _pastas_ignoradas.difference(_pastas_para_manter)
+USE_GITIGNORE = False # True = também respeita os .gitignore encontrados nas pastas varridas
+
 
 def calculate_file_hash(filepath):
-    """Calcula o hash SHA256 de um arquivo."""
-    hasher = hashlib.sha256()
+    """Calcula o hash (HASH_ALGORITHM) de um arquivo (blocos grandes ou mmap, conforme o tamanho)."""
     try:
-        with open(filepath, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(filepath, algorithm=HASH_ALGORITHM)
     except Exception as e:
         print(f"Erro ao calcular hash de {filepath}: {e}")
         return None
@@ -62,47 +99,34 @@ def get_original_creation_time(filepath):
         print(f"Erro ao obter data de criação de {filepath}: {e}")
         return None
 
-def scan_directory_for_py_files(directory):
-    """Varre o diretório em busca de arquivos .py, calcula hash e data de criação."""
-    file_data = []
-    unique_files = {}
-
-    pastas_ignoradas = set([
-        'venv', '.venv', 'env', '.env', 'lib', 'lib64', 'site-packages', 'dist-packages', 'eggs',
-        'pip-wheel-metadata', '__pycache__', 'build', 'dist', 'docs', 'doc', 'etc', 'static',
-        'templates', 'media', 'node_modules', '.git', '.svn', '.hg', '.CVS', '.idea', '.vscode',
-        'spyder-py3', '.pylint.d', '.mypy_cache', '.pytest_cache', '__pypackages__', 'wheelhouse',
-        'htmlcov', '.coverage', 'coverage.xml', '*.egg-info', 'MANIFEST', 'sphinx-build', '_build',
-        '_static', '_templates', 'data', 'resources', 'assets', 'out', 'output', 'target', 'log',
-        'logs', 'tmp', 'temp', 'cache', 'caches', '.gradle', '.mvn', '.docker', '.vagrant', '.terraform',
-        '.ansible', '.terraform.lock.hcl', '.DS_Store', '.Trashes', '$RECYCLE.BIN', 'System Volume Information',
-        '._*', '._.Trashes', '._.DS_Store', '.localized', '.AppleDouble',
-    ])
-    pastas_para_manter = {'test', 'tests', 'testing', 'integration-tests', 'unit-tests', 'functional-tests', 'benchmark', 'benchmarks', 'example', 'examples', 'sample', 'samples', 'notebooks'}
-    pastas_ignoradas = pastas_ignoradas.difference(pastas_para_manter)
-
-    for pasta_raiz, subpastas, arquivos in os.walk(directory):
-        subpastas[:] = [
-            subpasta for subpasta in subpastas
-            if subpasta.lower() not in pastas_ignoradas and not subpasta.startswith('.')
-        ]
-        for arquivo in arquivos:
-            if arquivo.endswith(".py"):
-                caminho_arquivo = os.path.join(pasta_raiz, arquivo)
-                file_hash = calculate_file_hash(caminho_arquivo)
-                creation_time = get_original_creation_time(caminho_arquivo)
-
-                if file_hash and creation_time:
-                    if file_hash not in unique_files or creation_time > unique_files[file_hash]['creation_time']:
-                        unique_files[file_hash] = {'creation_time': creation_time, 'filepath': caminho_arquivo}
-
-    for file_hash_val, file_info in unique_files.items():
-        file_data.append({
-            'filepath': file_info['filepath'],
-            'creation_time': file_info['creation_time'],
-            'hash': file_hash_val
-        })
-    return pd.DataFrame(file_data)
+def scan_directory_to_sink(directory, cache=None, workers=SCAN_WORKERS, use_processes=SCAN_USE_PROCESSES, staged=USE_STAGED_DEDUP):
+    """Varre o diretório em busca de arquivos .py e agrega em streaming num UniqueHashSink.
+
+    Cada arquivo identificado vai direto para o sink (fica o de ctime mais
+    recente por hash, contado por dia/hora na hora): a memória depende do
+    número de hashes únicos, não do número de arquivos.
+    Se um ScanCache for informado, arquivos inalterados reaproveitam o hash gravado.
+    Os hashes são calculados em um pool com `workers` threads (ou processos).
+    Com staged=True, arquivos de tamanho único não são lidos e o hash do
+    registro é uma chave sintética em vez do hash completo (mesmo conjunto de únicos).
+    """
+    sink = UniqueHashSink(winner_key='ctime', time_keys=('ctime',))
+
+    ignore_matcher = IgnoreMatcher(PASTAS_IGNORADAS, use_gitignore=USE_GITIGNORE)
+    py_files = scan_files(directory, ignore_matcher, (".py",))
+    dedup_counters = {}
+    if staged:
+        identified_files = staged_dedup(py_files, calculate_file_hash, workers=workers, use_processes=use_processes, cache=cache, counters=dedup_counters)
+    else:
+        identified_files = ((record, file_hash) for record, file_hash, _ in iter_hashed_files(py_files, calculate_file_hash, None, workers, use_processes, cache, counters=dedup_counters))
+    # Datas vêm do mesmo stat do walker
+    consume((make_scan_record(record, file_hash) for record, file_hash in identified_files if file_hash), sink)
+
+    ignore_matcher.print_stats()
+    if staged:
+        print_staged_dedup_stats(dedup_counters)
+    print_inode_reuse_stats(dedup_counters)
+    return sink
 
 def draw_rounded_rectangle(draw_context, position, size, radius, fill_color):
     """Desenha um retângulo com cantos arredondados."""
@@ -122,13 +146,8 @@ def draw_rounded_rectangle(draw_context, position, size, radius, fill_color):
     draw_context.polygon(rectangle_coords, fill=fill_color)
 
 
-def generate_unified_heatmap(df_all_years, output_folder, folder_name_for_file, folder_hash):
-    """Gera um heatmap unificado vertical para todos os anos em um único PNG."""
-
-    if df_all_years.empty:
-        print("Nenhum arquivo .py encontrado para gerar o heatmap unificado.")
-        return
-
+def load_unified_heatmap_fonts():
+    """Carrega as fontes do heatmap unificado (Arial do Windows ou a fonte padrão do PIL)."""
     try:
         windows_font_dir = r"C:\Windows\Fonts" # Caminho padrão das fontes do Windows
         font_month = ImageFont.truetype(os.path.join(windows_font_dir, FONT_NAME + ".ttf"), FONT_SIZE_MONTH)
@@ -141,85 +160,144 @@ def generate_unified_heatmap(df_all_years, output_folder, folder_name_for_file,
         font_day = ImageFont.load_default()
         font_day_of_week = ImageFont.load_default()
         print("Fontes Arial não encontradas no sistema. Usando fonte padrão.")
+    return font_month, font_year, font_day, font_day_of_week
 
-    years = sorted(df_all_years['creation_time'].dt.year.unique(), reverse=True)
+def render_unified_year_block(year, file_counts, fonts):
+    """Desenha o bloco de UM ano numa imagem própria (tile) e a retorna.
+
+    O tile inclui os YEAR_BLOCK_PADDING pixels acima do bloco (onde ficam os nomes
+    dos meses), então é colado em (0, deslocamento_do_ano - YEAR_BLOCK_PADDING).
+    file_counts é {date: arquivos únicos}.
+    """
+    font_month, font_year, font_day, font_day_of_week = fonts
+    year_block_height = YEAR_LABEL_MARGIN_TOP + YEAR_LABEL_MARGIN_BOTTOM + (7 * (SQUARE_SIZE + SQUARE_PADDING)) + MONTH_LABEL_MARGIN
+    image_width_year = MARGIN_LEFT + MARGIN_RIGHT + YEAR_LABEL_WIDTH + (53 * (SQUARE_SIZE + SQUARE_PADDING))
+    image = Image.new('RGB', (image_width_year, YEAR_BLOCK_PADDING + year_block_height), IMAGE_BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+
+    current_y_offset = YEAR_BLOCK_PADDING
+    start_x, start_y_block = MARGIN_LEFT + YEAR_LABEL_WIDTH, current_y_offset + YEAR_LABEL_MARGIN_TOP
+    current_x, current_y = start_x, start_y_block
+    month_positions = {}
+
+    year_text = str(year)
+    year_text_bbox = draw.textbbox((0, 0), year_text, font=font_year)
+    year_text_pos = (MARGIN_LEFT - YEAR_LABEL_WIDTH + (YEAR_LABEL_WIDTH - year_text_bbox[2]) // 2, current_y_offset + YEAR_LABEL_MARGIN_TOP + (year_block_height - YEAR_LABEL_MARGIN_TOP - YEAR_LABEL_MARGIN_BOTTOM) / 2 - year_text_bbox[3] / 2)
+    draw.text(year_text_pos, year_text, font=font_year, fill=FONT_COLOR)
+
+    day_labels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    for i, day_label in enumerate(day_labels):
+        day_text_bbox = draw.textbbox((0, 0), day_label, font=font_day_of_week)
+        day_text_pos = (start_x - DAY_LABEL_MARGIN_LEFT - day_text_bbox[2], current_y + i * (SQUARE_SIZE + SQUARE_PADDING) + SQUARE_SIZE / 2 - day_text_bbox[3] / 2)
+        draw.text(day_text_pos, day_label, font=font_day_of_week, fill=FONT_COLOR)
+
+    current_date = date(year, 1, 1)
+    week_number = 0
+    while current_date.year == year:
+        day_of_week = current_date.weekday()
+
+        if current_date.day == 1:
+            month_positions[current_date.month] = current_x
+            month_name = current_date.strftime('%b')
+            month_text_bbox = draw.textbbox((0, 0), month_name, font=font_month)
+            month_text_pos = (current_x + (SQUARE_SIZE * 7 + SQUARE_PADDING * 6) / 2 - month_text_bbox[2] / 2 , start_y_block - MONTH_LABEL_MARGIN - month_text_bbox[3] )
+            draw.text(month_text_pos, month_name, font=font_month, fill=FONT_COLOR)
+
+        if day_of_week == 0:
+            line_y = current_y - SQUARE_PADDING / 2
+            draw.line([(start_x - DAY_LABEL_MARGIN_LEFT, line_y), (image_width_year - MARGIN_RIGHT, line_y)], fill=GRID_LINE_COLOR, width=GRID_LINE_WIDTH)
+        if current_date.weekday() == 6:
+             line_y = current_y + (SQUARE_SIZE + SQUARE_PADDING) * 7 - SQUARE_PADDING / 2
+             draw.line([(start_x - DAY_LABEL_MARGIN_LEFT, line_y), (image_width_year - MARGIN_RIGHT, line_y)], fill=GRID_LINE_COLOR, width=GRID_LINE_WIDTH)
+
+        count = file_counts.get(current_date, 0)
+        color_index = min(count, len(HEATMAP_COLORS) - 1) if count > 0 else 0
+        fill_color = HEATMAP_COLORS[color_index]
+
+        draw_rounded_rectangle(draw, (current_x, current_y + day_of_week * (SQUARE_SIZE + SQUARE_PADDING)), (SQUARE_SIZE, SQUARE_SIZE), SQUARE_CORNER_RADIUS, fill_color)
+
+        current_date += timedelta(days=1)
+        if current_date.weekday() == 0:
+            current_x += SQUARE_SIZE + SQUARE_PADDING
+            week_number += 1
+    draw.line([(start_x - DAY_LABEL_MARGIN_LEFT, current_y + (SQUARE_SIZE + SQUARE_PADDING) * 7 - SQUARE_PADDING / 2), (image_width_year - MARGIN_RIGHT, current_y + (SQUARE_SIZE + SQUARE_PADDING) * 7 - SQUARE_PADDING / 2)], fill=GRID_LINE_COLOR, width=GRID_LINE_WIDTH)
+    return image
+
+def render_unified_heatmap_from_counts(counts_by_year, output_folder, folder_name_for_file, folder_hash, year_tiles=None, dirty_years=None, fonts=None):
+    """Monta o PNG unificado a partir de {ano: {date: contagem}}.
+
+    year_tiles (dict ano -> tile) guarda os blocos já desenhados entre chamadas:
+    só anos ausentes dele ou presentes em dirty_years são redesenhados (modo de
+    observação). Sem year_tiles, todos os anos são desenhados.
+    """
+    if year_tiles is None:
+        year_tiles = {}
+    dirty_years = set(dirty_years or ())
+    if fonts is None:
+        fonts = load_unified_heatmap_fonts()
+
+    years = sorted((year for year, counts in counts_by_year.items() if counts), reverse=True)
+    for year in list(year_tiles):
+        if year not in years:
+            del year_tiles[year] # Ano que ficou sem arquivos
+    for year in years:
+        if year not in year_tiles or year in dirty_years:
+            year_tiles[year] = render_unified_year_block(year, counts_by_year[year], fonts)
     num_years = len(years)
 
     year_block_height = YEAR_LABEL_MARGIN_TOP + YEAR_LABEL_MARGIN_BOTTOM + (7 * (SQUARE_SIZE + SQUARE_PADDING)) + MONTH_LABEL_MARGIN
     image_height_total = MARGIN_TOP + MARGIN_BOTTOM + (num_years * year_block_height) + ((num_years - 1) * YEAR_BLOCK_PADDING) if num_years > 1 else MARGIN_TOP + MARGIN_BOTTOM + year_block_height
     image_width_year = MARGIN_LEFT + MARGIN_RIGHT + YEAR_LABEL_WIDTH + (53 * (SQUARE_SIZE + SQUARE_PADDING))
     image = Image.new('RGB', (image_width_year, image_height_total), IMAGE_BACKGROUND_COLOR)
-    draw = ImageDraw.Draw(image)
 
     current_y_offset = MARGIN_TOP
-
     for year in years:
-        df_year = df_all_years[df_all_years['creation_time'].dt.year == year].copy()
-        start_date = date(year, 1, 1)
-        end_date = date(year, 12, 31)
-        num_days = (end_date - start_date).days + 1
-        num_weeks = (num_days + start_date.weekday() + (6-end_date.weekday())) // 7
-
-        start_x, start_y_block = MARGIN_LEFT + YEAR_LABEL_WIDTH, current_y_offset + YEAR_LABEL_MARGIN_TOP
-        current_x, current_y = start_x, start_y_block
-
-        file_counts = {}
-        month_positions = {}
-
-        for _, row in df_year.iterrows():
-            creation_date = row['creation_time'].date()
-            file_counts[creation_date] = file_counts.get(creation_date, 0) + 1
-
-        year_text = str(year)
-        year_text_bbox = draw.textbbox((0, 0), year_text, font=font_year)
-        year_text_pos = (MARGIN_LEFT - YEAR_LABEL_WIDTH + (YEAR_LABEL_WIDTH - year_text_bbox[2]) // 2, current_y_offset + YEAR_LABEL_MARGIN_TOP + (year_block_height - YEAR_LABEL_MARGIN_TOP - YEAR_LABEL_MARGIN_BOTTOM) / 2 - year_text_bbox[3] / 2)
-        draw.text(year_text_pos, year_text, font=font_year, fill=FONT_COLOR)
-
-        day_labels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        for i, day_label in enumerate(day_labels):
-            day_text_bbox = draw.textbbox((0, 0), day_label, font=font_day_of_week)
-            day_text_pos = (start_x - DAY_LABEL_MARGIN_LEFT - day_text_bbox[2], current_y + i * (SQUARE_SIZE + SQUARE_PADDING) + SQUARE_SIZE / 2 - day_text_bbox[3] / 2)
-            draw.text(day_text_pos, day_label, font=font_day_of_week, fill=FONT_COLOR)
-
-        current_date = date(year, 1, 1)
-        week_number = 0
-        while current_date.year == year:
-            day_of_week = current_date.weekday()
-
-            if current_date.day == 1:
-                month_positions[current_date.month] = current_x
-                month_name = current_date.strftime('%b')
-                month_text_bbox = draw.textbbox((0, 0), month_name, font=font_month)
-                month_text_pos = (current_x + (SQUARE_SIZE * 7 + SQUARE_PADDING * 6) / 2 - month_text_bbox[2] / 2 , start_y_block - MONTH_LABEL_MARGIN - month_text_bbox[3] )
-                draw.text(month_text_pos, month_name, font=font_month, fill=FONT_COLOR)
-
-            if day_of_week == 0:
-                line_y = current_y - SQUARE_PADDING / 2
-                draw.line([(start_x - DAY_LABEL_MARGIN_LEFT, line_y), (image_width_year - MARGIN_RIGHT, line_y)], fill=GRID_LINE_COLOR, width=GRID_LINE_WIDTH)
-            if current_date.weekday() == 6:
-                 line_y = current_y + (SQUARE_SIZE + SQUARE_PADDING) * 7 - SQUARE_PADDING / 2
-                 draw.line([(start_x - DAY_LABEL_MARGIN_LEFT, line_y), (image_width_year - MARGIN_RIGHT, line_y)], fill=GRID_LINE_COLOR, width=GRID_LINE_WIDTH)
-
-            count = file_counts.get(current_date, 0)
-            color_index = min(count, len(HEATMAP_COLORS) - 1) if count > 0 else 0
-            fill_color = HEATMAP_COLORS[color_index]
-
-            draw_rounded_rectangle(draw, (current_x, current_y + day_of_week * (SQUARE_SIZE + SQUARE_PADDING)), (SQUARE_SIZE, SQUARE_SIZE), SQUARE_CORNER_RADIUS, fill_color)
-
-            current_date += timedelta(days=1)
-            if current_date.weekday() == 0:
-                current_x += SQUARE_SIZE + SQUARE_PADDING
-                week_number += 1
-        draw.line([(start_x - DAY_LABEL_MARGIN_LEFT, current_y + (SQUARE_SIZE + SQUARE_PADDING) * 7 - SQUARE_PADDING / 2), (image_width_year - MARGIN_RIGHT, current_y + (SQUARE_SIZE + SQUARE_PADDING) * 7 - SQUARE_PADDING / 2)], fill=GRID_LINE_COLOR, width=GRID_LINE_WIDTH)
-
+        image.paste(year_tiles[year], (0, current_y_offset - YEAR_BLOCK_PADDING))
         current_y_offset += year_block_height + YEAR_BLOCK_PADDING
 
-
     image_filename = f"heatmap_unified_{folder_name_for_file}-{folder_hash}_all_years.png"
     filepath = os.path.join(output_folder, image_filename)
     image.save(filepath)
     print(f"Heatmap unificado para todos os anos gerado como {filepath}")
 
+def generate_unified_heatmap(df_all_years, output_folder, folder_name_for_file, folder_hash):
+    """Gera um heatmap unificado vertical para todos os anos em um único PNG."""
+
+    if df_all_years.empty:
+        print("Nenhum arquivo .py encontrado para gerar o heatmap unificado.")
+        return
+
+    counts_by_year = {}
+    for _, row in df_all_years.iterrows():
+        creation_date = row['creation_time'].date()
+        file_counts = counts_by_year.setdefault(creation_date.year, {})
+        file_counts[creation_date] = file_counts.get(creation_date, 0) + 1
+
+    render_unified_heatmap_from_counts(counts_by_year, output_folder, folder_name_for_file, folder_hash)
+
+def watch_directory(directory_path, output_folder, folder_name_for_file, folder_hash, cache=None):
+    """Modo de observação: mantém o heatmap unificado atualizado sem refazer tudo.
+
+    Só arquivos com stat diferente são lidos e só os anos com células alteradas
+    são redesenhados. Usa hash completo (a dedup em estágios depende do conjunto
+    inteiro de arquivos e não é incremental).
+    """
+    aggregate = ActivityAggregate(time_keys=('ctime',), winner_key='ctime')
+    year_tiles = {}
+    fonts = load_unified_heatmap_fonts()
+
+    def redraw(aggregate, cycle):
+        dirty_years = aggregate.pop_dirty_years()
+        if aggregate.unique_count() == 0:
+            print("Nenhum arquivo .py encontrado para gerar o heatmap unificado.")
+            return
+        print(f"Redesenhando anos: {sorted(dirty_years) if cycle else 'todos'}")
+        render_unified_heatmap_from_counts(aggregate.day_counts_by_year(), output_folder, folder_name_for_file, folder_hash,
+                                           year_tiles, dirty_years, fonts)
+
+    watch_roots([directory_path], IgnoreMatcher(PASTAS_IGNORADAS, use_gitignore=USE_GITIGNORE), calculate_file_hash, aggregate, redraw,
+                interval=WATCH_INTERVAL_SECONDS, cache=cache, workers=SCAN_WORKERS)
+
 
 if __name__ == "__main__":
     import tkinter as tk
@@ -229,15 +307,41 @@ if __name__ == "__main__":
     root = tk.Tk()
     root.withdraw()
 
-    directory_path = filedialog.askdirectory(title="Selecione o diretório para varrer arquivos .py")
-
-    if directory_path:
-        print(f"Varrendo diretório: {directory_path}")
-        all_files_df = scan_directory_for_py_files(directory_path)
-
-        if not all_files_df.empty:
-            all_files_df['year'] = all_files_df['creation_time'].dt.year
-
+    if LOAD_SNAPSHOT:
+        # Pasta e arquivos vêm do snapshot; o disco não é varrido
+        snapshot_store, snapshot_metadata = load_snapshot(SNAPSHOT_PATH)
+        directory_path = (snapshot_metadata.get('roots') or [''])[0]
+    else:
+        directory_path = filedialog.askdirectory(title="Selecione o diretório para varrer arquivos .py")
+
+    if directory_path and WATCH_MODE:
+        base_folder_name = os.path.basename(directory_path)
+        directory_hash = hashlib.sha256(directory_path.encode()).hexdigest()[:8]
+        output_folder_path = os.path.join("output_heatmaps_unified_pil", f"{base_folder_name}-{directory_hash}")
+        os.makedirs(output_folder_path, exist_ok=True)
+        print(f"Observando {directory_path} a cada {WATCH_INTERVAL_SECONDS}s (Ctrl+C para sair). Heatmap em: {output_folder_path}")
+        scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+        watch_directory(directory_path, output_folder_path, base_folder_name, directory_hash, scan_cache)
+        if scan_cache is not None:
+            scan_cache.save()
+            scan_cache.print_stats()
+    elif directory_path:
+        if LOAD_SNAPSHOT:
+            day_counts_by_year = snapshot_store.day_counts_by_year('ctime')
+        else:
+            print(f"Varrendo diretório: {directory_path}")
+            scan_cache = ScanCache(SCAN_CACHE_PATH, HASH_ALGORITHM) if USE_SCAN_CACHE else None
+            scan_sink = scan_directory_to_sink(directory_path, scan_cache)
+            if scan_cache is not None:
+                scan_cache.save()
+                scan_cache.print_stats()
+            if SAVE_SNAPSHOT and scan_sink.unique_count():
+                save_snapshot(SNAPSHOT_PATH, FileRecordStore.from_records(scan_sink.records()),
+                              {'roots': [directory_path], 'hash_algorithm': HASH_ALGORITHM, 'winner_key': 'ctime',
+                               'dedup': 'staged' if USE_STAGED_DEDUP else 'full'})
+            day_counts_by_year = scan_sink.day_counts_by_year()
+
+        if day_counts_by_year:
             base_folder_name = os.path.basename(directory_path)
             directory_hash = hashlib.sha256(directory_path.encode()).hexdigest()[:8]
             output_folder_name = f"{base_folder_name}-{directory_hash}"
@@ -245,7 +349,7 @@ if __name__ == "__main__":
             os.makedirs(output_folder_path, exist_ok=True)
             print(f"Heatmap unificado (PIL) será salvo em: {output_folder_path}")
 
-            generate_unified_heatmap(all_files_df, output_folder_path, base_folder_name, directory_hash)
+            render_unified_heatmap_from_counts(day_counts_by_year, output_folder_path, base_folder_name, directory_hash)
 
             print(f"Processo completo. Heatmap PNG unificado (PIL) gerado em: {output_folder_path}")
         else:
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import hashlib
+import numbers
+from datetime import datetime
+import numpy as np
+
+# Capacidade inicial das colunas (dobra quando enche)
+STORE_INITIAL_CAPACITY = 1024
+# Tamanho do digest guardado por arquivo (bytes)
+STORE_DIGEST_BYTES = 16
+# Agrupamento para converter epoch em hora local: todo fuso/horário de verão é
+# múltiplo de 15 minutos, então cada intervalo de 15 min UTC cai numa única hora local
+LOCAL_BUCKET_SECONDS = 15 * 60
+# Linha desconhecida (hash sem contagem de linhas)
+UNKNOWN_LINES = -1
+# Versão do formato do snapshot (.npz); load_snapshot recusa versões diferentes
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def digest16(file_hash):
+    """Digest binário de 16 bytes para um hash hex (truncado) ou uma chave sintética (blake2b dela)."""
+    try:
+        raw = bytes.fromhex(file_hash)
+    except ValueError:
+        raw = b''
+    if len(raw) < STORE_DIGEST_BYTES:
+        raw = hashlib.blake2b(file_hash.encode('utf-8'), digest_size=STORE_DIGEST_BYTES).digest()
+    return raw[:STORE_DIGEST_BYTES]
+
+
+def _epoch(value):
+    """Epoch de um datetime local ingênuo (pd.Timestamp vira datetime antes: o dele assume UTC)."""
+    if hasattr(value, 'to_pydatetime'):
+        value = value.to_pydatetime()
+    return value.timestamp()
+
+
+def _year_start_epoch(year):
+    """Epoch (hora local) de 1º de janeiro de year."""
+    return int(time.mktime((year, 1, 1, 0, 0, 0, 0, 0, -1)))
+
+
+class FileRecordStore:
+    """Registros de arquivos em colunas NumPy em vez de um dict com datetimes por arquivo.
+
+    - ctime/mtime: int64 com segundos desde a epoch;
+    - digest: 16 bytes (uint8) por arquivo;
+    - lines: int32 (UNKNOWN_LINES quando não contadas);
+    - caminho: índice int32 numa tabela de pastas internadas + o nome do arquivo.
+    Filtro por ano é uma comparação de inteiros na coluna inteira; as contagens
+    por hora/dia agrupam primeiro com np.unique (intervalos de 15 min) e só
+    convertem para hora local uma vez por intervalo distinto.
+    """
+
+    def __init__(self, capacity=STORE_INITIAL_CAPACITY):
+        self.size = 0
+        self.ctime = np.zeros(capacity, dtype=np.int64)
+        self.mtime = np.zeros(capacity, dtype=np.int64)
+        self.digests = np.zeros((capacity, STORE_DIGEST_BYTES), dtype=np.uint8)
+        self.lines = np.zeros(capacity, dtype=np.int32)
+        self.dir_ids = np.zeros(capacity, dtype=np.int32)
+        self.dirs = [] # tabela de pastas internadas
+        self.dir_index = {} # pasta -> índice em dirs
+        self.names = []
+
+    @classmethod
+    def from_frame(cls, df):
+        """Monta o armazenamento a partir do DataFrame dos scripts (creation_time, modification_time, filepath, hash, lines)."""
+        store = cls(max(len(df), 1))
+        has_mtime = 'modification_time' in df.columns
+        has_lines = 'lines' in df.columns
+        for row in df.itertuples(index=False):
+            ctime = _epoch(row.creation_time)
+            mtime = _epoch(row.modification_time) if has_mtime else ctime
+            lines = row.lines if has_lines else None
+            lines = int(lines) if isinstance(lines, numbers.Real) and lines == lines else None # NaN != NaN
+            store.append(row.filepath, row.hash, ctime, mtime, lines)
+        return store
+
+    @classmethod
+    def from_records(cls, records):
+        """Monta o armazenamento a partir de ScanRecords (ex. UniqueHashSink.records())."""
+        records = list(records) if not isinstance(records, list) else records
+        store = cls(max(len(records), 1))
+        for record in records:
+            store.append(record.filepath, record.hash, record.ctime, record.mtime, record.lines)
+        return store
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = max(len(self.ctime) * 2, STORE_INITIAL_CAPACITY)
+        self.ctime = np.resize(self.ctime, capacity)
+        self.mtime = np.resize(self.mtime, capacity)
+        self.lines = np.resize(self.lines, capacity)
+        self.dir_ids = np.resize(self.dir_ids, capacity)
+        digests = np.zeros((capacity, STORE_DIGEST_BYTES), dtype=np.uint8)
+        digests[:self.size] = self.digests[:self.size]
+        self.digests = digests
+
+    def append(self, filepath, file_hash, ctime, mtime, lines=None):
+        if self.size == len(self.ctime):
+            self._grow()
+        index = self.size
+        folder, name = os.path.split(filepath)
+        dir_id = self.dir_index.get(folder)
+        if dir_id is None:
+            dir_id = self.dir_index[folder] = len(self.dirs)
+            self.dirs.append(folder)
+        self.dir_ids[index] = dir_id
+        self.names.append(name)
+        self.ctime[index] = int(ctime)
+        self.mtime[index] = int(mtime)
+        self.lines[index] = lines if isinstance(lines, int) else UNKNOWN_LINES
+        self.digests[index] = np.frombuffer(digest16(file_hash), dtype=np.uint8)
+        self.size += 1
+
+    def column(self, time_key):
+        """Coluna de tempo ('ctime' ou 'mtime') só com as posições preenchidas."""
+        return getattr(self, time_key)[:self.size]
+
+    def filepath(self, index):
+        return os.path.join(self.dirs[self.dir_ids[index]], self.names[index])
+
+    def digest_hex(self, index):
+        return self.digests[index].tobytes().hex()
+
+    def total_lines(self):
+        lines = self.lines[:self.size]
+        return int(lines[lines >= 0].sum(dtype=np.int64))
+
+    def nbytes(self):
+        """Bytes ocupados pelas colunas NumPy (sem a tabela de nomes)."""
+        return sum(column.nbytes for column in (self.ctime, self.mtime, self.digests, self.lines, self.dir_ids))
+
+    def since(self, time_key, start_year=None):
+        """Valores de time_key a partir de start_year (máscara vetorizada em int64)."""
+        values = self.column(time_key)
+        if start_year:
+            values = values[values >= _year_start_epoch(start_year)]
+        return values
+
+    def min_year(self, time_keys=('ctime', 'mtime')):
+        """Ano mais antigo (hora local) entre as colunas informadas; None se vazio."""
+        if not self.size:
+            return None
+        oldest = min(int(self.column(time_key).min()) for time_key in time_keys)
+        return datetime.fromtimestamp(oldest).year
+
+    def hour_counts(self, time_key, start_year=None, weights=None):
+        """{(ano, mês, dia, hora local): arquivos} - o formato dos renderizadores.
+
+        weights (um float por linha, ex. pesos de amostragem) soma o peso de cada
+        arquivo em vez de 1; a célula é arredondada depois da soma.
+        """
+        if weights is None:
+            buckets, counts = np.unique(self.since(time_key, start_year) // LOCAL_BUCKET_SECONDS, return_counts=True)
+        else:
+            values = self.column(time_key)
+            mask = values >= _year_start_epoch(start_year) if start_year else np.ones(self.size, dtype=bool)
+            buckets, inverse = np.unique(values[mask] // LOCAL_BUCKET_SECONDS, return_inverse=True)
+            counts = np.bincount(inverse, weights=np.asarray(weights)[:self.size][mask], minlength=len(buckets))
+        cells = {}
+        for bucket, count in zip(buckets.tolist(), counts.tolist()):
+            moment = datetime.fromtimestamp(bucket * LOCAL_BUCKET_SECONDS)
+            cell = (moment.year, moment.month, moment.day, moment.hour)
+            cells[cell] = cells.get(cell, 0) + count
+        if weights is not None:
+            cells = {cell: int(round(count)) for cell, count in cells.items()}
+        return cells
+
+    def day_counts_by_year(self, time_key, start_year=None, weights=None):
+        """{ano: {date: arquivos}} somando as horas de cada dia."""
+        by_year = {}
+        for (year, month, day, _), count in self.hour_counts(time_key, start_year, weights).items():
+            days = by_year.setdefault(year, {})
+            moment = datetime(year, month, day).date()
+            days[moment] = days.get(moment, 0) + count
+        return by_year
+
+    def to_frame(self, hash_algorithm=None):
+        """DataFrame no formato dos scripts (datas locais como datetime), para os gráficos baseados em pandas."""
+        import pandas as pd # Só quem ainda desenha a partir de DataFrame precisa do pandas
+        lines = self.lines[:self.size]
+        return pd.DataFrame({
+            'creation_time': [datetime.fromtimestamp(value) for value in self.column('ctime').tolist()],
+            'modification_time': [datetime.fromtimestamp(value) for value in self.column('mtime').tolist()],
+            'filepath': [self.filepath(index) for index in range(self.size)],
+            'lines': pd.array([None if value == UNKNOWN_LINES else value for value in lines.tolist()], dtype='Int64'),
+            'hash': [self.digest_hex(index) for index in range(self.size)],
+            'hash_algorithm': hash_algorithm or '',
+        })
+
+
+def save_snapshot(filepath, store, metadata=None):
+    """Grava o store e metadata (dict serializável em JSON: pastas, totais...) num .npz comprimido."""
+    metadata = dict(metadata or {})
+    metadata.setdefault('saved_at', datetime.now().isoformat(timespec='seconds'))
+    metadata['format_version'] = SNAPSHOT_FORMAT_VERSION
+    size = store.size
+    metadata['lines_counted'] = bool((store.lines[:size] != UNKNOWN_LINES).any()) # Varreduras só de hash não contam linhas
+    np.savez_compressed(
+        filepath,
+        ctime=store.ctime[:size],
+        mtime=store.mtime[:size],
+        digests=store.digests[:size],
+        lines=store.lines[:size],
+        dir_ids=store.dir_ids[:size],
+        dirs=np.array(store.dirs, dtype=str),
+        names=np.array(store.names, dtype=str),
+        metadata=np.array(json.dumps(metadata, ensure_ascii=False)),
+    )
+    print(f"Snapshot salvo: {filepath} ({size} arquivos).")
+
+
+def load_snapshot(filepath, require_lines=False):
+    """Lê um snapshot gravado por save_snapshot. Retorna (store, metadata).
+
+    ValueError se o arquivo for de outra versão do formato, ou se require_lines
+    e o snapshot não tiver contagem de linhas (gravado por uma varredura só de
+    hash); OSError se não existir.
+    """
+    with np.load(filepath, allow_pickle=False) as data:
+        metadata = json.loads(str(data['metadata']))
+        if metadata.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Versão de snapshot não suportada em {filepath}: {metadata.get('format_version')}")
+        store = FileRecordStore(0)
+        store.size = len(data['ctime'])
+        store.ctime = data['ctime'].astype(np.int64)
+        store.mtime = data['mtime'].astype(np.int64)
+        store.digests = data['digests'].astype(np.uint8)
+        store.lines = data['lines'].astype(np.int32)
+        store.dir_ids = data['dir_ids'].astype(np.int32)
+        store.dirs = data['dirs'].tolist()
+        store.names = data['names'].tolist()
+    store.dir_index = {folder: index for index, folder in enumerate(store.dirs)}
+    lines_counted = metadata.get('lines_counted', bool((store.lines != UNKNOWN_LINES).any()))
+    if require_lines and not lines_counted:
+        raise ValueError(f"Snapshot {filepath} não tem contagem de linhas (gravado por uma varredura só de hash).")
+    print(f"Snapshot carregado: {filepath} ({store.size} arquivos, salvo em {metadata.get('saved_at', '?')}).")
+    return store, metadata
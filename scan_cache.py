@@ -0,0 +1,122 @@
+import sqlite3
+from file_hashing import new_hasher, DEFAULT_HASH_ALGORITHM
+
+# Arquivo padrão do cache persistente de varredura (SQLite, criado no diretório atual)
+SCAN_CACHE_DEFAULT_PATH = "heatmap_scan_cache.sqlite"
+
+
+class ScanCache:
+    """Cache persistente de hash, linhas e datas por arquivo.
+
+    Cada entrada é indexada pelo caminho e só é considerada válida se tamanho,
+    mtime (ns) e inode do arquivo continuarem iguais aos gravados e se o hash foi
+    calculado com o mesmo algoritmo desta instância. Assim apenas arquivos novos
+    ou alterados (ou com hash de outro algoritmo) precisam ser lidos novamente.
+    """
+
+    def __init__(self, cache_path=SCAN_CACHE_DEFAULT_PATH, algorithm=DEFAULT_HASH_ALGORITHM):
+        new_hasher(algorithm) # Falha já aqui (ValueError) se o algoritmo for inválido
+        self.cache_path = cache_path
+        self.algorithm = algorithm
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._dirty = {}
+        self._load()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.cache_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_cache ("
+            " filepath TEXT PRIMARY KEY,"
+            " size INTEGER, mtime_ns INTEGER, inode INTEGER,"
+            " file_hash TEXT, lines INTEGER,"
+            " ctime REAL, mtime REAL, algorithm TEXT)"
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(file_cache)")]
+        if 'algorithm' not in columns:
+            # Caches antigos (sem a coluna) foram gerados com SHA-256
+            conn.execute("ALTER TABLE file_cache ADD COLUMN algorithm TEXT DEFAULT 'sha256'")
+        return conn
+
+    def _load(self):
+        """Carrega todas as entradas do disco para memória (uma única consulta)."""
+        try:
+            conn = self._connect()
+            try:
+                for row in conn.execute("SELECT filepath, size, mtime_ns, inode, file_hash, lines, ctime, mtime, algorithm FROM file_cache"):
+                    self._entries[row[0]] = row[1:]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Aviso: cache de varredura {self.cache_path} ilegível, iniciando vazio: {e}")
+            self._entries = {}
+
+    def lookup(self, record, need_lines=False):
+        """Retorna {'hash', 'lines', 'ctime', 'mtime'} se o arquivo não mudou, senão None.
+
+        record é o registro de arquivo do walker (filepath, size, mtime_ns, inode, ...).
+        """
+        entry = self._entries.get(record['filepath'])
+        if (entry is not None
+                and entry[0] == record['size']
+                and entry[1] == record['mtime_ns']
+                and entry[2] == record['inode']
+                and entry[7] == self.algorithm
+                and not (need_lines and entry[4] is None)):
+            self.hits += 1
+            return {'hash': entry[3], 'lines': entry[4], 'ctime': entry[5], 'mtime': entry[6]}
+        self.misses += 1
+        return None
+
+    def store(self, record, file_hash, lines=None):
+        """Grava (em memória) o resultado de um arquivo recém-lido; persiste em save()."""
+        entry = (record['size'], record['mtime_ns'], record['inode'],
+                 file_hash, lines, record['ctime'], record['mtime'], self.algorithm)
+        self._entries[record['filepath']] = entry
+        self._dirty[record['filepath']] = entry
+
+    def save(self):
+        """Persiste as entradas novas/alteradas em um único lote."""
+        if not self._dirty:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO file_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(path,) + entry for path, entry in self._dirty.items()]
+                    )
+            finally:
+                conn.close()
+            self._dirty = {}
+        except sqlite3.Error as e:
+            print(f"Erro ao salvar cache de varredura {self.cache_path}: {e}")
+
+    def take_dirty(self):
+        """Retorna as entradas novas/alteradas ainda não salvas e as retira da fila de save()."""
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def merge(self, dirty, hits=0, misses=0):
+        """Incorpora entradas (de take_dirty) e estatísticas de um ScanCache de outro processo."""
+        self._entries.update(dirty)
+        self._dirty.update(dirty)
+        self.hits += hits
+        self.misses += misses
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def print_stats(self):
+        print(f"Cache de varredura: {self.hits} acertos, {self.misses} faltas ({self.hit_ratio():.1%} de acerto).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+        return False
+
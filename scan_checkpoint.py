@@ -0,0 +1,165 @@
+import os
+import time
+import zlib
+import struct
+import pickle
+import hashlib
+from collections import defaultdict
+from scan_stream import make_scan_record
+
+# Pasta padrão dos checkpoints (um arquivo por raiz varrida)
+CHECKPOINT_DIR_DEFAULT = "heatmap_scan_checkpoints"
+# Intervalo mínimo entre duas gravações de checkpoint
+CHECKPOINT_INTERVAL_SECONDS = 5
+CHECKPOINT_FORMAT_VERSION = 1
+# Cabeçalho de cada quadro do diário: tamanho e CRC32 do conteúdo
+_FRAME_HEADER = struct.Struct('>II')
+
+
+def checkpoint_path_for(root, checkpoint_dir=CHECKPOINT_DIR_DEFAULT):
+    """Caminho do checkpoint de uma raiz (nome derivado do caminho absoluto dela)."""
+    root_id = hashlib.sha256(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(checkpoint_dir, f"{root_id}.ckpt")
+
+
+def _read_frames(file):
+    """Lê os quadros válidos em ordem; para no primeiro incompleto ou corrompido (gravação interrompida)."""
+    while True:
+        header = file.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            return
+        size, checksum = _FRAME_HEADER.unpack(header)
+        payload = file.read(size)
+        if len(payload) < size or zlib.crc32(payload) != checksum:
+            return
+        yield pickle.loads(payload)
+
+
+class ScanCheckpoint:
+    """Checkpoint de uma varredura longa, gravado como diário só de acréscimos.
+
+    Cada gravação acrescenta UM quadro (tamanho + CRC32 + pickle) com o que mudou
+    desde a anterior: registros com hash e pastas concluídas (todos os arquivos
+    entregues pelo walker já processados). O custo é proporcional ao que mudou,
+    não ao tamanho da varredura, então dá para gravar a cada poucos segundos. Um
+    quadro cortado por queda/Ctrl+C é descartado na leitura (CRC) e a retomada
+    continua do último quadro íntegro. Na retomada, os registros são reaplicados
+    ao sink na mesma ordem e os arquivos das pastas concluídas não são relidos.
+    Usado só na thread chamadora (callbacks do walker e de iter_scan_records).
+    """
+
+    def __init__(self, checkpoint_path, root, algorithm, interval=CHECKPOINT_INTERVAL_SECONDS):
+        self.checkpoint_path = checkpoint_path
+        self.identity = {'version': CHECKPOINT_FORMAT_VERSION, 'root': os.path.abspath(root), 'algorithm': algorithm}
+        self.interval = interval
+        self.completed_dirs = set()
+        self.dir_totals = {} # pasta listada -> arquivos entregues pelo walker
+        self.processed = defaultdict(int) # pasta -> arquivos já processados
+        self.new_records = []
+        self.new_dirs = []
+        self.last_save = time.monotonic()
+        self.file = None
+
+    def resume(self, sink):
+        """Reaplica o checkpoint existente no sink. Retorna quantos registros foram recuperados.
+
+        Checkpoint ausente, de outra raiz/algoritmo ou de outra versão é descartado
+        e a varredura começa do zero.
+        """
+        restored = 0
+        try:
+            with open(self.checkpoint_path, 'rb') as file:
+                frames = _read_frames(file)
+                if next(frames, None) != self.identity:
+                    print(f"Checkpoint {self.checkpoint_path} é de outra varredura; começando do zero.")
+                    return self.start()
+                valid_size = file.tell()
+                for records, dirs in frames:
+                    for record in records:
+                        sink.add(record)
+                    restored += len(records)
+                    self.completed_dirs.update(dirs)
+                    valid_size = file.tell()
+        except FileNotFoundError:
+            print("Nenhum checkpoint encontrado; começando do zero.")
+            return self.start()
+        except (OSError, pickle.UnpicklingError, ValueError) as e:
+            print(f"Checkpoint {self.checkpoint_path} ilegível ({e}); começando do zero.")
+            return self.start()
+        self.file = open(self.checkpoint_path, 'r+b')
+        self.file.truncate(valid_size) # Remove um quadro final incompleto
+        self.file.seek(valid_size)
+        print(f"Retomando varredura: {restored} arquivos e {len(self.completed_dirs)} pastas concluídas recuperados.")
+        return restored
+
+    def start(self):
+        """Começa um checkpoint novo (descarta o anterior). Retorna 0 (nada recuperado)."""
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.completed_dirs = set()
+        self.file = open(self.checkpoint_path, 'wb')
+        self._write_frame(self.identity)
+        return 0
+
+    def _write_frame(self, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.file.write(_FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _complete(self, dir_key):
+        self.completed_dirs.add(dir_key)
+        self.new_dirs.append(dir_key)
+        self.dir_totals.pop(dir_key, None)
+        self.processed.pop(dir_key, None)
+
+    def directory_listed(self, dir_key, delivered):
+        """Callback do walker: a pasta terminou de ser listada com `delivered` arquivos."""
+        if self.processed.get(dir_key, 0) >= delivered:
+            self._complete(dir_key)
+        else:
+            self.dir_totals[dir_key] = delivered
+        self.maybe_save()
+
+    def file_done(self, record, file_hash, lines):
+        """Callback de iter_scan_records: um arquivo foi processado (com ou sem hash)."""
+        if file_hash:
+            self.new_records.append(make_scan_record(record, file_hash, lines))
+        dir_key = os.path.dirname(record['filepath'])
+        self.processed[dir_key] += 1
+        total = self.dir_totals.get(dir_key)
+        if total is not None and self.processed[dir_key] >= total:
+            self._complete(dir_key)
+        self.maybe_save()
+
+    def maybe_save(self):
+        if time.monotonic() - self.last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """Acrescenta ao diário o que mudou desde a última gravação."""
+        if self.file is None:
+            self.start()
+        if self.new_records or self.new_dirs:
+            self._write_frame((self.new_records, self.new_dirs))
+            self.new_records = []
+            self.new_dirs = []
+        self.last_save = time.monotonic()
+
+    def close(self):
+        """Grava o que falta e fecha (o checkpoint continua no disco para um --resume)."""
+        if self.file is not None:
+            self.save()
+            self.file.close()
+            self.file = None
+
+    def finish(self):
+        """Varredura concluída: o checkpoint não é mais necessário e é apagado."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        try:
+            os.remove(self.checkpoint_path)
+        except OSError:
+            pass
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import heapq
+import hashlib
+import threading
+from datetime import datetime
+
+# Intervalo entre duas linhas de progresso
+PROGRESS_INTERVAL_SECONDS = 2
+# Quantas pastas mais lentas entram no relatório
+SLOWEST_DIRECTORIES = 10
+# Pasta padrão dos relatórios JSON (um por raiz varrida)
+METRICS_DIR_DEFAULT = "heatmap_scan_metrics"
+
+
+def metrics_report_path_for(root, metrics_dir=METRICS_DIR_DEFAULT):
+    """Caminho do relatório de uma raiz: nome da pasta + id curto do caminho absoluto."""
+    absolute = os.path.abspath(root)
+    root_id = hashlib.sha256(absolute.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(metrics_dir, f"{os.path.basename(absolute.rstrip(os.sep)) or 'raiz'}_{root_id}.json")
+
+
+class ScanMetrics:
+    """Métricas de uma varredura: vazão (arquivos/s, bytes/s), tempo por estágio e pastas mais lentas.
+
+    Estágios usados pelos scanners: 'walk' (listar pastas), 'stat', 'hash',
+    'line_count', 'hash+line_count' (leitura única), 'cache' (acertos) e um por
+    analisador de file_analyzers (ex. 'db_stats'). Os tempos de estágio são somados
+    de todas as threads/processos, então podem passar do tempo de relógio; compare
+    cpu_seconds com wall_seconds para saber se a varredura foi limitada por CPU
+    (utilização perto do número de workers) ou por I/O (utilização baixa com muito
+    tempo em 'stat'/'hash'). add() pode ser chamado de qualquer thread.
+    """
+
+    def __init__(self, label="", progress_interval=PROGRESS_INTERVAL_SECONDS, stream=None):
+        self.label = label
+        self.progress_interval = progress_interval
+        self.stream = stream if stream is not None else sys.stdout
+        self.stages = {} # estágio -> {'seconds', 'calls', 'bytes'}
+        self.directory_seconds = {} # pasta -> segundos somados de todos os estágios
+        self.files = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.last_progress = self.started
+        self.progress_shown = False
+
+    def add(self, stage, seconds, nbytes=0, directory=None, calls=1):
+        """Soma `seconds` (e bytes lidos) ao estágio e, se informada, à pasta."""
+        with self.lock:
+            totals = self.stages.get(stage)
+            if totals is None:
+                totals = self.stages[stage] = {'seconds': 0.0, 'calls': 0, 'bytes': 0}
+            totals['seconds'] += seconds
+            totals['calls'] += calls
+            totals['bytes'] += nbytes
+            if directory is not None:
+                self.directory_seconds[directory] = self.directory_seconds.get(directory, 0.0) + seconds
+
+    def file_done(self, nbytes=0):
+        """Um arquivo terminou (hash pronto ou acerto de cache); atualiza a linha de progresso."""
+        self.files += 1
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if self.progress_interval and now - self.last_progress >= self.progress_interval:
+            self.last_progress = now
+            self.print_progress(now)
+
+    def print_progress(self, now=None):
+        elapsed = max((now or time.perf_counter()) - self.started, 1e-9)
+        with self.lock:
+            stage_text = " ".join(f"{stage} {totals['seconds']:.1f}s" for stage, totals in self.stages.items())
+        self.stream.write(f"\r[{self.label}] {self.files} arquivos | {self.files / elapsed:.1f} arq/s | "
+                          f"{self.bytes / elapsed / (1024 * 1024):.1f} MB/s | {stage_text}   ")
+        self.stream.flush()
+        self.progress_shown = True
+
+    def report(self, slowest=SLOWEST_DIRECTORIES):
+        """Relatório em dict (serializável em JSON)."""
+        wall = max(time.perf_counter() - self.started, 1e-9)
+        cpu = time.process_time() - self.cpu_started
+        with self.lock:
+            stages = {
+                stage: {
+                    'seconds': round(totals['seconds'], 4),
+                    'calls': totals['calls'],
+                    'bytes': totals['bytes'],
+                    'ms_per_call': round(1000 * totals['seconds'] / totals['calls'], 4) if totals['calls'] else 0,
+                    'mb_per_second': round(totals['bytes'] / totals['seconds'] / (1024 * 1024), 2) if totals['seconds'] and totals['bytes'] else None,
+                }
+                for stage, totals in self.stages.items()
+            }
+            slowest_dirs = heapq.nlargest(slowest, self.directory_seconds.items(), key=lambda item: item[1])
+        return {
+            'label': self.label,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4), # Todas as threads deste processo (workers de processo não entram)
+            'cpu_utilization': round(cpu / wall, 3),
+            'files': self.files,
+            'bytes': self.bytes,
+            'files_per_second': round(self.files / wall, 2),
+            'mb_per_second': round(self.bytes / wall / (1024 * 1024), 2),
+            'stages': stages,
+            'slowest_directories': [{'directory': directory, 'seconds': round(seconds, 4)} for directory, seconds in slowest_dirs],
+        }
+
+    def print_summary(self, slowest=5):
+        report = self.report(slowest)
+        if self.progress_shown:
+            self.stream.write("\n")
+        print(f"Métricas [{self.label}]: {report['files']} arquivos em {report['wall_seconds']:.1f}s "
+              f"({report['files_per_second']:.1f} arq/s, {report['mb_per_second']:.1f} MB/s), "
+              f"CPU {report['cpu_utilization']:.2f}x o tempo de relógio.")
+        for stage, totals in sorted(report['stages'].items(), key=lambda item: item[1]['seconds'], reverse=True):
+            print(f"  -> {stage}: {totals['seconds']:.2f}s em {totals['calls']} chamadas ({totals['ms_per_call']:.2f} ms/chamada)")
+        for entry in report['slowest_directories']:
+            print(f"  -> pasta lenta: {entry['directory']} ({entry['seconds']:.2f}s)")
+        return report
+
+    def write_json(self, filepath):
+        """Grava o relatório em JSON (gravação atômica: arquivo temporário + os.replace)."""
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{filepath}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, filepath)
+        print(f"Relatório de métricas salvo: {filepath}")
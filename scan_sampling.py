@@ -0,0 +1,106 @@
+import os
+import math
+import random
+import itertools
+import numpy as np
+
+# Mínimo de arquivos sorteados por pasta (com menos de 2 não há como estimar a variância da pasta)
+SAMPLE_MIN_PER_DIRECTORY = 2
+# Quantil normal do intervalo de confiança de 95%
+Z_95 = 1.96
+
+
+class DirectorySampler:
+    """Amostragem estratificada por pasta: o walker percorre tudo, mas só uma fração dos arquivos é lida.
+
+    Cada pasta é um estrato: dos N arquivos entregues pelo walker, k =
+    min(N, max(min_per_directory, ceil(fraction * N))) são sorteados e só eles
+    vão para o hash/contagem de linhas. Cada arquivo sorteado representa N/k
+    arquivos da pasta (peso de Horvitz-Thompson). strata guarda {pasta: (N, k)},
+    o necessário para escalar as contagens e calcular os intervalos de confiança.
+    Com seed, o sorteio de cada pasta depende só de (seed, pasta): a mesma árvore
+    gera a mesma amostra em qualquer ordem de varredura. Picklable (volta do
+    processo filho como o sink).
+    """
+
+    def __init__(self, fraction, min_per_directory=SAMPLE_MIN_PER_DIRECTORY, seed=None):
+        if not 0 < fraction <= 1:
+            raise ValueError(f"Fração de amostragem deve estar em (0, 1]: {fraction}")
+        self.fraction = fraction
+        self.min_per_directory = max(2, int(min_per_directory))
+        self.seed = seed
+        self.strata = {} # pasta -> (arquivos na pasta, arquivos sorteados)
+
+    def sample(self, records):
+        """Filtra os registros do walker (os arquivos de uma pasta chegam juntos, como em scan_files)."""
+        for directory, group in itertools.groupby(records, key=lambda record: os.path.dirname(record['filepath'])):
+            group = list(group)
+            population = len(group)
+            size = min(population, max(self.min_per_directory, math.ceil(self.fraction * population)))
+            rng = random.Random(f"{self.seed}:{directory}") if self.seed is not None else random
+            previous = self.strata.get(directory, (0, 0))
+            self.strata[directory] = (previous[0] + population, previous[1] + size)
+            yield from (group if size == population else rng.sample(group, size))
+
+    def merge(self, other):
+        """Junta os estratos de outra raiz."""
+        for directory, (population, size) in other.strata.items():
+            previous = self.strata.get(directory, (0, 0))
+            self.strata[directory] = (previous[0] + population, previous[1] + size)
+
+    def population(self):
+        return sum(population for population, _ in self.strata.values())
+
+    def sampled(self):
+        return sum(size for _, size in self.strata.values())
+
+    def weights(self, store):
+        """Peso N/k de cada linha de um FileRecordStore (1 para pastas fora da amostra)."""
+        weight_by_dir = np.ones(len(store.dirs), dtype=np.float64)
+        for index, directory in enumerate(store.dirs):
+            population, size = self.strata.get(directory, (1, 1))
+            weight_by_dir[index] = population / size
+        return weight_by_dir[store.dir_ids[:store.size]]
+
+    def estimate_totals(self, store, z=Z_95):
+        """Totais estimados (arquivos únicos e linhas) com a margem do intervalo de confiança.
+
+        Estimador estratificado: T = soma de N_h * média_h(y), com y = 1 (ou as
+        linhas) para os vencedores da deduplicação e 0 para os demais arquivos
+        sorteados; variância = soma de N_h^2 (1 - k_h/N_h) s_h^2 / k_h. A
+        deduplicação só enxerga duplicatas que caíram juntas na amostra, então
+        "arquivos únicos" tende a superestimar quando há muitas cópias.
+        """
+        dir_ids = store.dir_ids[:store.size]
+        lines = store.lines[:store.size].astype(np.float64)
+        lines[lines < 0] = 0
+        ones = np.ones(store.size, dtype=np.float64)
+        estimates = {}
+        for name, values in (('files', ones), ('lines', lines)):
+            sums = np.bincount(dir_ids, weights=values, minlength=len(store.dirs))
+            squares = np.bincount(dir_ids, weights=values * values, minlength=len(store.dirs))
+            total = variance = 0.0
+            for directory, (population, size) in self.strata.items():
+                index = store.dir_index.get(directory)
+                sum_y = float(sums[index]) if index is not None else 0.0
+                sum_y2 = float(squares[index]) if index is not None else 0.0
+                total += population * sum_y / size
+                if size < population:
+                    spread = max(0.0, (sum_y2 - sum_y * sum_y / size) / (size - 1))
+                    variance += population * population * (1 - size / population) * spread / size
+            estimates[name] = round(total)
+            estimates[f"{name}_margin"] = round(z * math.sqrt(variance))
+        population = self.population()
+        estimates.update({
+            'population': population,
+            'sampled': self.sampled(),
+            'fraction': self.sampled() / population if population else 0.0,
+            'confidence': 0.95 if z == Z_95 else None,
+        })
+        return estimates
+
+
+def print_sample_estimate(estimate):
+    print(f"Amostragem estratificada: {estimate['sampled']} de {estimate['population']} arquivos lidos ({estimate['fraction']:.1%}).")
+    print(f"  -> Arquivos únicos estimados: {estimate['files']} ± {estimate['files_margin']} (IC 95%)")
+    print(f"  -> Linhas estimadas: {estimate['lines']:,} ± {estimate['lines_margin']:,} (IC 95%)".replace(",", "."))
@@ -0,0 +1,130 @@
+import itertools
+from collections import namedtuple
+from datetime import datetime, date
+from heatmap_scanner import scan_files, iter_hashed_files, SCAN_WORKERS_DEFAULT
+
+# Registro compacto de um arquivo já identificado (tupla: bem menor que um dict por arquivo)
+ScanRecord = namedtuple('ScanRecord', ['filepath', 'hash', 'size', 'ctime', 'mtime', 'lines'])
+
+
+def make_scan_record(record, file_hash, lines=None):
+    """ScanRecord a partir do registro do walker (datas em epoch, como no stat)."""
+    return ScanRecord(record['filepath'], file_hash, record['size'], record['ctime'], record['mtime'], lines)
+
+
+def iter_scan_records(roots, pastas_ignoradas, hash_func, extensions=(".py",), cache=None,
+                      workers=SCAN_WORKERS_DEFAULT, use_processes=False, fused=False, counters=None,
+                      checkpoint=None, metrics=None, sampler=None):
+    """Gera um ScanRecord por arquivo à medida que os hashes ficam prontos.
+
+    Nada é acumulado aqui: o walker alimenta o pool de hash e cada resultado é
+    entregue na hora. hash_func segue o contrato de iter_hashed_files (com
+    fused=True devolve (hash, linhas)). Arquivos cujo hash falhou são omitidos.
+    counters (dict) recebe os contadores do walker somados de todas as raízes e
+    as leituras evitadas pelo memo de inodes ('inode_reused').
+    Com um ScanCheckpoint, arquivos de pastas já concluídas não são lidos de novo
+    e cada arquivo processado (mesmo com falha no hash) é informado a ele.
+    metrics (ScanMetrics) é repassado ao walker e ao pool de hash. Com um
+    DirectorySampler, só os arquivos sorteados em cada pasta chegam ao pool (não
+    combine com checkpoint: as pastas nunca seriam dadas como concluídas).
+    """
+    if counters is None:
+        counters = {}
+
+    def walk(root):
+        if checkpoint is None:
+            files = scan_files(root, pastas_ignoradas, extensions, counters, metrics=metrics)
+        else:
+            files = scan_files(root, pastas_ignoradas, extensions, counters,
+                               checkpoint.completed_dirs, checkpoint.directory_listed, metrics)
+        return sampler.sample(files) if sampler is not None else files
+
+    # Um único pool para todas as raízes: o memo de inodes vale também entre elas
+    files = itertools.chain.from_iterable(walk(root) for root in roots)
+    for record, file_hash, lines in iter_hashed_files(files, hash_func, None, workers, use_processes, cache, fused, metrics,
+                                                      counters):
+        if checkpoint is not None:
+            checkpoint.file_done(record, file_hash, lines)
+        if file_hash:
+            yield make_scan_record(record, file_hash, lines)
+
+
+def consume(records, *sinks):
+    """Entrega cada registro a todos os sinks, sem guardar a sequência. Retorna os sinks."""
+    for record in records:
+        for sink in sinks:
+            sink.add(record)
+    return sinks
+
+
+class UniqueHashSink:
+    """Deduplicação por hash com contagens por hora atualizadas a cada registro.
+
+    Guarda só o vencedor de cada hash (o de maior winner_key; em empate fica o
+    primeiro recebido - mesma regra do idxmax dos scripts), então a memória
+    depende do número de hashes únicos e de células com atividade, não do número
+    de arquivos percorridos. Quando um vencedor é trocado, a célula antiga é
+    decrementada e a nova incrementada. Diferente do ActivityAggregate do modo de
+    observação, não permite remover arquivos (não guarda os perdedores). Só usa
+    dicts comuns, então pode voltar de um processo filho (picklable).
+    """
+
+    def __init__(self, winner_key='mtime', time_keys=('ctime', 'mtime')):
+        self.winner_key = winner_key
+        self.time_keys = tuple(time_keys)
+        self.winners = {} # hash -> ScanRecord
+        self.cell_counts = {key: {} for key in self.time_keys}
+        self.total_lines = 0
+        self.records_seen = 0
+
+    def _count(self, record, delta):
+        for time_key in self.time_keys:
+            moment = datetime.fromtimestamp(getattr(record, time_key))
+            cell = (moment.year, moment.month, moment.day, moment.hour)
+            counts = self.cell_counts[time_key]
+            counts[cell] = counts.get(cell, 0) + delta
+            if counts[cell] <= 0:
+                del counts[cell]
+        if isinstance(record.lines, (int, float)):
+            self.total_lines += delta * record.lines
+
+    def add(self, record):
+        self.records_seen += 1
+        current = self.winners.get(record.hash)
+        if current is not None:
+            if getattr(record, self.winner_key) <= getattr(current, self.winner_key):
+                return
+            self._count(current, -1)
+        self.winners[record.hash] = record
+        self._count(record, +1)
+
+    def merge(self, other):
+        """Junta outro sink (ex. de outra raiz); chame na ordem das raízes para manter o desempate."""
+        for record in other.winners.values():
+            self.add(record)
+        self.records_seen += other.records_seen - len(other.winners)
+
+    def unique_count(self):
+        return len(self.winners)
+
+    def records(self):
+        """Os vencedores (um por hash), ex. para montar um DataFrame se ainda for preciso."""
+        return list(self.winners.values())
+
+    def hour_counts(self, time_key=None):
+        """{(ano, mês, dia, hora): arquivos únicos} da chave de tempo (padrão: a primeira)."""
+        return dict(self.cell_counts[time_key or self.time_keys[0]])
+
+    def day_counts_by_year(self, time_key=None):
+        """{ano: {date: arquivos únicos}} somando as horas de cada dia."""
+        by_year = {}
+        for (year, month, day, _), count in self.cell_counts[time_key or self.time_keys[0]].items():
+            days = by_year.setdefault(year, {})
+            moment = date(year, month, day)
+            days[moment] = days.get(moment, 0) + count
+        return by_year
+
+    def min_year(self):
+        """Ano mais antigo com atividade em qualquer chave de tempo (None se vazio)."""
+        years = [cell[0] for counts in self.cell_counts.values() for cell in counts]
+        return min(years) if years else None
@@ -0,0 +1,144 @@
+import re
+import sqlite3
+from datetime import datetime, date
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from sqlite_stats import open_readonly
+
+# Grupos (horas distintas) trazidos por fetchmany; as linhas das tabelas nunca saem do SQLite
+ROW_ACTIVITY_FETCH_SIZE = 1000
+# Tipo declarado que marca uma coluna de data/hora (DATE, DATETIME, TIMESTAMP, TIME...)
+TIMESTAMP_TYPE_HINTS = ('DATE', 'TIME')
+# Partes do nome (separado em '_' e camelCase) que marcam data/hora mesmo sem tipo declarado
+TIMESTAMP_NAME_HINTS = {'created', 'updated', 'modified', 'timestamp', 'datetime', 'date', 'time'}
+# Última parte de nomes compostos como created_at, posted_on, event_ts
+TIMESTAMP_NAME_SUFFIXES = {'at', 'on', 'ts'}
+# Horas fora deste intervalo de anos são descartadas (inteiros que não eram datas viram 1970)
+ROW_TIME_MIN_YEAR = 1971
+
+# Tabelas do banco; as colunas de cada uma são lidas à parte (uma tabela ilegível não derruba as outras)
+_TABLES_QUERY = "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+_TABLE_COLUMNS_QUERY = "SELECT name, type FROM pragma_table_info(?)"
+# Hora local de cada valor, conforme o tipo guardado: texto ISO (UTC, como CURRENT_TIMESTAMP,
+# ou com fuso explícito); inteiro = epoch em segundos (ou ms, se grande demais); real = dia
+# juliano (pequeno) ou epoch. Os três passam por 'localtime', como os arquivos
+_HOUR_EXPRESSION = (
+    "CASE typeof({column}) "
+    "WHEN 'text' THEN strftime('%Y-%m-%d %H', {column}, 'localtime') "
+    "WHEN 'integer' THEN strftime('%Y-%m-%d %H', CASE WHEN abs({column}) > 100000000000 THEN {column} / 1000 ELSE {column} END, 'unixepoch', 'localtime') "
+    "WHEN 'real' THEN CASE WHEN {column} < 10000000 THEN strftime('%Y-%m-%d %H', {column}, 'localtime') "
+    "ELSE strftime('%Y-%m-%d %H', {column}, 'unixepoch', 'localtime') END "
+    "END"
+)
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _name_tokens(name):
+    """Partes de um nome de coluna: created_at -> [created, at]; createdAt -> [created, at]."""
+    return [token.lower() for token in re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+', name)]
+
+
+def is_timestamp_column(name, declared_type):
+    """Coluna de data/hora pelo tipo declarado ou por uma parte inteira do nome (created_at, updated, event_date...).
+
+    Só partes inteiras contam: candidate_id, validated, update_count e runtime_ms não são datas.
+    """
+    declared_type = (declared_type or '').upper()
+    if any(hint in declared_type for hint in TIMESTAMP_TYPE_HINTS):
+        return True
+    tokens = _name_tokens(name)
+    return (any(token in TIMESTAMP_NAME_HINTS for token in tokens)
+            or (len(tokens) > 1 and tokens[-1] in TIMESTAMP_NAME_SUFFIXES))
+
+
+def timestamp_columns(conn):
+    """[(tabela, coluna)] com datas/horas em potencial.
+
+    Tabelas cujo esquema o SQLite não consegue ler (tabela virtual de um módulo
+    que não está disponível, como "no such module") são puladas com um aviso.
+    """
+    columns = []
+    for (table,) in conn.execute(_TABLES_QUERY).fetchall():
+        try:
+            table_columns = conn.execute(_TABLE_COLUMNS_QUERY, (table,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Aviso: tabela {table} ignorada: {e}")
+            continue
+        columns.extend((table, column) for column, declared_type in table_columns
+                       if is_timestamp_column(column, declared_type))
+    return columns
+
+
+def row_hour_counts(filepath, fetch_size=ROW_ACTIVITY_FETCH_SIZE, max_year=None):
+    """{(ano, mês, dia, hora): linhas} somando todas as colunas de data/hora do banco, e as colunas usadas.
+
+    A contagem é feita no SQLite (GROUP BY strftime(...) por coluna) numa
+    conexão só leitura; o Python só recebe um par (hora, contagem) por hora
+    distinta, em lotes de fetch_size. Colunas que o SQLite não consegue ler
+    (tabela virtual sem módulo etc.) são puladas. Retorna (contagens, [(tabela, coluna)]).
+    """
+    max_year = max_year or datetime.now().year + 1
+    counts = {}
+    used_columns = []
+    with closing(open_readonly(filepath)) as conn:
+        for table, column in timestamp_columns(conn):
+            hour = _HOUR_EXPRESSION.format(column=_quote(column))
+            query = (f"SELECT {hour} AS hour, count(*) FROM {_quote(table)} "
+                     f"WHERE {_quote(column)} IS NOT NULL GROUP BY hour")
+            found = False
+            try:
+                cursor = conn.execute(query)
+                while True:
+                    batch = cursor.fetchmany(fetch_size)
+                    if not batch:
+                        break
+                    for hour_text, rows in batch:
+                        if not hour_text or len(hour_text) != 13:
+                            continue # Texto que não é data
+                        cell = (int(hour_text[0:4]), int(hour_text[5:7]), int(hour_text[8:10]), int(hour_text[11:13]))
+                        if not ROW_TIME_MIN_YEAR <= cell[0] <= max_year:
+                            continue
+                        counts[cell] = counts.get(cell, 0) + rows
+                        found = True
+            except sqlite3.Error as e:
+                print(f"Aviso: coluna {table}.{column} de {filepath} ignorada: {e}")
+                continue
+            if found:
+                used_columns.append((table, column))
+    return counts, used_columns
+
+
+def _row_hour_counts_safe(filepath, fetch_size):
+    try:
+        return row_hour_counts(filepath, fetch_size)
+    except sqlite3.Error as e:
+        print(f"Erro ao ler datas das linhas de {filepath}: {e}")
+        return {}, []
+
+
+def aggregate_row_activity(filepaths, workers=4, fetch_size=ROW_ACTIVITY_FETCH_SIZE):
+    """Soma row_hour_counts de vários bancos (um por thread do pool). Retorna {'hour_counts', 'columns', 'databases'}.
+
+    columns é a lista de (banco, tabela, coluna) que contribuíram com alguma hora.
+    """
+    hour_counts = {}
+    columns = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for filepath, (counts, used_columns) in zip(filepaths, executor.map(_row_hour_counts_safe, filepaths, [fetch_size] * len(filepaths))):
+            for cell, rows in counts.items():
+                hour_counts[cell] = hour_counts.get(cell, 0) + rows
+            columns.extend((filepath, table, column) for table, column in used_columns)
+    return {'hour_counts': hour_counts, 'columns': columns, 'databases': len(filepaths)}
+
+
+def day_counts_by_year(hour_counts):
+    """{ano: {date: contagem}} somando as horas de cada dia (formato do heatmap unificado)."""
+    by_year = {}
+    for (year, month, day, _), count in hour_counts.items():
+        days = by_year.setdefault(year, {})
+        moment = date(year, month, day)
+        days[moment] = days.get(moment, 0) + count
+    return by_year
@@ -0,0 +1,208 @@
+import os
+import struct
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from file_hashing import new_hasher, DEFAULT_HASH_ALGORITHM
+
+# Arquivo padrão do cache de estatísticas de esquema (SQLite, criado no diretório atual)
+DB_STATS_CACHE_DEFAULT_PATH = "heatmap_db_stats_cache.sqlite"
+# Cabeçalho do arquivo SQLite (https://www.sqlite.org/fileformat.html#the_database_header)
+SQLITE_HEADER_SIZE = 100
+SQLITE_HEADER_MAGIC = b"SQLite format 3\x00"
+# Páginas espaçadas lidas pela impressão digital, além da primeira (cabeçalho) e da última
+FINGERPRINT_SAMPLE_PAGES = 16
+# "Página" usada na impressão digital de arquivos sem cabeçalho SQLite válido
+FINGERPRINT_FALLBACK_PAGE_SIZE = 4096
+# Prefixo que distingue impressões digitais de hashes completos
+FINGERPRINT_PREFIX = "fp:"
+
+# Tabelas e colunas numa única consulta: cada tabela do sqlite_master junto com pragma_table_info dela
+SCHEMA_STATS_QUERY = (
+    "SELECT count(DISTINCT m.name), count(p.name) "
+    "FROM sqlite_master AS m LEFT JOIN pragma_table_info(m.name) AS p "
+    "WHERE m.type = 'table'"
+)
+
+
+def readonly_uri(filepath):
+    """URI de abertura só leitura e imutável (sem journal, sem locks, sem alterar o arquivo).
+
+    immutable=1 faz o SQLite ignorar o -wal: num banco em uso com WAL, tabelas
+    criadas depois do último checkpoint não aparecem.
+    """
+    return Path(os.path.abspath(filepath)).as_uri() + "?mode=ro&immutable=1"
+
+
+def open_readonly(filepath):
+    return sqlite3.connect(readonly_uri(filepath), uri=True)
+
+
+def _header_page_size(header):
+    """Tamanho de página de um cabeçalho SQLite (o valor 1 significa 65536); None se não for SQLite."""
+    if len(header) < SQLITE_HEADER_SIZE or not header.startswith(SQLITE_HEADER_MAGIC):
+        return None
+    page_size = struct.unpack_from('>H', header, 16)[0]
+    return 65536 if page_size == 1 else page_size
+
+
+def read_header(filepath):
+    """Campos do cabeçalho de 100 bytes: {'change_counter', 'page_size', 'page_count', 'schema_cookie'}.
+
+    Lê só os primeiros 100 bytes (nenhuma conexão). None se o arquivo não for um
+    banco SQLite. Quando o tamanho em páginas do cabeçalho não é confiável
+    (version-valid-for diferente do contador, bancos gravados por versões antigas),
+    ele é calculado pelo tamanho do arquivo, como o próprio SQLite faz.
+    """
+    try:
+        with open(filepath, 'rb') as file:
+            header = file.read(SQLITE_HEADER_SIZE)
+            file_size = os.fstat(file.fileno()).st_size
+    except OSError:
+        return None
+    page_size = _header_page_size(header)
+    if page_size is None:
+        return None
+    change_counter, page_count = struct.unpack_from('>II', header, 24)
+    schema_cookie = struct.unpack_from('>I', header, 40)[0]
+    version_valid_for = struct.unpack_from('>I', header, 92)[0]
+    if not page_count or version_valid_for != change_counter:
+        page_count = file_size // page_size if page_size else 0
+    return {'change_counter': change_counter, 'page_size': page_size, 'page_count': page_count, 'schema_cookie': schema_cookie}
+
+
+def sample_page_numbers(page_count, sample_pages=FINGERPRINT_SAMPLE_PAGES):
+    """Páginas (a partir de 0) lidas pela impressão digital: a primeira, a última e sample_pages igualmente espaçadas."""
+    if page_count <= sample_pages + 2:
+        return list(range(page_count))
+    step = (page_count - 1) / (sample_pages + 1)
+    return sorted({0, page_count - 1} | {round(step * index) for index in range(1, sample_pages + 1)})
+
+
+def database_fingerprint(filepath, sample_pages=FINGERPRINT_SAMPLE_PAGES, algorithm=DEFAULT_HASH_ALGORITHM):
+    """Impressão digital de um banco: tamanho + primeira página (cabeçalho) + páginas amostradas.
+
+    Lê no máximo sample_pages + 2 páginas, qualquer que seja o tamanho do
+    arquivo. As páginas são sempre as mesmas para o mesmo tamanho, então cópias
+    idênticas têm a mesma impressão digital; o contrário não vale (bancos que só
+    diferem em páginas não amostradas colidem), por isso quem deduplica precisa
+    confirmar colisões com o hash completo. Retorna "fp:" + hex. Erros de leitura
+    sobem (OSError).
+    """
+    hasher = new_hasher(algorithm)
+    with open(filepath, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        page_size = _header_page_size(file.read(SQLITE_HEADER_SIZE)) or FINGERPRINT_FALLBACK_PAGE_SIZE
+        hasher.update(struct.pack('>QI', size, page_size))
+        for page in sample_page_numbers(-(-size // page_size), sample_pages):
+            file.seek(page * page_size)
+            hasher.update(file.read(page_size))
+    return FINGERPRINT_PREFIX + hasher.hexdigest()
+
+
+def schema_stats(filepath):
+    """(tabelas, colunas) de um banco SQLite com uma conexão só leitura e UMA consulta.
+
+    Seguro em várias threads ao mesmo tempo (cada chamada abre a própria conexão;
+    o sqlite3 libera o GIL durante a consulta). Erros do SQLite (arquivo que não é
+    banco, criptografado, módulo de tabela virtual ausente) sobem como sqlite3.Error.
+    """
+    with closing(open_readonly(filepath)) as conn:
+        tables, columns = conn.execute(SCHEMA_STATS_QUERY).fetchone()
+    return tables, columns
+
+
+class DbStatsCache:
+    """Cache persistente de (tabelas, colunas) por banco, validado pelo cabeçalho do arquivo.
+
+    A entrada de um caminho só vale se contador de alterações, tamanho de página,
+    número de páginas e schema cookie do cabeçalho continuarem iguais aos
+    gravados; aí o resultado volta sem abrir conexão (só 100 bytes lidos). O
+    schema cookie entra na chave porque no modo WAL o contador de alterações não
+    é incrementado a cada transação, e é ele que muda quando o esquema muda.
+    Diferente do ScanCache, pode ser usado por várias threads (os workers do
+    analisador db_stats); a gravação em disco é feita em save().
+    """
+
+    def __init__(self, cache_path=DB_STATS_CACHE_DEFAULT_PATH):
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.cache_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS db_stats_cache ("
+            " filepath TEXT PRIMARY KEY,"
+            " change_counter INTEGER, page_size INTEGER, page_count INTEGER, schema_cookie INTEGER,"
+            " tables INTEGER, columns INTEGER)"
+        )
+        return conn
+
+    def _load(self):
+        """Carrega todas as entradas do disco para memória (uma única consulta)."""
+        try:
+            conn = self._connect()
+            try:
+                for row in conn.execute("SELECT filepath, change_counter, page_size, page_count, schema_cookie, tables, columns FROM db_stats_cache"):
+                    self._entries[row[0]] = row[1:]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Aviso: cache de estatísticas {self.cache_path} ilegível, iniciando vazio: {e}")
+            self._entries = {}
+
+    def stats(self, filepath):
+        """(tabelas, colunas) do banco: do cache se o cabeçalho não mudou, senão via schema_stats.
+
+        Erros do SQLite sobem como em schema_stats (e nada é gravado).
+        """
+        header = read_header(filepath)
+        key = (header['change_counter'], header['page_size'], header['page_count'], header['schema_cookie']) if header else None
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if key is not None and entry is not None and entry[:4] == key:
+                self.hits += 1
+                return entry[4], entry[5]
+            self.misses += 1
+        tables, columns = schema_stats(filepath)
+        if key is not None:
+            # Cabeçalho lido antes da consulta: se o banco mudar no meio, a chave antiga só força nova leitura
+            with self._lock:
+                self._entries[filepath] = self._dirty[filepath] = key + (tables, columns)
+        return tables, columns
+
+    def save(self):
+        """Persiste as entradas novas/alteradas em um único lote."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO db_stats_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(path,) + entry for path, entry in dirty.items()]
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Erro ao salvar cache de estatísticas {self.cache_path}: {e}")
+
+    def print_stats(self):
+        total = self.hits + self.misses
+        print(f"Cache de estatísticas SQLite: {self.hits} acertos, {self.misses} faltas ({self.hits / total if total else 0.0:.1%} de acerto).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+        return False